@@ -6,7 +6,7 @@
         suncal: Calculate normal uncertainty propagation problem
         suncalf: Calculate uncertainty problem from config (yaml) file
         suncalrev: Calculate reverse uncertainty problem
-        suncalrisk: Calculate risk analysis
+        suncalrisk: Calculate risk analysis, or batch risk for a table of cases
         suncalfit: Calculate curve fit uncertainty
 '''
 import os
@@ -14,11 +14,12 @@ import sys
 import argparse
 import numpy as np
 
-from suncal.common import unitmgr, distributions
+from suncal.common import unitmgr
 from suncal.project import Project, ProjectUncert, ProjectReverse, ProjectRisk, ProjectCurveFit
 from suncal import Model
 from suncal.reverse import ModelReverse
 from suncal.risk.risk_model import RiskModel
+from suncal.risk import risk_batch
 from suncal import curvefit
 
 
@@ -251,11 +252,11 @@ def main_reverse(args=None):
 def main_risk(args=None):
     ''' Calculate risk analysis '''
     parser = argparse.ArgumentParser(prog='suncalrisk', description='Risk Analysis Calculation')
-    parser.add_argument('-LL', help='Lower specification limit', type=float, required=True)
-    parser.add_argument('-UL', help='Upper specification limit', type=float, required=True)
+    parser.add_argument('-LL', help='Lower specification limit', type=float)
+    parser.add_argument('-UL', help='Upper specification limit', type=float)
     parser.add_argument('-GBL', help='Lower guardband as offset from lower limit', type=float, default=0)
     parser.add_argument('-GBU', help='Upper guardband as offset from upper limit', type=float, default=0)
-    parser.add_argument('--procdist', type=str, required=True,
+    parser.add_argument('--procdist', type=str,
                         help='Process distribution parameters, semicolon-separated. '
                         '(e.g. "dist=uniform; median=10; a=3")')
     parser.add_argument('--testdist', type=str,
@@ -267,27 +268,28 @@ def main_risk(args=None):
     parser.add_argument('-s', help='Short output format, prints values only (Process Risk, PFA, PFR)',
                         action='store_true')
     parser.add_argument('--verbose', '-v', help='Verbose mode (include plots)', action='count', default=0)
+    parser.add_argument('--batch', type=str,
+                        help='Table of cases (.csv or .npz) to evaluate in batch. Writes a table of '
+                        'results with the input columns plus GBL, GBU, process_risk, PFA, and PFR.')
+    parser.add_argument('--workers', help='Number of processes for batch mode', type=int)
     args = parser.parse_args(args=args)
 
-    dproc = {}
-    for keyval in str(args.procdist).split(';'):
-        key, val = keyval.split('=')
-        if key.strip() != 'dist':
-            dproc[key.strip()] = float(val)
+    if args.batch:
+        results = risk_batch.evaluate(risk_batch.read_cases(args.batch), workers=args.workers)
+        if args.o.name == '<stdout>':
+            risk_batch.write_csv(args.o, results)
         else:
-            dproc[key.strip()] = val
-    dproc = distributions.from_config(dproc)
+            args.o.close()
+            risk_batch.write_results(args.o.name, results)
+        return
 
+    if args.LL is None or args.UL is None or args.procdist is None:
+        parser.error('the following arguments are required: -LL, -UL, --procdist')
+
+    dproc = risk_batch.parse_distconfig(args.procdist)
     dtest = None
     if args.testdist is not None:
-        dtest = {}
-        for keyval in str(args.testdist).split(';'):
-            key, val = keyval.split('=')
-            if key.strip() != 'dist':
-                dtest[key.strip()] = float(val)
-            else:
-                dtest[key.strip()] = val
-        dtest = distributions.from_config(dtest)
+        dtest = risk_batch.parse_distconfig(args.testdist)
 
     rsk = ProjectRisk()
     rsk.model.procdist = dproc
@@ -0,0 +1,302 @@
+''' Forward-mode automatic differentiation using dual numbers.
+
+    A Dual carries a value and its derivatives with respect to one or more
+    seed directions. Numpy ufuncs operating on Duals propagate the derivatives,
+    so a function written with numpy math can be differentiated exactly, for
+    all inputs at once, in a single vectorized call.
+
+    >>> value, jac = jacobian(lambda a, b: a * np.sin(b), 2., 1.)
+'''
+
+import numpy as np
+
+
+def _unary_rules():
+    ''' Derivative rules df/dx for single-argument ufuncs, as functions of x and f(x) '''
+    return {
+        np.negative: lambda x, f: -np.ones_like(x),
+        np.positive: lambda x, f: np.ones_like(x),
+        np.absolute: lambda x, f: np.sign(x),
+        np.sqrt: lambda x, f: 0.5 / f,
+        np.cbrt: lambda x, f: 1 / (3 * f**2),
+        np.square: lambda x, f: 2 * x,
+        np.reciprocal: lambda x, f: -f**2,
+        np.exp: lambda x, f: f,
+        np.exp2: lambda x, f: f * np.log(2),
+        np.expm1: lambda x, f: f + 1,
+        np.log: lambda x, f: 1 / x,
+        np.log2: lambda x, f: 1 / (x * np.log(2)),
+        np.log10: lambda x, f: 1 / (x * np.log(10)),
+        np.log1p: lambda x, f: 1 / (1 + x),
+        np.sin: lambda x, f: np.cos(x),
+        np.cos: lambda x, f: -np.sin(x),
+        np.tan: lambda x, f: 1 + f**2,
+        np.arcsin: lambda x, f: 1 / np.sqrt(1 - x**2),
+        np.arccos: lambda x, f: -1 / np.sqrt(1 - x**2),
+        np.arctan: lambda x, f: 1 / (1 + x**2),
+        np.sinh: lambda x, f: np.cosh(x),
+        np.cosh: lambda x, f: np.sinh(x),
+        np.tanh: lambda x, f: 1 - f**2,
+        np.arcsinh: lambda x, f: 1 / np.sqrt(x**2 + 1),
+        np.arccosh: lambda x, f: 1 / np.sqrt(x**2 - 1),
+        np.arctanh: lambda x, f: 1 / (1 - x**2),
+        np.deg2rad: lambda x, f: np.full_like(x, np.pi/180),
+        np.rad2deg: lambda x, f: np.full_like(x, 180/np.pi),
+        np.sign: lambda x, f: np.zeros_like(x),
+        np.floor: lambda x, f: np.zeros_like(x),
+        np.ceil: lambda x, f: np.zeros_like(x),
+        np.rint: lambda x, f: np.zeros_like(x),
+        np.trunc: lambda x, f: np.zeros_like(x),
+    }
+
+
+def _binary_rules():
+    ''' Derivative rules (df/da, df/db) for two-argument ufuncs, as functions of a, b, and f(a, b) '''
+    return {
+        np.add: lambda a, b, f: (np.ones_like(f), np.ones_like(f)),
+        np.subtract: lambda a, b, f: (np.ones_like(f), -np.ones_like(f)),
+        np.multiply: lambda a, b, f: (b, a),
+        np.true_divide: lambda a, b, f: (1 / b, -f / b),
+        np.arctan2: lambda a, b, f: (b / (a**2 + b**2), -a / (a**2 + b**2)),
+        np.hypot: lambda a, b, f: (a / f, b / f),
+        np.maximum: lambda a, b, f: (a >= b, a < b),
+        np.minimum: lambda a, b, f: (a <= b, a > b),
+    }
+
+
+_UNARY = _unary_rules()
+_BINARY = _binary_rules()
+
+# Ufuncs that return values without derivatives (comparisons, tests)
+_VALUEONLY = {np.greater, np.greater_equal, np.less, np.less_equal, np.equal, np.not_equal,
+              np.isfinite, np.isnan, np.isinf, np.signbit}
+
+
+def _parts(x):
+    ''' Split x into value and derivative (None for constants) '''
+    if isinstance(x, Dual):
+        return x.value, x.deriv
+    return np.asarray(x, dtype=float), None
+
+
+def _chain(partial, deriv):
+    ''' Multiply partial derivative (shape of the result) by the seed derivatives '''
+    return np.asarray(partial, dtype=float)[..., np.newaxis] * deriv
+
+
+class Dual:
+    ''' Dual number (or array of dual numbers) for forward-mode differentiation
+
+        Args:
+            value (float or array): Value of the number
+            deriv (array): Derivatives of the value with respect to each seed
+              direction. Shape is value.shape + (number of seeds,).
+    '''
+    __array_priority__ = 1000  # Make numpy arrays defer to Dual operators
+
+    def __init__(self, value, deriv):
+        self.value = np.asarray(value, dtype=float)
+        self.deriv = np.asarray(deriv, dtype=float)
+
+    def __repr__(self):
+        return f'<Dual {self.value}>'
+
+    @property
+    def shape(self):
+        ''' Shape of the value array '''
+        return self.value.shape
+
+    @property
+    def ndim(self):
+        ''' Dimension of the value array '''
+        return self.value.ndim
+
+    @property
+    def size(self):
+        ''' Size of the value array '''
+        return self.value.size
+
+    def __len__(self):
+        return len(self.value)
+
+    def __getitem__(self, idx):
+        return Dual(self.value[idx], self.deriv[idx])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def sum(self, axis=None):
+        ''' Sum of the array '''
+        if axis is None:
+            return Dual(self.value.sum(), self.deriv.reshape(-1, self.deriv.shape[-1]).sum(axis=0))
+        axis = axis % self.ndim
+        return Dual(self.value.sum(axis=axis), self.deriv.sum(axis=axis))
+
+    def mean(self, axis=None):
+        ''' Mean of the array '''
+        count = self.size if axis is None else self.shape[axis]
+        return self.sum(axis=axis) / count
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != '__call__' or kwargs:
+            return NotImplemented
+
+        if ufunc in _VALUEONLY:
+            return ufunc(*[_parts(x)[0] for x in inputs])
+
+        if ufunc in _UNARY:
+            x, dx = _parts(inputs[0])
+            f = ufunc(x)
+            return Dual(f, _chain(_UNARY[ufunc](x, f), dx))
+
+        if ufunc in _BINARY:
+            (a, da), (b, db) = _parts(inputs[0]), _parts(inputs[1])
+            f = ufunc(a, b)
+            dfda, dfdb = _BINARY[ufunc](a, b, f)
+            return Dual(f, self._combine(f, dfda, da, dfdb, db))
+
+        if ufunc in (np.power, np.float_power):
+            (a, da), (b, db) = _parts(inputs[0]), _parts(inputs[1])
+            f = ufunc(a, b)
+            dfda = np.where(b == 0, 0., b * ufunc(a, b - 1)) if da is not None else None
+            dfdb = f * np.log(a) if db is not None else None
+            return Dual(f, self._combine(f, dfda, da, dfdb, db))
+
+        return NotImplemented
+
+    @staticmethod
+    def _combine(f, dfda, da, dfdb, db):
+        ''' Derivative of binary function f(a, b) by the chain rule '''
+        deriv = 0
+        if da is not None:
+            deriv = deriv + _chain(dfda, da)
+        if db is not None:
+            deriv = deriv + _chain(dfdb, db)
+        return np.broadcast_to(deriv, np.shape(f) + np.shape(deriv)[-1:])
+
+    def __add__(self, other):
+        return np.add(self, other)
+
+    def __radd__(self, other):
+        return np.add(other, self)
+
+    def __sub__(self, other):
+        return np.subtract(self, other)
+
+    def __rsub__(self, other):
+        return np.subtract(other, self)
+
+    def __mul__(self, other):
+        return np.multiply(self, other)
+
+    def __rmul__(self, other):
+        return np.multiply(other, self)
+
+    def __truediv__(self, other):
+        return np.true_divide(self, other)
+
+    def __rtruediv__(self, other):
+        return np.true_divide(other, self)
+
+    def __pow__(self, other):
+        return np.power(self, other)
+
+    def __rpow__(self, other):
+        return np.power(other, self)
+
+    def __neg__(self):
+        return np.negative(self)
+
+    def __pos__(self):
+        return self
+
+    def __abs__(self):
+        return np.absolute(self)
+
+    def __eq__(self, other):
+        return np.equal(self, other)
+
+    def __ne__(self, other):
+        return np.not_equal(self, other)
+
+    def __lt__(self, other):
+        return np.less(self, other)
+
+    def __le__(self, other):
+        return np.less_equal(self, other)
+
+    def __gt__(self, other):
+        return np.greater(self, other)
+
+    def __ge__(self, other):
+        return np.greater_equal(self, other)
+
+    __hash__ = None  # Mutable, like ndarray
+
+
+def _flatten_output(out):
+    ''' Flatten function output (Dual, number, array, or sequence of them)
+        into value and derivative arrays of shape (N,) and (N, seeds)
+    '''
+    if isinstance(out, Dual):
+        return [out.value.ravel()], [out.deriv.reshape(-1, out.deriv.shape[-1])]
+    if isinstance(out, (tuple, list)) or (isinstance(out, np.ndarray) and out.dtype == object):
+        values, derivs = [], []
+        for item in out:
+            v, d = _flatten_output(item)
+            values.extend(v)
+            derivs.extend(d)
+        return values, derivs
+    if isinstance(out, (int, float, np.number, np.ndarray)):
+        value = np.asarray(out, dtype=float).ravel()
+        return [value], [None]
+    raise TypeError(f'Cannot differentiate function output of type {type(out)}')
+
+
+def jacobian(func, *args, mask=None, chunk=256):
+    ''' Evaluate Jacobian of func(*args) by forward-mode automatic differentiation.
+
+        Args:
+            func (callable): Function of one or more float or array arguments.
+              May return a value, array, or tuple of values.
+            *args (float or array): Values at which to evaluate the function
+            mask (array): Boolean array over all elements of args (flattened and
+              concatenated) indicating which inputs to differentiate. Jacobian
+              columns of other inputs are zero.
+            chunk (int): Maximum number of inputs to differentiate per function call
+
+        Returns:
+            value (array): Flattened function output
+            jac (array): 2D Jacobian array, shape (outputs, inputs)
+
+        Raises:
+            TypeError or ValueError if func cannot be evaluated using dual numbers
+    '''
+    args = [np.asarray(a, dtype=float) for a in args]
+    sizes = [a.size for a in args]
+    offsets = np.cumsum([0] + sizes)
+    ninputs = offsets[-1]
+    active = np.arange(ninputs) if mask is None else np.flatnonzero(mask)
+
+    value = None
+    jac = None
+    for start in range(0, max(len(active), 1), chunk):
+        cols = active[start:start+chunk]
+        duals = []
+        for arg, offset in zip(args, offsets):
+            deriv = np.zeros((arg.size, len(cols)))
+            inarg = (cols >= offset) & (cols < offset + arg.size)
+            deriv[cols[inarg] - offset, np.flatnonzero(inarg)] = 1
+            duals.append(Dual(arg, deriv.reshape(arg.shape + (len(cols),))))
+
+        values, derivs = _flatten_output(func(*duals))
+        if value is None:
+            value = np.concatenate(values) if values else np.array([])
+            jac = np.zeros((len(value), ninputs))
+        row = 0
+        for v, d in zip(values, derivs):
+            if d is not None:
+                jac[row:row+len(v), cols] = d
+            row += len(v)
+    return value, jac
@@ -10,7 +10,7 @@ of Distribution class.
 
 import inspect
 import numpy as np
-from scipy import stats
+from scipy import stats, special
 
 from . import ttable
 
@@ -71,6 +71,170 @@ def fittable(name):
     return dist.can_fit()
 
 
+class _FastFrozen:
+    ''' Direct evaluation of the common methods of a frozen distribution,
+        bypassing the argument parsing of scipy's rv_frozen. Subclasses
+        define pdf, cdf, sf, ppf and the statistics for one family.
+    '''
+    methods = ('pdf', 'cdf', 'sf', 'ppf', 'mean', 'median', 'std', 'var')
+
+    def __init__(self, loc=0, scale=1):
+        self.loc = loc
+        self.scale = scale
+
+    def _z(self, x):
+        return (np.asarray(x, dtype=float) - self.loc) / self.scale
+
+    def std(self):
+        return np.sqrt(self.var())
+
+
+class _FastNorm(_FastFrozen):
+    ''' Normal distribution using scipy.special.ndtr and ndtri '''
+    def pdf(self, x):
+        z = self._z(x)
+        return np.exp(-z*z/2) / (self.scale * np.sqrt(2*np.pi))
+
+    def cdf(self, x):
+        return special.ndtr(self._z(x))
+
+    def sf(self, x):
+        return special.ndtr(-self._z(x))
+
+    def ppf(self, q):
+        return self.loc + self.scale * special.ndtri(q)
+
+    def mean(self):
+        return np.float64(self.loc)
+
+    def median(self):
+        return np.float64(self.loc)
+
+    def std(self):
+        return np.float64(self.scale)
+
+    def var(self):
+        return np.float64(self.scale**2)
+
+
+class _FastUniform(_FastFrozen):
+    ''' Uniform distribution from loc to loc+scale '''
+    def pdf(self, x):
+        z = self._z(x)
+        return np.where((z >= 0) & (z <= 1), 1/self.scale, 0.)[()]
+
+    def cdf(self, x):
+        return np.clip(self._z(x), 0, 1)
+
+    def sf(self, x):
+        return np.clip(1 - self._z(x), 0, 1)
+
+    def ppf(self, q):
+        q = np.asarray(q, dtype=float)
+        return np.where((q >= 0) & (q <= 1), self.loc + self.scale * q, np.nan)[()]
+
+    def mean(self):
+        return np.float64(self.loc + self.scale/2)
+
+    def median(self):
+        return self.mean()
+
+    def var(self):
+        return np.float64(self.scale**2 / 12)
+
+
+class _FastTriang(_FastFrozen):
+    ''' Triangular distribution from loc to loc+scale with peak at loc+c*scale (0 < c < 1) '''
+    def __init__(self, c, loc=0, scale=1):
+        super().__init__(loc, scale)
+        self.c = c
+
+    def pdf(self, x):
+        z, c = self._z(x), self.c
+        pdf = np.where(z < c, 2*z/c, 2*(1-z)/(1-c)) / self.scale
+        return np.where((z >= 0) & (z <= 1), pdf, 0.)[()]
+
+    def cdf(self, x):
+        z, c = np.clip(self._z(x), 0, 1), self.c
+        return np.where(z < c, z*z/c, 1 - (1-z)**2/(1-c))[()]
+
+    def sf(self, x):
+        z, c = np.clip(self._z(x), 0, 1), self.c
+        return np.where(z < c, 1 - z*z/c, (1-z)**2/(1-c))[()]
+
+    def ppf(self, q):
+        q, c = np.asarray(q, dtype=float), self.c
+        with np.errstate(invalid='ignore'):
+            z = np.where(q < c, np.sqrt(c*q), 1 - np.sqrt((1-c)*(1-q)))
+        return np.where((q >= 0) & (q <= 1), self.loc + self.scale * z, np.nan)[()]
+
+    def mean(self):
+        return np.float64(self.loc + self.scale * (1 + self.c) / 3)
+
+    def median(self):
+        return self.ppf(0.5)
+
+    def var(self):
+        c = self.c
+        return np.float64(self.scale**2 * (1 - c + c*c) / 18)
+
+
+class _FastT(_FastFrozen):
+    ''' Student's t distribution using scipy.special.stdtr and stdtrit '''
+    def __init__(self, df, loc=0, scale=1):
+        super().__init__(loc, scale)
+        self.df = df
+        self._norm = np.exp(special.gammaln((df+1)/2) - special.gammaln(df/2)) / np.sqrt(df*np.pi)
+
+    def pdf(self, x):
+        z, df = self._z(x), self.df
+        return self._norm * (1 + z*z/df)**(-(df+1)/2) / self.scale
+
+    def cdf(self, x):
+        return special.stdtr(self.df, self._z(x))
+
+    def sf(self, x):
+        return special.stdtr(self.df, -self._z(x))
+
+    def ppf(self, q):
+        q = np.asarray(q, dtype=float)
+        z = np.where(q == 0, -np.inf, special.stdtrit(self.df, q))  # stdtrit(df, 0) gives +inf
+        return (self.loc + self.scale * z)[()]
+
+    def mean(self):
+        return np.float64(self.loc)
+
+    def median(self):
+        return np.float64(self.loc)
+
+    def var(self):
+        df = self.df
+        return np.float64(self.scale**2 * df / (df-2)) if df > 2 else np.float64(np.inf)
+
+
+def _fastpath(dist, distargs):
+    ''' Get a _FastFrozen for the scipy distribution and arguments,
+        or None if the family has no fast path
+    '''
+    args = dict(distargs)
+    loc = args.pop('loc', 0)
+    scale = args.pop('scale', 1)
+    if not (np.isscalar(loc) and np.isscalar(scale) and np.isfinite(loc) and scale > 0):
+        return None
+    if dist is stats.norm and not args:
+        return _FastNorm(loc, scale)
+    if dist is stats.uniform and not args:
+        return _FastUniform(loc, scale)
+    if dist is stats.triang and set(args) == {'c'} and 0 < args['c'] < 1:
+        return _FastTriang(args['c'], loc, scale)
+    if dist is stats.t and set(args) == {'df'}:
+        if not np.isfinite(args['df']):
+            return _FastNorm(loc, scale)
+        if args['df'] > 0:
+            return _FastT(args['df'], loc, scale)
+    return None
+
+
 class Distribution:
     ''' Distribution class for handling stats distributions
 
@@ -85,6 +249,9 @@ class Distribution:
     '''
     showshift = False
     dist = stats.norm
+    _distargs = None
+    _frozen = None
+    _fast = None
 
     def __init__(self, name, **kwds):
         self.name = name
@@ -92,14 +259,47 @@ class Distribution:
         self.distargs = None  # Set in update_kwds
         self.update_kwds(**kwds)
 
+    @property
+    def distargs(self):
+        ''' Arguments for the scipy.stats distribution '''
+        return self._distargs
+
+    @distargs.setter
+    def distargs(self, distargs):
+        self._distargs = distargs
+        self._clear_frozen()
+
+    def _clear_frozen(self):
+        ''' Clear the cached frozen distribution. Must be called when distargs are changed in place. '''
+        self._frozen = None
+        self._fast = None
+
+    def frozen(self):
+        ''' Get the frozen scipy distribution, cached until the arguments change '''
+        if self._frozen is None:
+            self._frozen = self.dist(**self.distargs)
+            self._fast = _fastpath(self.dist, self.distargs)
+        return self._frozen
+
     def __getattr__(self, name):
         ''' Get attribute. Passed to the frozen distribution so this class
             behaves similar to rv_frozen. Allows access to things like ppf(),
-            cdf(), rvs(), etc.
+            cdf(), rvs(), etc. Common methods of normal, uniform, triangular,
+            and t distributions are evaluated directly.
         '''
-        dfrozen = self.dist(**self.distargs)
+        if name.startswith('__'):
+            raise AttributeError(name)  # Don't forward special methods (pickle, copy)
+        dfrozen = self.frozen()
+        if self._fast is not None and name in self._fast.methods:
+            return getattr(self._fast, name)
         return getattr(dfrozen, name)
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_frozen', None)
+        state.pop('_fast', None)
+        return state
+
     def update_kwds(self, **kwds):
         ''' Update the distribution keywords.
 
@@ -118,6 +318,7 @@ class Distribution:
         # Remove unused arguments and set defaults for required args not in kwds
         [self.distargs.pop(k) for k in list(self.distargs.keys()) if k not in self.argnames]
         [self.distargs.setdefault(k, 1) for k in self.argnames if k not in self.distargs]
+        self._clear_frozen()
 
     def set_median(self, median):
         ''' Set the median value of the distribution. Calculates the correct "loc" keyword. '''
@@ -125,6 +326,7 @@ class Distribution:
         zeroargs['loc'] = 0
         zeromed = self.dist(**zeroargs).median()
         self.distargs['loc'] = median - zeromed
+        self._clear_frozen()
         if 'median' in self.kwds:
             self.kwds['median'] = median
         elif 'loc' in self.kwds:
@@ -136,6 +338,7 @@ class Distribution:
         zeroargs['loc'] = 0
         zeromean = self.dist(**zeroargs).mean()
         self.distargs['loc'] = mean - zeromean
+        self._clear_frozen()
         if 'mean' in self.kwds:
             self.kwds['mean'] = mean
         elif 'loc' in self.kwds:
@@ -145,6 +348,7 @@ class Distribution:
         ''' Set shift of the distribiton by setting loc parameter '''
         self.kwds['shift'] = shift
         self.distargs['loc'] = shift
+        self._clear_frozen()
 
     def get_distargs(self):
         ''' Return arguments used scipy.stats distribution '''
@@ -175,7 +379,9 @@ class Distribution:
 
     def pdf(self, x):
         ''' Get probability density at x. Uses sampling/histogram technique for discrete distributions. '''
-        _dfrozen = self.dist(**self.distargs)
+        _dfrozen = self.frozen()
+        if self._fast is not None:
+            return self._fast.pdf(x)
         try:
             pdf = _dfrozen.pdf(x)
         except AttributeError:
@@ -483,10 +689,11 @@ class DHistogram(Distribution):
     def set_median(self, median):
         ''' Set the median value of the histogram distribution '''
         hist, edges = self.distargs['histogram']
-        zeromed = self.dist(**self.distargs).median()
+        zeromed = self.frozen().median()
         shift = median - zeromed
         newedges = edges + shift
         self.distargs['histogram'] = hist, newedges
+        self._clear_frozen()
         self.kwds['edges'] = newedges
         self.kwds['median'] = median
 
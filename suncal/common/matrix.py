@@ -5,9 +5,56 @@
 # Note: sympy has Matrix object which would handle some of this, but
 # it can't subs() Pint quantities, so the eval functions are still needed.
 
+from functools import lru_cache
 import sympy
 
 
+@lru_cache(maxsize=16384)
+def _compile_cached(expr):
+    symbols = sorted(expr.free_symbols, key=str)
+    return tuple(str(s) for s in symbols), sympy.lambdify(symbols, expr, 'numpy')
+
+
+def compile_expr(expr):
+    ''' Lambdify the sympy expression into a numpy function of only its
+        free symbols. The compiled functions are cached so repeated evaluation
+        of the same expression (for example recalculating a model after
+        changing one input) doesn't regenerate them.
+
+        Args:
+            expr: sympy expression
+
+        Returns:
+            names: tuple of argument names
+            function: lambdified function taking positional arguments in order of names
+    '''
+    try:
+        return _compile_cached(expr)
+    except TypeError:  # Unhashable expression
+        return _compile_cached.__wrapped__(expr)
+
+
+def evaluate(expr, values):
+    ''' Evaluate one sympy expression with values
+
+        Args:
+            expr: sympy expression, or a number which is returned unchanged
+            values: dictionary of {name:value} to substitute. May contain
+              names not used in the expression.
+    '''
+    if not isinstance(expr, sympy.Basic):
+        return expr
+    names, func = compile_expr(expr)  # Can't subs() with pint Quantities
+    return func(*[values[name] for name in names])
+
+
+def _iszero(x):
+    ''' Check for an exact symbolic or Python zero. Numeric zeros that may
+        carry units (Pint, numpy) are not considered zero.
+    '''
+    return x is sympy.S.Zero or (type(x) in (int, float) and x == 0)
+
+
 def matmul(a, b):
     ''' Matrix multiply. Manually looped to preserve units since Pint
         doesn't allow matrices with different units on each element.
@@ -20,14 +67,23 @@ def matmul(a, b):
     for i in range(len(a)):
         row = []
         for j in range(len(b[0])):
-            product = 0
+            terms = []
             for v in range(len(a[i])):
+                if _iszero(a[i][v]) or _iszero(b[v][j]):  # Skip zeros in sparse matrices
+                    continue
                 if a[i][v] == 1:   # Symbolic gets ugly when multiplying by 1
-                    product += b[v][j]
+                    terms.append(b[v][j])
                 elif b[v][j] == 1:
-                    product += a[i][v]
+                    terms.append(a[i][v])
                 else:
-                    product += a[i][v] * b[v][j]
+                    terms.append(a[i][v] * b[v][j])
+
+            if terms and all(isinstance(t, sympy.Basic) for t in terms):
+                product = sympy.Add(*terms)  # Much faster than repeated += on long sums
+            else:
+                product = 0
+                for term in terms:
+                    product += term
             row.append(product)
         result.append(row)
     return result
@@ -64,14 +120,7 @@ def eval_matrix(U, values):
         Returns:
             list of list of floats
     '''
-    U_eval = []
-    for row in U:
-        U_row = []
-        for expr in row:
-            df = sympy.lambdify(values.keys(), expr, 'numpy')  # Can't subs() with pint Quantities
-            U_row.append(df(**values))
-        U_eval.append(U_row)
-    return U_eval
+    return [[evaluate(expr, values) for expr in row] for row in U]
 
 
 def eval_list(U, values):
@@ -84,11 +133,7 @@ def eval_list(U, values):
         Returns:
             list of floats
     '''
-    U_eval = []
-    for expr in U:
-        df = sympy.lambdify(values.keys(), expr, 'numpy')  # Can't subs() with pint Quantities
-        U_eval.append(df(**values))
-    return U_eval
+    return [evaluate(expr, values) for expr in U]
 
 
 def eval_dict(U, values):
@@ -101,8 +146,4 @@ def eval_dict(U, values):
         Returns:
             dictionary of {name:float}
     '''
-    U_eval = {}
-    for name, expr in U.items():
-        df = sympy.lambdify(values.keys(), expr, 'numpy')  # Can't subs() with pint Quantities
-        U_eval[name] = df(**values)
-    return U_eval
+    return {name: evaluate(expr, values) for name, expr in U.items()}
@@ -4,9 +4,11 @@ from collections import namedtuple
 import numpy as np
 import scipy.odr
 import scipy.optimize
+import sympy
 
 
 FitCoeff = namedtuple('FitCoeff', ['coeff', 'covariance'])
+MCMCDiagnostics = namedtuple('MCMCDiagnostics', ['rhat', 'ess'])
 
 
 def fit(func, x, y, ux, uy, p0=None, bounds=(-np.inf, np.inf), odr=None, absolute_sigma=True):
@@ -120,6 +122,82 @@ def linefit_lsq(x, y, sig, absolute_sigma=True):
     return FitCoeff(np.array([b, a]), np.array([[sigb**2, cov], [cov, siga**2]]))
 
 
+def linear_lsq_batch(basis, x, y, maxsize=2**22):
+    ''' Ordinary least-squares fits of a model that is linear in its parameters
+        to many data sets at once, such as Monte Carlo samples.
+
+        Args:
+            basis (list of callables): Function of x for each parameter. The model
+                is sum(p[i] * basis[i](x)).
+            x (array): X values, shape (N,) when shared by all data sets, or (N, M)
+                with one column for each of M data sets
+            y (array): Y values, shape (N, M)
+            maxsize (int): Maximum number of design matrix elements to solve at once
+
+        Returns:
+            coeff (array): Fit coefficients, shape (M, len(basis))
+
+        Note:
+            With one x for all data sets, the design matrix is factored once and
+            applied to every column of y. Otherwise each data set has its own
+            design matrix, and the fits are solved by batched QR factorization.
+    '''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if x.ndim == 1:
+        design = np.stack([np.broadcast_to(f(x), x.shape) for f in basis], axis=-1)
+        coeff, *_ = np.linalg.lstsq(design, y, rcond=None)
+        return coeff.T
+
+    npoints, nsets = y.shape
+    coeff = np.empty((nsets, len(basis)))
+    step = max(1, maxsize // (npoints * len(basis)))
+    for start in range(0, nsets, step):
+        xs, ys = x[:, start:start+step].T, y[:, start:start+step].T
+        design = np.stack([np.broadcast_to(f(xs), xs.shape) for f in basis], axis=-1)
+        q, r = np.linalg.qr(design)
+        qty = np.einsum('ijk,ij->ik', q, ys)
+        coeff[start:start+step] = np.linalg.solve(r, qty[..., np.newaxis])[..., 0]
+    return coeff
+
+
+def _model_symbols(expr, pnames):
+    ''' Sympy symbols for x and each parameter of a model expression '''
+    symbols = {str(s): s for s in expr.free_symbols}
+    return [symbols.get(name, sympy.Symbol(name)) for name in ['x'] + list(pnames)]
+
+
+def _lambdify_array(exprs, args):
+    ''' Compile a list of sympy expressions into one function of args. The function
+        returns an array with the expressions along the last axis, each broadcast
+        to the shape of the first argument.
+    '''
+    func = sympy.lambdify(args, list(exprs), 'numpy')
+
+    def evaluate(x, *p):
+        x = np.asarray(x, dtype=float)
+        return np.stack(np.broadcast_arrays(x, *func(x, *p))[1:], axis=-1)
+    return evaluate
+
+
+def model_jacobian(expr, pnames):
+    ''' Compile the derivatives of a model expression with respect to its parameters
+
+        Args:
+            expr (sympy expression): Model as function of x and the parameters
+            pnames (list of str): Parameter names, in order of the model function arguments
+
+        Returns:
+            Function of (x, *p) returning array of shape (len(x), len(pnames)),
+            or None if expr can't be differentiated
+    '''
+    symbols = _model_symbols(expr, pnames)
+    derivs = [sympy.diff(expr, p) for p in symbols[1:]]
+    if any(d.has(sympy.Derivative) for d in derivs):
+        return None
+    return _lambdify_array(derivs, symbols)
+
+
 def linefitYork(x, y, sigx=None, sigy=None, rxy=None, absolute_sigma=True):
     ''' Find a best-fit line through the x, y points having
         uncertainties in both x and y. Also accounts for
@@ -252,3 +330,45 @@ def odrfit(func, x, y, ux, uy, p0=None, absolute_sigma=True):
         cov = mout.cov_beta*mout.res_var
     ODR = namedtuple('ODR', ['coeff', 'covariance'])
     return ODR(mout.beta, cov)
+
+
+def mcmc_diagnostics(trace):
+    ''' Convergence diagnostics for Markov chains. Each chain is split in half
+        to also detect drift within a chain.
+
+        Args:
+            trace (array): Samples with shape (chains, draws, parameters)
+
+        Returns:
+            rhat (array): Split potential scale reduction factor for each parameter.
+                Near 1 when the chains have converged.
+            ess (array): Effective sample size for each parameter, from the
+                autocorrelation summed over Geyer's initial monotone sequence
+
+        References:
+            A. Gelman et al., Bayesian Data Analysis, 3rd ed. CRC Press, 2013. Ch. 11.4-11.5
+    '''
+    trace = np.asarray(trace, dtype=float)
+    half = trace.shape[1] // 2
+    chains = np.concatenate([trace[:, :half], trace[:, trace.shape[1]-half:]])
+    m, n = chains.shape[:2]
+
+    means = chains.mean(axis=1)
+    within = chains.var(axis=1, ddof=1).mean(axis=0)
+    varplus = (n-1)/n * within + means.var(axis=0, ddof=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rhat = np.sqrt(varplus / within)
+
+        # Autocovariance of each chain by FFT, combined across chains
+        f = np.fft.rfft(chains - means[:, np.newaxis], n=2*n, axis=1)
+        acov = np.fft.irfft(f * f.conj(), n=2*n, axis=1)[:, :n] / n
+        rho = 1 - (within - acov.mean(axis=0)) / varplus
+    rho[0] = 1
+
+    # Sum pairs of autocorrelations while positive, forced non-increasing
+    pairs = rho[:n-n % 2:2] + rho[1::2]
+    pairs = np.where(np.cumprod(pairs > 0, axis=0).astype(bool), pairs, 0)
+    pairs = np.minimum.accumulate(pairs, axis=0)
+    tau = np.maximum(2*pairs.sum(axis=0) - 1, 1/np.log10(m*n))
+    ess = m*n / tau
+    return MCMCDiagnostics(rhat, ess)
@@ -1,21 +1,32 @@
 ''' Curve Fit Model '''
 
-from collections import namedtuple
+import os
 import inspect
+import itertools
+import pickle
+import warnings
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import sympy
 
 from ..common import uparser
 from . import uncertarray
-from .curvefit import fit, linefit
+from .curvefit import fit, linefit, linear_lsq_batch, mcmc_diagnostics, _model_symbols, _lambdify_array
 from .results.curvefit import CurveFitResults, CurveFitResultsCombined
 
 
 FitResids = namedtuple('FitResiduals', ['residuals', 'Syx', 'r', 'F', 'SSres', 'SSreg'])
 FitResults = namedtuple('FitResults', ['coeff', 'uncert', 'covariance',
-                                       'degf', 'residuals', 'samples', 'acceptance'], defaults=(None,)*7)
+                                       'degf', 'residuals', 'samples', 'acceptance',
+                                       'rhat', 'ess'], defaults=(None,)*9)
 FitSetup = namedtuple('FitSetup', ['points', 'expression', 'function', 'modelname', 'coeffnames', 'xname', 'yname'])
 
+# Target acceptance rate for adapting MCMC proposal widths, optimal for one-dimensional updates
+MCMC_ACCEPT_TARGET = 0.44
+# Iterations between adaptations of MCMC proposal widths during burn-in
+MCMC_ADAPT_INTERVAL = 50
+
 
 class CurveFit:
     ''' Fitting an arbitrary function curve to measured data points and computing
@@ -151,6 +162,8 @@ class CurveFit:
             self.set_mcmc_priors(
                 [lambda x, a=blow, b=bhi: (x > a) & (x <= b) for blow, bhi in zip(bounds[0], bounds[1])])
 
+        self.linear_basis = self._linear_basis()
+        self._derivs = None  # Compiled by _fit_sensitivity when needed
         if self.modelname == 'line' and not odr:
             # use generic LINE fit for lines with no odr
             self.fitcalc = (lambda x, y, ux, uy, absolute_sigma=self.absolute_sigma:
@@ -162,6 +175,52 @@ class CurveFit:
 
         return self.expr
 
+    def _linear_basis(self):
+        ''' Get basis functions of x for models that are linear in the fit parameters,
+            model = sum(p[i] * basis[i](x)) + offset(x), as list of basis functions
+            followed by offset function. None if the model is not linear or
+            uses ODR or bounds.
+        '''
+        if self.modelname == 'callable' or self.odr or self.bounds is not None:
+            return None
+        params = [sympy.Symbol(p) for p in self.pnames]
+        derivs = [sympy.diff(self.expr, p) for p in params]
+        if any(d.free_symbols & set(params) for d in derivs):
+            return None
+        offset = sympy.expand(self.expr - sum(p*d for p, d in zip(params, derivs)))
+        return [sympy.lambdify(['x'], d, 'numpy') for d in derivs + [offset]]
+
+    def _fit_sensitivity(self, coeff):
+        ''' Gradient of the unweighted least-squares coefficients with respect to
+            each x and y value, as in uncertarray._GUM, by applying the implicit function
+            theorem to the normal equations with analytic derivatives of the model.
+            None if the model can't be differentiated or the fit uses ODR or bounds.
+        '''
+        if self.modelname == 'callable' or self.odr or self.bounds is not None:
+            return None
+        if self._derivs is None:
+            x, *params = _model_symbols(self.expr, self.pnames)
+            dp = [sympy.diff(self.expr, p) for p in params]
+            dpdp = [sympy.diff(d, p) for d in dp for p in params]
+            dpdx = [sympy.diff(d, x) for d in dp]
+            self._derivs = _lambdify_array(dp + [sympy.diff(self.expr, x)] + dpdp + dpdx, [x] + params)
+
+        m = self.numparams
+        with np.errstate(all='ignore'):
+            derivs = self._derivs(self.arr.x, *coeff)
+        jac, dfdx = derivs[:, :m], derivs[:, m]
+        hess = derivs[:, m+1:m+1+m*m].reshape(-1, m, m)
+        dpdx = derivs[:, m+1+m*m:]
+        resid = self.arr.y - self.func(self.arr.x, *coeff)
+
+        # Normal equations g = J.T @ resid = 0 at the fit, so dcoeff = H^-1 dg
+        H = jac.T @ jac - np.einsum('i,ijk->jk', resid, hess)
+        try:
+            grad = np.linalg.solve(H, np.hstack([(resid[:, np.newaxis]*dpdx - jac*dfdx[:, np.newaxis]).T, jac.T]))
+        except np.linalg.LinAlgError:
+            return None
+        return grad if np.all(np.isfinite(grad)) else None
+
     def parse_math(self, expr):
         ''' Check expr string for a valid curvefit function including an x variable
             and at least one fit parameter.
@@ -220,10 +279,69 @@ class CurveFit:
         out = FitResults(coeff, sigmas, cov, degf, resids)
         return CurveFitResults(out, self.fitsetup())
 
-    def sample(self, samples=1000):
+    def sample(self, samples=1000, rng=None):
         ''' Generate Monte Carlo samples '''
         self.arr.clear()
-        self.arr.sample(samples)
+        self.arr.sample(samples, rng=rng)
+
+    def _sample_blocks(self, samples, rng=None, chunksize=None):
+        ''' Generate blocks of Monte Carlo samples (xsamples, ysamples), reusing stored
+            samples when available. Samples are not stored if there are too many.
+        '''
+        stored = (self.arr.xsamples is not None and self.arr.ysamples is not None
+                  and self.arr.xsamples.shape[1] == samples)
+        if not stored and len(self.arr.x) * samples > uncertarray.MAX_STORED:
+            self.arr.clear()
+            yield from self.arr.iter_samples(samples, rng=rng, chunksize=chunksize)
+            return
+
+        if not stored:
+            self.sample(samples, rng=rng)
+        chunksize = samples if chunksize is None else chunksize
+        for start in range(0, samples, chunksize):
+            yield self.arr.xsamples[:, start:start+chunksize], self.arr.ysamples[:, start:start+chunksize]
+
+    def _fit_samples(self, xsamples, ysamples):
+        ''' Fit coefficients for each column of sampled x and y values. Rows
+            of failed fits are nan.
+        '''
+        if self.linear_basis is not None:
+            # Solve all samples at once. Same unweighted fit as fitcalc with ux=uy=None.
+            *basis, offset = self.linear_basis
+            ysamples = ysamples - offset(xsamples)
+            return linear_lsq_batch(basis, xsamples if self.arr.has_ux() else xsamples[:, 0], ysamples)
+
+        coeffs = np.full((xsamples.shape[1], self.numparams), np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            for i in range(xsamples.shape[1]):
+                try:
+                    coeffs[i], _ = self.fitcalc(xsamples[:, i], ysamples[:, i], ux=None, uy=None)
+                except (RuntimeError, ValueError, np.linalg.LinAlgError):
+                    pass  # Failed fit stays nan
+        return coeffs
+
+    def _warm_copy(self):
+        ''' Copy of this fit, started from the best-fit coefficients of the nominal data,
+            that can be sent to another process. None if the model can't be pickled.
+        '''
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                p0 = self.fitcalc(self.arr.x, self.arr.y, ux=None, uy=None)[0]
+            if not np.all(np.isfinite(p0)):
+                raise ValueError
+            if self.bounds is not None and not np.all((p0 > self.bounds[0]) & (p0 < self.bounds[1])):
+                raise ValueError  # curve_fit needs p0 inside the bounds
+        except (RuntimeError, ValueError, np.linalg.LinAlgError):
+            p0 = self.p0
+        func = self.func if self.modelname == 'callable' else self.modelname
+        setup = (func, self.polyorder, p0, self.bounds, self.odr, self.absolute_sigma)
+        try:
+            pickle.dumps(setup)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            return None, p0
+        return setup, p0
 
     def estimate_uy(self):
         ''' Calculate an estimate for uy using residuals of fit for when uy is not given.
@@ -235,11 +353,27 @@ class CurveFit:
         uy = np.full(len(self.arr.x), uy)
         return uy
 
-    def monte_carlo(self, samples=1000):
+    def monte_carlo(self, samples=1000, rng=None, workers=1, chunksize=None, rtol=None):
         ''' Calculate Monte Carlo curve fit and uncertainty.
 
             Args:
                 samples (int): Number of Monte Carlo samples
+                rng (np.random.Generator or int): Random number generator or seed
+                    for new samples. Uses the global numpy random state if None.
+                workers (int): Number of processes for fitting nonlinear models.
+                    Defaults to 1, or the number of processors if None.
+                chunksize (int): Number of samples in each block of nonlinear fits
+                rtol (float): Stop early when the relative change in the coefficient
+                    covariance after a block of nonlinear fits is below rtol. If None,
+                    all samples are fit.
+
+            Notes:
+                When samples of every point would exceed uncertarray.MAX_STORED values,
+                the samples are generated and fit in chunks without being stored.
+
+                Nonlinear fits of each sample start from the best-fit coefficients
+                of the nominal data. Samples that fail to fit are left out, and the
+                number of failures in each block is stored in the mc_failures attribute.
 
             Returns
             -------
@@ -247,12 +381,12 @@ class CurveFit:
         '''
         self.run_uyestimate()
         uy = self.arr.uy if self.arr.uy_estimate is None else self.arr.uy_estimate
-        if self.arr.xsamples is None or self.arr.ysamples is None or self.arr.xsamples.shape[1] != samples:
-            self.sample(samples)
-
-        self.samplecoeffs = np.zeros((samples, self.numparams))
-        for i in range(samples):
-            self.samplecoeffs[i], _ = self.fitcalc(self.arr.xsamples[:, i], self.arr.ysamples[:, i], ux=None, uy=None)
+        if self.linear_basis is not None:
+            self.samplecoeffs = np.vstack([self._fit_samples(xs, ys) for xs, ys in
+                                           self._sample_blocks(samples, rng=rng)])
+            self.mc_failures = np.zeros(1, dtype=int)
+        else:
+            self.samplecoeffs = self._fit_nonlinear(samples, rng, workers, chunksize, rtol)
 
         coeff = self.samplecoeffs.mean(axis=0)
         sigma = self.samplecoeffs.std(axis=0, ddof=1)
@@ -274,22 +408,106 @@ class CurveFit:
         out = FitResults(coeff, sigma, cov, degf, resids, self.samplecoeffs)
         return CurveFitResults(out, self.fitsetup())
 
-    def markov_chain_monte_carlo(self, samples=10000, burnin=0.2):
+    def _fit_nonlinear(self, samples, rng=None, workers=1, chunksize=None, rtol=None):
+        ''' Fit nonlinear model to blocks of Monte Carlo samples, warm-started
+            and optionally across a process pool
+        '''
+        workers = os.cpu_count() if workers is None else workers
+        chunksize = 100 if chunksize is None else int(chunksize)
+        setup, p0 = self._warm_copy()
+        if setup is None or workers == 1:
+            workers = 1
+            warm = CurveFit(self.arr, self.modelname if self.modelname != 'callable' else self.func,
+                            polyorder=self.polyorder, p0=p0, bounds=self.bounds, odr=self.odr,
+                            absolute_sigma=self.absolute_sigma)
+
+        blocks = self._sample_blocks(samples, rng=rng, chunksize=chunksize)
+        coeffs = []
+        failures = []
+        prevcov = None
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            while True:
+                wave = list(itertools.islice(blocks, workers))
+                if not wave:
+                    break
+                if pool is None:
+                    results = [warm._fit_samples(xs, ys) for xs, ys in wave]
+                else:
+                    results = pool.map(_fit_chunk, [(setup, np.asarray(xs), np.asarray(ys)) for xs, ys in wave])
+                for result in results:
+                    failed = ~np.all(np.isfinite(result), axis=1)
+                    failures.append(np.count_nonzero(failed))
+                    coeffs.append(result[~failed])
+
+                if rtol is not None:
+                    cov = np.atleast_2d(np.cov(np.vstack(coeffs).T))
+                    scale = np.sqrt(np.outer(np.diag(cov), np.diag(cov)))
+                    if prevcov is not None and np.all(abs(cov - prevcov) <= rtol * scale):
+                        break
+                    prevcov = cov
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            blocks.close()
+
+        self.mc_failures = np.array(failures)
+        if sum(failures):
+            print(f'WARNING - {sum(failures)} Monte Carlo samples failed to fit')
+        return np.vstack(coeffs)
+
+    def _model_chains(self, params):
+        ''' Evaluate the model at each row of params (chains x parameters).
+            Returns array of shape (chains, points).
+        '''
+        x = self.arr.x
+        try:
+            with np.errstate(all='ignore'):
+                y = np.asarray(self.func(x, *params.T[:, :, np.newaxis]), dtype=float)
+            if y.shape == (len(params), len(x)):
+                return y
+        except (TypeError, ValueError):
+            pass  # Model doesn't broadcast over coefficients
+        with np.errstate(all='ignore'):
+            return np.array([self.func(x, *p) for p in params], dtype=float)
+
+    @staticmethod
+    def _prior_chains(prior, values):
+        ''' Evaluate a prior at an array of parameter values '''
+        try:
+            prob = np.broadcast_to(np.asarray(prior(values), dtype=float), values.shape)
+        except (TypeError, ValueError):
+            prob = np.array([prior(v) for v in values], dtype=float)
+        return prob
+
+    def markov_chain_monte_carlo(self, samples=10000, burnin=0.2, chains=4, rng=None,
+                                 rhat=None, ess=None, adapt=True):
         ''' Calculate Markov-Chain Monte Carlo (Metropolis-in-Gibbs algorithm)
-            fit parameters and uncertainty
+            fit parameters and uncertainty. Multiple chains are advanced together.
 
             Args:
-                samples (int): Total number of samples to generate
-                burnin (float): Fraction of samples to reject at start of chain
+                samples (int): Total number of samples to generate, over all chains
+                burnin (float): Fraction of samples to reject at start of each chain
+                chains (int): Number of chains
+                rng (np.random.Generator or int): Random number generator or seed.
+                    Uses the global numpy random state if None.
+                rhat (float): Stop early once the split R-hat of every parameter is below this value
+                ess (float): Stop early once the effective sample size of every parameter
+                    is above this value. If both rhat and ess are given, both must be met.
+                adapt (bool): Scale the proposal widths during burn-in toward
+                    an acceptance rate of MCMC_ACCEPT_TARGET
 
             Returns:
                 CurveFitResults instance
 
             Notes:
                 Currently only supported with constant u(y) and u(x) = 0.
+                Chains after the first start from random points around the least-squares fit.
+                The traces, with shape (chains, draws, parameters), are stored in the mcmctrace attribute.
         '''
         self.run_uyestimate()
         uy = self.arr.uy if self.arr.uy_estimate is None else self.arr.uy_estimate
+        rng = np.random if rng is None else np.random.default_rng(rng)
 
         if self.arr.has_ux():
             print('WARNING - MCMC algorithm ignores u(x) != 0')
@@ -302,17 +520,21 @@ class CurveFit:
         if not all(np.isfinite(up)):
             raise ValueError('MCMC Could not determine initial sigmas. Try providing p0.')
 
+        chains = max(int(chains), 1)
+        niter = max(samples // chains, 2)
+        nburn = min(int(burnin * niter), niter-2)
+
         if all(uy == 0):
             # Sigma2 is unknown. Estimate from residuals and vary through trace.
             resids = (self.arr.y - self.func(self.arr.x, *p))
-            sig2 = resids.var(ddof=1)
+            sig2 = np.full(chains, resids.var(ddof=1))
             sresid = np.std(np.array([self.arr.y, self.func(self.arr.x, *p)]), axis=0)
-            sig2sig = 2*np.sqrt(sig2)
+            sig2sig = 2*np.sqrt(sig2[0])
             sig2lim = np.percentile(sresid, 5)**2, np.percentile(sresid, 95)**2
             varysigma = True
         else:
             # Sigma2 (variance of data) is known. Use it and don't vary sigma during trace.
-            sig2 = uy.mean()**2
+            sig2 = np.full(chains, uy.mean()**2)
             varysigma = False
 
         if not hasattr(self, 'priors') or self.priors is None:
@@ -325,42 +547,63 @@ class CurveFit:
                 # Will get div/0 below
                 raise ValueError(f'Initial prior for parameter {self.pnames[pidx]} is < 0')
 
+        # Disperse starting points of the other chains, keeping those with zero prior or bad fit at p
+        params = np.tile(p, (chains, 1))
+        params[1:] += up * rng.normal(size=(chains-1, len(p)))
+        prior = np.array([self._prior_chains(priors[pidx], params[:, pidx]) for pidx in range(len(p))])
+        ss = np.sum((self.arr.y - self._model_chains(params))**2, axis=1)
+        bad = np.any(prior <= 0, axis=0) | ~np.isfinite(ss)
+        params[bad] = p
+        prior[:, bad] = np.array([priors[pidx](p[pidx]) for pidx in range(len(p))])[:, np.newaxis]
+        ss[bad] = np.sum((self.arr.y - self.func(self.arr.x, *p))**2)
+
+        scale = up.copy()
         accepts = np.zeros(len(p))
-        self.mcmccoeffs = np.zeros((samples, self.numparams))
-        self.sig2trace = np.zeros(samples)
-        for i in range(samples):
+        trace = np.zeros((niter, chains, self.numparams))
+        sig2trace = np.zeros((niter, chains))
+        check = max(niter // 20, 50)
+        for i in range(niter):
             for pidx in range(len(p)):
-                pnew = p.copy()
-                pnew[pidx] = pnew[pidx] + np.random.normal(scale=up[pidx])
-
-                Y = self.func(self.arr.x, *p)  # Value using p (without sigma that was appended to p)
-                Ynew = self.func(self.arr.x, *pnew)  # Value using pnew
-
-                # NOTE: could use logpdf, but it seems slower than manually writing it out:
-                # problog = stat.norm.logpdf(self.arr.y, loc=I, scale=np.sqrt(sig2).sum()
-                problog = -1/(2*sig2) * sum((self.arr.y - Y)**2)
-                problognew = -1/(2*sig2) * sum((self.arr.y - Ynew)**2)
-
-                r = np.exp(problognew-problog) * priors[pidx](pnew[pidx]) / priors[pidx](p[pidx])
-                if r >= np.random.uniform():
-                    p = pnew
-                    accepts[pidx] += 1
+                pnew = params.copy()
+                pnew[:, pidx] += rng.normal(scale=scale[pidx], size=chains)
+                priornew = self._prior_chains(priors[pidx], pnew[:, pidx])
+                ssnew = np.sum((self.arr.y - self._model_chains(pnew))**2, axis=1)
+                with np.errstate(all='ignore'):
+                    r = np.exp((ss - ssnew) / (2*sig2)) * priornew / prior[pidx]
+                accept = r >= rng.uniform(size=chains)
+                params[accept] = pnew[accept]
+                ss[accept] = ssnew[accept]
+                prior[pidx, accept] = priornew[accept]
+                accepts[pidx] += np.count_nonzero(accept)
 
             if varysigma:
-                sig2new = sig2 + np.random.normal(scale=sig2sig)
-                if (sig2lim[1] > sig2new > sig2lim[0]):
-                    Y = self.func(self.arr.x, *p)
-                    ss2 = sum((self.arr.y - Y)**2)
-                    problog = -1/(2*sig2) * ss2
-                    problognew = -1/(2*sig2new) * ss2
-                    if np.exp(problognew - problog) >= np.random.uniform():
-                        sig2 = sig2new
-
-            self.mcmccoeffs[i, :] = p
-            self.sig2trace[i] = sig2
-        burnin = int(burnin * samples)
-        self.mcmccoeffs = self.mcmccoeffs[burnin:, :]
-        self.sig2trace = self.sig2trace[burnin:]
+                sig2new = sig2 + rng.normal(scale=sig2sig, size=chains)
+                inlimits = (sig2lim[1] > sig2new) & (sig2new > sig2lim[0])
+                with np.errstate(all='ignore'):
+                    r = np.exp(-ss/(2*sig2new) + ss/(2*sig2))
+                accept = inlimits & (r >= rng.uniform(size=chains))
+                sig2[accept] = sig2new[accept]
+
+            trace[i] = params
+            sig2trace[i] = sig2
+
+            if i < nburn and adapt and (i+1) % MCMC_ADAPT_INTERVAL == 0:
+                rate = accepts / (MCMC_ADAPT_INTERVAL * chains)
+                scale *= np.exp(2*(rate - MCMC_ACCEPT_TARGET))
+                accepts[:] = 0
+            if i == nburn-1:
+                accepts[:] = 0  # Report acceptance after burn-in
+            elif i >= nburn and (rhat is not None or ess is not None) and (i+1-nburn) % check == 0:
+                diag = mcmc_diagnostics(trace[nburn:i+1].transpose(1, 0, 2))
+                if ((rhat is None or np.all(diag.rhat <= rhat)) and
+                        (ess is None or np.all(diag.ess >= ess))):
+                    break
+
+        niter = i+1
+        self.mcmctrace = trace[nburn:niter].transpose(1, 0, 2)
+        self.mcmccoeffs = self.mcmctrace.reshape(-1, self.numparams)
+        self.sig2trace = sig2trace[nburn:niter].T.ravel()
+        diag = mcmc_diagnostics(self.mcmctrace)
 
         coeff = self.mcmccoeffs.mean(axis=0)
         sigma = self.mcmccoeffs.std(axis=0, ddof=1)
@@ -377,7 +620,8 @@ class CurveFit:
         SSreg = sum(w*(self.func(self.arr.x, *coeff) - sum(w*self.arr.y)/sum(w))**2)
         r = np.sqrt(1-SSres/(SSres+SSreg))
         resids = FitResids(resids, Syx, r, SSreg*degf/SSres, SSres, SSreg)
-        out = FitResults(coeff, sigma, cov, degf, resids, self.mcmccoeffs, accepts/samples)
+        out = FitResults(coeff, sigma, cov, degf, resids, self.mcmccoeffs,
+                         accepts / ((niter-nburn) * chains), diag.rhat, diag.ess)
         return CurveFitResults(out, self.fitsetup())
 
     def set_mcmc_priors(self, priors):
@@ -404,8 +648,14 @@ class CurveFit:
         self.run_uyestimate()
         uy = self.arr.uy if self.arr.uy_estimate is None else self.arr.uy_estimate
 
-        coeff, cov, _ = uncertarray._GUM(lambda x, y: self.fitcalc(x, y, ux=None, uy=None)[0],
-                                         self.arr.x, self.arr.y, self.arr.ux, uy)
+        coeff = self.fitcalc(self.arr.x, self.arr.y, ux=None, uy=None)[0]
+        grad = self._fit_sensitivity(coeff)
+        if grad is None:
+            coeff, cov, _ = uncertarray._GUM(lambda x, y: self.fitcalc(x, y, ux=None, uy=None)[0],
+                                             self.arr.x, self.arr.y, self.arr.ux, uy)
+        else:
+            ui = np.concatenate((self.arr.ux, uy)).astype(float)
+            cov = (grad * ui**2) @ grad.T
         sigmas = np.sqrt(np.diag(cov))
         resids = (self.arr.y - self.func(self.arr.x, *coeff))
         degf = len(self.arr.x) - len(coeff)
@@ -439,3 +689,14 @@ class CurveFit:
         if markov:
             outmcmc = self.markov_chain_monte_carlo()
         return CurveFitResultsCombined(outlsq, outgum, outmc, outmcmc)
+
+
+def _fit_chunk(args):
+    ''' Fit a block of Monte Carlo samples in another process. Args are
+        (setup, xsamples, ysamples), with setup from CurveFit._warm_copy.
+    '''
+    setup, xsamples, ysamples = args
+    func, polyorder, p0, bounds, odr, absolute_sigma = setup
+    arr = uncertarray.Array(xsamples[:, 0], ysamples[:, 0])
+    fit = CurveFit(arr, func, polyorder=polyorder, p0=p0, bounds=bounds, odr=odr, absolute_sigma=absolute_sigma)
+    return fit._fit_samples(xsamples, ysamples)
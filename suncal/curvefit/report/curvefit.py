@@ -245,13 +245,17 @@ class ReportCurveFit:
         return r
 
     def acceptance(self, **kwargs):
-        ''' Report acceptance rate (MCMC fits only) '''
+        ''' Report acceptance rate and convergence diagnostics (MCMC fits only) '''
         if self._results.acceptance is None:
             raise ValueError('Acceptance report only for Markov Chain Monte Carlo')
         hdr = ['Parameter', 'Acceptance Rate']
         rows = []
         for param, value in zip(self._results.setup.coeffnames, self._results.acceptance):
             rows.append([param, f'{value*100:.2f}%'])
+        if self._results.rhat is not None:
+            hdr.extend(['R-hat', 'Effective Samples'])
+            for row, rhat, ess in zip(rows, self._results.rhat, self._results.ess):
+                row.extend([f'{rhat:.3f}', f'{ess:.0f}'])
         rpt = report.Report(**kwargs)
         rpt.table(rows, hdr=hdr)
         return rpt
@@ -4,10 +4,11 @@ from dataclasses import dataclass
 import numpy as np
 import sympy
 from scipy import stats
-from scipy import interpolate, optimize
+from scipy import interpolate
 
 from ...common import reporter
 from ...common.ttable import k_factor
+from ..curvefit import model_jacobian
 from ..report.curvefit import ReportCurveFit, ReportCurveFitCombined
 
 
@@ -27,13 +28,48 @@ class CurveFitResults:
         self.residuals = fitresults.residuals
         self.samples = fitresults.samples
         self.acceptance = fitresults.acceptance
+        self.rhat = fitresults.rhat
+        self.ess = fitresults.ess
         self.setup = fitsetup
         self.correlation = self.covariance / self.uncerts[:, None] / self.uncerts[None, :]
+        self._jacobian = None  # Compiled on first use
 
     def y(self, x):
         ''' Predict Y value at X '''
         return self.setup.function(x, *self.coeffs)
 
+    def jacobian(self, x):
+        ''' Derivative of the fit function with respect to each coefficient, evaluated
+            at the fit coefficients. Uses analytic derivatives of the fit expression
+            when available, otherwise central differences.
+
+            Args:
+                x (float or array): value(s) at which to compute
+
+            Returns:
+                array of shape (len(x), number of coefficients)
+        '''
+        if self._jacobian is None:
+            jac = None if self.setup.modelname == 'callable' else model_jacobian(
+                self.setup.expression, self.setup.coeffnames)
+            self._jacobian = self._jacobian_numeric if jac is None else jac
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        with np.errstate(all='ignore'):
+            return self._jacobian(x, *self.coeffs)
+
+    def _jacobian_numeric(self, x, *coeffs):
+        ''' Jacobian by central differences, evaluating the function at all x at once '''
+        dp = self.uncerts / 1E6
+        jac = np.zeros((len(x), len(coeffs)))
+        for i, step in enumerate(dp):
+            if step == 0:
+                continue  # Coefficient has no uncertainty
+            p1, p2 = np.array(coeffs, dtype=float), np.array(coeffs, dtype=float)
+            p1[i] += step
+            p2[i] -= step
+            jac[:, i] = np.broadcast_to(self.setup.function(x, *p1) - self.setup.function(x, *p2), x.shape) / (2*step)
+        return jac
+
     def confidence_band(self, x, k=1, conf=None):
         ''' Get confidence band uncertainty at x values
 
@@ -45,12 +81,8 @@ class CurveFitResults:
         if conf is not None:
             k = k_factor(conf, self.degf)
 
-        dp = self.uncerts / 1E6
-        band = []
-        for xval in np.atleast_1d(x):
-            grad = optimize.approx_fprime(self.coeffs, lambda p, xx=xval: self.setup.function(xx, *p), epsilon=dp)
-            band.append(grad.T @ np.atleast_2d(self.covariance) @ grad)
-        band = k * np.sqrt(np.array(band))
+        jac = self.jacobian(x)
+        band = k * np.sqrt(np.einsum('ij,jk,ik->i', jac, np.atleast_2d(self.covariance), jac))
         return band[0] if np.isscalar(x) else band
 
     def prediction_band(self, x, k=1, conf=None, mode='Syx'):
@@ -1,7 +1,12 @@
 ''' 2D Arrays with uncertainty in dependent and/or independent variables '''
 
 import numpy as np
-import scipy.stats as stat
+
+from ..common import autodiff
+
+
+MAX_CHUNK = 2**22  # Maximum number of values in each chunk of random samples
+MAX_STORED = 2**28  # Maximum number of sampled values to store before streaming them
 
 
 class Array:
@@ -42,23 +47,60 @@ class Array:
         ''' Does the array have y-uncertainties? '''
         return not all(self.uy == 0)
 
-    def sample(self, samples=1000):
-        ''' Generate random samples of the array '''
+    def sample(self, samples=1000, rng=None, chunksize=None):
+        ''' Generate random samples of the array, stored in xsamples and ysamples
+            with shape (points, samples)
+
+            Args:
+                samples (int): Number of Monte Carlo samples
+                rng (np.random.Generator or int): Random number generator or seed.
+                    Uses the global numpy random state if None.
+                chunksize (int): Number of samples to draw at once. Defaults to
+                    limiting each draw to MAX_CHUNK values.
+        '''
         if self.xsamples is None or self.ysamples is None:
-            if self.uy_estimate is not None:
-                uy = self.uy_estimate
-            else:
-                uy = self.uy
-
-            # NOTE: Currently only normal distributions can be used here
-            distfunc_y = stat.norm(loc=self.y, scale=uy)
-            distfunc_x = stat.norm(loc=self.x, scale=self.ux)
             samples = int(samples)
             self.xsamples = np.empty((len(self.x), samples))
             self.ysamples = np.empty((len(self.x), samples))
-            for i in range(samples):
-                self.xsamples[:, i] = distfunc_x.rvs()
-                self.ysamples[:, i] = distfunc_y.rvs()
+            start = 0
+            for xchunk, ychunk in self.iter_samples(samples, rng=rng, chunksize=chunksize):
+                stop = start + xchunk.shape[1]
+                self.xsamples[:, start:stop] = xchunk
+                self.ysamples[:, start:stop] = ychunk
+                start = stop
+
+    def iter_samples(self, samples=1000, rng=None, chunksize=None):
+        ''' Generate random samples of the array in chunks, without storing them
+
+            Args:
+                samples (int): Total number of Monte Carlo samples
+                rng (np.random.Generator or int): Random number generator or seed.
+                    Uses the global numpy random state if None.
+                chunksize (int): Number of samples in each chunk. Defaults to
+                    limiting each chunk to MAX_CHUNK values.
+
+            Yields:
+                xsamples, ysamples (array): Sampled x and y values, shape (points, chunksize)
+        '''
+        uy = self.uy if self.uy_estimate is None else self.uy_estimate
+        rng = np.random if rng is None else np.random.default_rng(rng)
+        if chunksize is None:
+            chunksize = max(1, MAX_CHUNK // max(1, len(self.x)))
+
+        # NOTE: Currently only normal distributions can be used here
+        # Draws alternate x and y for each sample, the same sequence as
+        # sampling one set of points at a time.
+        samples = int(samples)
+        hasux = self.has_ux()
+        for start in range(0, samples, chunksize):
+            size = min(chunksize, samples-start)
+            normals = rng.standard_normal((size, 1+hasux, len(self.x)))
+            if hasux:
+                xchunk = (normals[:, 0, :] * self.ux + self.x).T
+            else:
+                xchunk = np.broadcast_to(self.x[:, np.newaxis], (len(self.x), size))
+            ychunk = (normals[:, -1, :] * uy + self.y).T
+            yield xchunk, ychunk
 
     def clear(self):
         ''' Clear sampled data '''
@@ -89,7 +131,9 @@ class Array:
 
 def _GUM(func, xmeans, ymeans, ux, uy):
     ''' Calculate GUM uncertainty on the function. Function takes arrays
-        of x, y values as arguments.
+        of x, y values as arguments. The gradient is computed by automatic
+        differentiation if func supports dual numbers, otherwise by
+        central differences.
 
         Args:
             func (callable): Function to operate on. Arguments must be x and y arrays
@@ -108,6 +152,17 @@ def _GUM(func, xmeans, ymeans, ux, uy):
     '''
     xmeans = xmeans.astype('float')  # int arrays don't work
     ymeans = ymeans.astype('float')
+    ui = np.concatenate((ux, uy)).astype(float)
+    try:
+        mean, grad = autodiff.jacobian(func, xmeans, ymeans, mask=(ui != 0))
+    except Exception:  # func can't operate on dual numbers (e.g. scipy.optimize fits)
+        mean, grad = _gradient_numeric(func, xmeans, ymeans, ux, uy)
+    cov = grad @ np.diag(ui*ui) @ grad.T
+    return mean, cov, grad
+
+
+def _gradient_numeric(func, xmeans, ymeans, ux, uy):
+    ''' Gradient of func along [xarray, yarray] using central differences '''
     xmeansorg = xmeans.copy()
     ymeansorg = ymeans.copy()
     mean = func(xmeans, ymeans)
@@ -115,7 +170,6 @@ def _GUM(func, xmeans, ymeans, ux, uy):
     nvars = len(np.atleast_1d(mean))  # Number of output parameters from func
     lenx = len(xmeans)
     grad = np.zeros((nvars, lenx*2))
-    ui = np.zeros(lenx*2)
 
     for i, x in enumerate(xmeans):
         if ux[i] != 0:
@@ -126,7 +180,6 @@ def _GUM(func, xmeans, ymeans, ux, uy):
             val2 = func(xmeans, ymeans)
             xmeans[i] = xmeansorg[i]  # Restore value
             grad[:, i] = ((val1-val2)/(2*dx))
-            ui[i] = ux[i]
     for i, y in enumerate(ymeans):
         if uy[i] != 0:
             dy = np.float64(uy[i]) / 1E6
@@ -136,6 +189,4 @@ def _GUM(func, xmeans, ymeans, ux, uy):
             val2 = func(xmeans, ymeans)
             ymeans[i] = ymeansorg[i]  # Restore value
             grad[:, i+lenx] = (val1-val2)/(2*dy)
-            ui[i+lenx] = uy[i]
-    cov = grad @ np.diag(ui*ui) @ grad.T
-    return mean, cov, grad
+    return mean, grad
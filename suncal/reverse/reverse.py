@@ -97,9 +97,8 @@ class ModelReverse:
         # Calculate GUM symbolically then solve for uncertainty component
         symout = self.model.calculate_symbolic()  # uncerts, self.sympyexprs, degf, Uy, Ux, Cx
 
-        corrvals = {k: v for k, v in self.model.variables.correlation_coefficients.items() if v == 0}
-        u_forward_expr = symout.uncertainty['u_'+funcname]  # Symbolic expression for combined uncertainty
-        u_forward_expr = u_forward_expr.subs(corrvals).simplify()  # Remove 0 correlation values from expression
+        # Symbolic expression for combined uncertainty. Uncorrelated pairs have no sigma symbols.
+        u_forward_expr = symout.uncertainty['u_'+funcname].simplify()
 
         # Solve function for variable of interest
         func_reversed = sympy.solve(sympy.Eq(sympy.Symbol(funcname), self.model.basesympys[funcname]),
@@ -1,20 +1,26 @@
 ''' Calucations on false accept/reject risk and guardbanding '''
 
 from .risk import (specific_risk,
+                   specific_risk_batch,
                    PFA_norm,
                    PFR_norm,
                    PFA,
                    PFR,
+                   PFA_batch,
+                   PFR_batch,
                    )
 from .risk_simpson import PFA_conditional
 
 from . import guardband
 from . import guardband_tur
+from . import guardband_cost
 
-from .risk_montecarlo import PFAR_MC
+from .risk_montecarlo import PFAR_MC, PFAR_MC_chunked, PFAR_MC_stratified
 from . import deaver
+from .conformance import DecisionEngine
 
-from . import risk_quad, risk_simpson
+from . import risk_quad, risk_simpson, risk_normal, risk_batch, risk_adaptive, risk_sweep
 
-__all__ = ['specific_risk', 'guardband', 'guardband_tur', 'PFA_norm',
-           'PFR_norm', 'PFA', 'PFR', 'PFAR_MC', 'PFA_conditional', 'deaver']
\ No newline at end of file
+__all__ = ['specific_risk', 'specific_risk_batch', 'guardband', 'guardband_tur', 'guardband_cost', 'PFA_norm',
+           'PFR_norm', 'PFA', 'PFR', 'PFA_batch', 'PFR_batch', 'PFAR_MC', 'PFAR_MC_chunked', 'PFAR_MC_stratified',
+           'PFA_conditional', 'deaver', 'DecisionEngine']
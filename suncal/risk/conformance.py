@@ -0,0 +1,118 @@
+''' Conformance decisions for streams of measurement results.
+
+    A DecisionEngine is compiled once from the test distribution shape,
+    specification limits, and guardbands, then accepts or rejects arrays
+    (or an iterator of chunks) of measurement results, returning the specific
+    risk of each decision and running totals of expected false accepts and
+    rejects. Nothing is rebuilt per measurement.
+
+    >>> engine = RiskModel(...).decision_engine()
+    >>> for decisions in engine.stream(chunks):
+    ...     decisions.accept, decisions.risk
+    >>> engine.PFA, engine.PFR
+'''
+
+from collections import namedtuple
+import numpy as np
+from scipy.special import ndtr
+
+from .risk_simpson import _test_cdf
+
+
+Decisions = namedtuple('Decisions', ['accept', 'risk', 'pfa', 'pfr'])
+
+
+class DecisionEngine:
+    ''' Accept/reject decisions and specific risk for measurement results
+
+        Args:
+            testdist (stats.rv_frozen or distributions.Distribution): Test measurement
+              distribution. Only its shape is used; it is centered on each measurement result.
+            speclimits (tuple): (Lower, Upper) specification limits
+            gbofsts (tuple): (lower, upper) acceptance offsets from specification limits
+            testbias (float): Offset between test distribution median and measurement result
+
+        Notes:
+            Decisions match RiskModel.specific_risk with the test median set to each
+            measurement result. Specific risk is the probability of false accept for
+            accepted results and the probability of false reject for rejected results.
+            The running pfa and pfr are the expected number of false accepts and false
+            rejects divided by the number of measurements decided so far.
+    '''
+    def __init__(self, testdist, speclimits, gbofsts=(0, 0), testbias=0):
+        LL, UL = speclimits
+        self.LL, self.UL = min(LL, UL), max(LL, UL)
+        self.AL = self.LL + gbofsts[0]
+        self.AU = self.UL - gbofsts[1]
+        self.testbias = testbias
+
+        base, median = _test_cdf(testdist, 0)
+        if getattr(testdist.dist, 'name', None) == 'norm':
+            std = base.std()
+            self._cdf = lambda x: ndtr((x + median) / std)
+            self._sf = lambda x: ndtr(-(x + median) / std)
+        else:
+            self._cdf = lambda x: base.cdf(x + median)
+            self._sf = lambda x: base.sf(x + median)
+        self.reset()
+
+    @classmethod
+    def from_model(cls, model):
+        ''' Compile a DecisionEngine from a RiskModel '''
+        return cls(model.testdist, model.speclimits, model.gbofsts, model.testbias)
+
+    def reset(self):
+        ''' Reset the running totals '''
+        self.count = 0
+        self.naccept = 0
+        self.false_accepts = 0.
+        self.false_rejects = 0.
+
+    @property
+    def PFA(self):
+        ''' Running probability of false accept over all measurements decided '''
+        return self.false_accepts / self.count if self.count else np.nan
+
+    @property
+    def PFR(self):
+        ''' Running probability of false reject over all measurements decided '''
+        return self.false_rejects / self.count if self.count else np.nan
+
+    def decide(self, results):
+        ''' Decide a batch of measurement results and update the running totals
+
+            Args:
+                results (array): Measurement results
+
+            Returns:
+                accept (array): Boolean accept/reject decision for each result
+                risk (array): Specific risk of each decision
+                pfa (array): Running probability of false accept after each result
+                pfr (array): Running probability of false reject after each result
+        '''
+        results = np.atleast_1d(np.asarray(results, dtype=float))
+        risk_out = self._cdf(self.LL - results) + self._sf(self.UL - results)
+        accept = (results + self.testbias >= self.AL) & (results + self.testbias <= self.AU)
+        risk = np.where(accept, risk_out, 1 - risk_out)
+
+        count = self.count + np.arange(1, len(results)+1)
+        fa = self.false_accepts + np.cumsum(np.where(accept, risk, 0))
+        fr = self.false_rejects + np.cumsum(np.where(accept, 0, risk))
+        if len(results):
+            self.count = int(count[-1])
+            self.naccept += int(np.count_nonzero(accept))
+            self.false_accepts = float(fa[-1])
+            self.false_rejects = float(fr[-1])
+        return Decisions(accept, risk, fa/count, fr/count)
+
+    def stream(self, chunks):
+        ''' Decide measurement results arriving as an iterator of chunks
+
+            Args:
+                chunks (iterable): Iterable of arrays (or single values) of measurement results
+
+            Yields:
+                Decisions for each chunk (see decide)
+        '''
+        for chunk in chunks:
+            yield self.decide(chunk)
@@ -6,10 +6,22 @@
     standard deviations of the process distribution, and use a slightly different
     definition for TUR. These functions are provided for convenience when working
     with this definition.
+
+    Deaver's double integrals are rectangle probabilities of the bivariate normal
+    distribution of true value and test measurement, so they are evaluated in
+    closed form with risk_normal. All functions accept arrays of SL, TUR, and GB.
 '''
 
-import math
-from scipy.integrate import dblquad
+import numpy as np
+from scipy.special import ndtr
+
+from .risk_normal import PFA_gaussian, PFR_gaussian
+
+
+def _deaver_args(SL, TUR, GB):
+    ''' Convert Deaver's parameters to process/test standard deviations and guardband offset '''
+    SL, TUR, GB = np.broadcast_arrays(*[np.asarray(v, dtype=float) for v in (SL, TUR, GB)])
+    return SL, 1/TUR, SL*(1-GB)
 
 
 def PFA_deaver(SL, TUR, GB=1):
@@ -17,21 +29,20 @@ def PFA_deaver(SL, TUR, GB=1):
         distributions given spec limit and TUR, using Deaver's equation.
 
         Args:
-            SL (float): Specification Limit in terms of standard deviations,
+            SL (float or array): Specification Limit in terms of standard deviations,
               symmetric on each side of the mean
-            TUR (float): Test Uncertainty Ratio (sigma_uut / sigma_test). Note this is
+            TUR (float or array): Test Uncertainty Ratio (sigma_uut / sigma_test). Note this is
               definition used by Deaver's papers, NOT the typical SL/(2*sigma_test) definition.
-            GB (float): Guardband factor (0-1) with 1 being no guardband
+            GB (float or array): Guardband factor (0-1) with 1 being no guardband
 
         Returns:
-            PFA (float): Probability of False Accept
+            PFA (float or array): Probability of False Accept
 
         Reference:
             Equation 6 in Deaver - How to Maintain Confidence
     '''
-    c, _ = dblquad(lambda y, t: math.exp(-(y*y + t*t)/2) / math.pi, SL, math.inf,
-                   gfun=lambda t: -TUR*(t+SL*GB), hfun=lambda t: -TUR*(t-SL*GB))
-    return c
+    SL, sigma_test, gb = _deaver_args(SL, TUR, GB)
+    return PFA_gaussian(0, 1, sigma_test, -SL, SL, gb, gb)[()]
 
 
 def PFR_deaver(SL, TUR, GB=1):
@@ -39,18 +50,53 @@ def PFR_deaver(SL, TUR, GB=1):
         distributions given spec limit and TUR, using Deaver's equation.
 
         Args:
-            SL (float): Specification Limit in terms of standard deviations,
+            SL (float or array): Specification Limit in terms of standard deviations,
               symmetric on each side of the mean
-            TUR (float): Test Uncertainty Ratio (sigma_uut / sigma_test). Note this is
+            TUR (float or array): Test Uncertainty Ratio (sigma_uut / sigma_test). Note this is
               definition used by Deaver's papers, NOT the typical SL/(2*sigma_test) definition.
-            GB (float): Guardband factor (0-1) with 1 being no guardband
+            GB (float or array): Guardband factor (0-1) with 1 being no guardband
 
         Returns:
-            PFR (float): Probability of False Reject
+            PFR (float or array): Probability of False Reject
 
         Reference:
             Equation 7 in Deaver - How to Maintain Confidence
     '''
-    p, _ = dblquad(lambda y, t: math.exp(-(y*y + t*t)/2) / math.pi, -SL, SL,
-                   gfun=lambda t: TUR*(GB*SL-t), hfun=lambda t: math.inf)
-    return p
+    SL, sigma_test, gb = _deaver_args(SL, TUR, GB)
+    return PFR_gaussian(0, 1, sigma_test, -SL, SL, gb, gb)[()]
+
+
+def CPFA_deaver(SL, TUR, GB=1):
+    ''' Calculate Conditional Probability of False Accept, the probability
+        an accepted unit is out of tolerance, using Deaver's definitions.
+
+        Args:
+            SL (float or array): Specification Limit in terms of standard deviations,
+              symmetric on each side of the mean
+            TUR (float or array): Test Uncertainty Ratio (sigma_uut / sigma_test)
+            GB (float or array): Guardband factor (0-1) with 1 being no guardband
+
+        Returns:
+            CPFA (float or array): Conditional Probability of False Accept
+    '''
+    SL, sigma_test, gb = _deaver_args(SL, TUR, GB)
+    accept = 2*ndtr((SL - gb) / np.sqrt(1 + sigma_test**2)) - 1
+    return (PFA_gaussian(0, 1, sigma_test, -SL, SL, gb, gb) / accept)[()]
+
+
+def CPFR_deaver(SL, TUR, GB=1):
+    ''' Calculate Conditional Probability of False Reject, the probability
+        a rejected unit is in tolerance, using Deaver's definitions.
+
+        Args:
+            SL (float or array): Specification Limit in terms of standard deviations,
+              symmetric on each side of the mean
+            TUR (float or array): Test Uncertainty Ratio (sigma_uut / sigma_test)
+            GB (float or array): Guardband factor (0-1) with 1 being no guardband
+
+        Returns:
+            CPFR (float or array): Conditional Probability of False Reject
+    '''
+    SL, sigma_test, gb = _deaver_args(SL, TUR, GB)
+    reject = 2*ndtr(-(SL - gb) / np.sqrt(1 + sigma_test**2))
+    return (PFR_gaussian(0, 1, sigma_test, -SL, SL, gb, gb) / reject)[()]
@@ -1,12 +1,60 @@
 ''' Compute guardbands to target a specific PFA '''
 
-from contextlib import suppress
 import numpy as np
 from scipy import stats
 from scipy.optimize import brentq, minimize_scalar
 
-from .risk import PFA, PFA_conditional, PFR, specific_risk
-from ..common import distributions
+from .risk import PFA, PFA_conditional, PFR, specific_risk_batch
+from .risk_simpson import AcceptanceTable
+
+
+def _refine(func, x0, slope, bracket, xtol=2E-12, maxiter=8):
+    ''' Refine an approximate root x0 of func with secant steps, starting from
+        the approximate slope. Falls back to Brent's method within bracket.
+        Returns nan if no root is found.
+    '''
+    x, f = x0, func(x0)
+    for _ in range(maxiter):
+        if f == 0:
+            return x
+        if slope == 0 or not np.isfinite(slope):
+            break
+        xnew = x - f/slope
+        if abs(xnew - x) < xtol:
+            return xnew
+        fnew = func(xnew)
+        if fnew != f:
+            slope = (fnew - f) / (xnew - x)
+        x, f = xnew, fnew
+
+    try:
+        root, r = brentq(func, *bracket, full_output=True)
+    except ValueError:
+        return np.nan
+    return root if r.converged else np.nan
+
+
+def _tabulated_root(tabfunc, func, lo, hi, num=2001):
+    ''' Find root of func between lo and hi. The root is bracketed using tabfunc,
+        a fast tabulated approximation to func that accepts arrays, then refined
+        using only a few evaluations of func. Returns nan if there is no root.
+    '''
+    x = np.linspace(lo, hi, num)
+    f = tabfunc(x)
+    crossings = np.flatnonzero(np.sign(f[:-1]) != np.sign(f[1:]))
+    if len(crossings) == 0:
+        return np.nan
+    i = crossings[0]
+    slope = (f[i+1] - f[i]) / (x[i+1] - x[i])
+    x0 = x[i] - f[i] / slope if slope != 0 else x[i]
+    return _refine(func, x0, slope, bracket=(lo, hi))
+
+
+def _tabulate(dist_proc, dist_test, LL, UL, testbias=0):
+    ''' Get AcceptanceTable, or None if the limits are not finite '''
+    if np.isfinite(LL) and np.isfinite(UL) and UL > LL:
+        return AcceptanceTable(dist_proc, dist_test, LL, UL, testbias=testbias)
+    return None
 
 
 def target(dist_proc, dist_test, LL, UL, target_PFA, testbias=0):
@@ -29,16 +77,23 @@ def target(dist_proc, dist_test, LL, UL, target_PFA, testbias=0):
               lower limits, such that lower test limit is LL+GB and upper test limit is UL-GB.
 
         Notes:
-            Uses Brent's Method to find zero of PFA(dist_proc, dist_test, LL, UL, GBU=x, GBL=x)-target_PFA.
+            Finds zero of PFA(dist_proc, dist_test, LL, UL, GBU=x, GBL=x)-target_PFA. With finite
+            limits, the root is located using an AcceptanceTable and refined with a few exact
+            PFA evaluations. Otherwise uses Brent's Method.
     '''
     w = UL-(LL+UL)/2
     if not np.isfinite(w):
         w = np.nanmax([x for x in [abs(LL), abs(UL), max(dist_proc.std()*4, dist_test.std()*4)] if np.isfinite(x)])
 
+    def func(x):
+        return PFA(dist_proc, dist_test, LL, UL, GBU=x, GBL=x, testbias=testbias)-target_PFA
+
+    table = _tabulate(dist_proc, dist_test, LL, UL, testbias)
+    if table is not None:
+        return _tabulated_root(lambda x: table.PFA(x, x)-target_PFA, func, -w/2, w/2)
+
     try:
-        gb, r = brentq(lambda x: PFA(dist_proc, dist_test, LL, UL,
-                                     GBU=x, GBL=x, testbias=testbias)-target_PFA,
-                       a=-w/2, b=w/2, full_output=True)
+        gb, r = brentq(func, a=-w/2, b=w/2, full_output=True)
     except ValueError:
         return np.nan  # Problem solving
 
@@ -68,16 +123,23 @@ def target_conditional(dist_proc, dist_test, LL, UL, target_PFA, testbias=0):
               lower limits, such that lower test limit is LL+GB and upper test limit is UL-GB.
 
         Notes:
-            Uses Brent's Method to find zero of PFA(dist_proc, dist_test, LL, UL, GBU=x, GBL=x)-target_PFA.
+            Finds zero of PFA(dist_proc, dist_test, LL, UL, GBU=x, GBL=x)-target_PFA. With finite
+            limits, the root is located using an AcceptanceTable and refined with a few exact
+            PFA evaluations. Otherwise uses Brent's Method.
     '''
     w = UL-(LL+UL)/2
     if not np.isfinite(w):
         w = np.nanmax([x for x in [abs(LL), abs(UL), max(dist_proc.std()*4, dist_test.std()*4)] if np.isfinite(x)])
 
+    def func(x):
+        return PFA_conditional(dist_proc, dist_test, LL, UL, GBU=x, GBL=x, testbias=testbias)-target_PFA
+
+    table = _tabulate(dist_proc, dist_test, LL, UL, testbias)
+    if table is not None:
+        return _tabulated_root(lambda x: table.PFA_conditional(x, x)-target_PFA, func, -w/2, w/2)
+
     try:
-        gb, r = brentq(lambda x: PFA_conditional(dist_proc, dist_test, LL, UL,
-                                                 GBU=x, GBL=x, testbias=testbias)-target_PFA,
-                       a=-w/2, b=w/2, full_output=True)
+        gb, r = brentq(func, a=-w/2, b=w/2, full_output=True)
     except ValueError:
         return np.nan  # Problem solving
 
@@ -99,8 +161,12 @@ def specific(dtest, LL, UL, target):
         Returns:
             GBL: Lower guardband limit
             GBU: Upper guardband limit
+
+        Notes:
+            Specific risk is evaluated on a grid of measurement results to find
+            where it crosses the target, then the acceptance limits are solved
+            exactly between the neighboring grid points.
     '''
-    kwds = distributions.get_distargs(dtest)
     w = (UL-LL)
     xx = np.linspace(LL-w/2, UL+w/2, num=500)
     if not np.isfinite(w):
@@ -109,22 +175,19 @@ def specific(dtest, LL, UL, target):
                          dtest.mean()+w if not np.isfinite(UL) else UL+w/2,
                          num=500)
 
-    fa_lower = np.empty(len(xx))
-    fa_upper = np.empty(len(xx))
-    for i, loc in enumerate(xx):
-        kwds.update({'loc': loc})
-        dtestswp = dtest.dist(**kwds)
-        fa_lower[i] = specific_risk(dtestswp, LL=LL, UL=np.inf).total
-        fa_upper[i] = specific_risk(dtestswp, LL=-np.inf, UL=UL).total
-    fa = fa_lower + fa_upper
-
-    GBL = np.nan
-    GBU = np.nan
-    with suppress(IndexError):
-        GBL = xx[np.where(fa <= target)[0][0]]
-    with suppress(IndexError):
-        GBU = xx[np.where(fa <= target)[0][-1]]
+    fa = specific_risk_batch(dtest, LL, UL, xx).total
+    accept = np.flatnonzero(fa <= target)
+    if len(accept) == 0:
+        return np.nan, np.nan
+
+    def edge(i, j):
+        # Acceptance limit between xx[i] (accepted) and xx[j] (rejected)
+        if j < 0 or j >= len(xx):
+            return xx[i]
+        return brentq(lambda x: specific_risk_batch(dtest, LL, UL, x).total - target, xx[j], xx[i])
 
+    GBL = edge(accept[0], accept[0]-1)
+    GBU = edge(accept[-1], accept[-1]+1)
     return GBL-LL, UL-GBU
 
 
@@ -159,7 +222,9 @@ def optimize(dproc, dtest, LL, UL, target, allow_negative=False, conditional=Fal
             gbl: lower guardband, as offset from LL
             gbu: upper guardband, as offset from UL
 
-        Acceptance limits are LL+gbl, UL-gbu.
+        Acceptance limits are LL+gbl, UL-gbu. With finite limits, PFA and PFR
+        are tabulated using an AcceptanceTable so the search over gbl requires
+        no further integration. Guardbands are zero if the target cannot be met.
     '''
     if allow_negative:
         bounds = -(UL-LL)/2, (UL-LL)/2
@@ -168,6 +233,10 @@ def optimize(dproc, dtest, LL, UL, target, allow_negative=False, conditional=Fal
 
     _PFA = PFA if not conditional else PFA_conditional
 
+    table = _tabulate(dproc, dtest, LL, UL)
+    if table is not None:
+        return _optimize_tabulated(table, dproc, dtest, LL, UL, target, bounds, _PFA, conditional)
+
     def _pfr(gbl):
         # Find GBU that acheives target PFA at this GBL
         try:
@@ -190,3 +259,42 @@ def optimize(dproc, dtest, LL, UL, target, allow_negative=False, conditional=Fal
         gbu = 0.
 
     return gbl, gbu
+
+
+def _optimize_tabulated(table, dproc, dtest, LL, UL, target, bounds, _PFA, conditional, num=401):
+    ''' Optimize guardbands using an AcceptanceTable. The gbu meeting the target
+        is found for a grid of gbl values at once by bisection on the table, and
+        the exact PFA is only evaluated to refine the final gbu.
+    '''
+    tabpfa = table.PFA_conditional if conditional else table.PFA
+
+    def _gbu(gbl):
+        # Bisect for gbu (PFA decreases with gbu) for an array of gbl
+        lo = np.full(np.shape(gbl), bounds[0])
+        hi = np.full(np.shape(gbl), bounds[1])
+        feasible = (tabpfa(gbl, lo) - target) * (tabpfa(gbl, hi) - target) <= 0
+        for _ in range(48):
+            mid = (lo + hi) / 2
+            over = tabpfa(gbl, mid) > target
+            lo = np.where(over, mid, lo)
+            hi = np.where(over, hi, mid)
+        return (lo + hi) / 2, feasible
+
+    def _pfr(gbl):
+        gbu, feasible = _gbu(gbl)
+        return np.where(feasible, table.PFR(gbl, gbu), 1)
+
+    gbls = np.linspace(*bounds, num)
+    pfrs = _pfr(gbls)
+    if np.all(pfrs >= 1):
+        return 0., 0.  # Target cannot be met
+
+    i = np.argmin(pfrs)
+    gbl = minimize_scalar(lambda x: _pfr(np.array([x]))[0],
+                          bounds=(gbls[max(i-1, 0)], gbls[min(i+1, num-1)])).x
+    gbu = _tabulated_root(lambda x: tabpfa(gbl, x)-target,
+                          lambda x: _PFA(dproc, dtest, LL, UL, gbl, GBU=x)-target,
+                          *bounds)
+    if not np.isfinite(gbu):
+        gbu = 0.
+    return gbl, gbu
@@ -1,11 +1,10 @@
 ''' TUR-based guardbands, returning guardband factor as multipler of
-    the plus-minus tolerance
+    the plus-minus tolerance. All methods accept arrays of TUR and itp.
 '''
 import numpy as np
-from scipy import stats
-from scipy.optimize import fsolve
+from scipy.special import ndtri
 
-from .risk import PFA_norm
+from .risk_normal import PFA_gaussian, sigma_from_itp, _solve_increasing
 
 
 def dobbert(tur: float) -> float:
@@ -42,7 +41,8 @@ def test95(tur: float) -> float:
         Args:
             tur: Test Uncertainty Ratio (Tolerance / Uncertainty)
     '''
-    return 1-1/tur if tur <= 4 else 1
+    tur = np.asarray(tur, dtype=float)
+    return np.where(tur <= 4, 1-1/tur, 1)[()]
 
 
 def rp10(tur: float) -> float:
@@ -54,10 +54,11 @@ def rp10(tur: float) -> float:
         Args:
             tur: Test Uncertainty Ratio (Tolerance / Uncertainty)
     '''
-    return 1.25 - 1/tur if tur <= 4 else 1
+    tur = np.asarray(tur, dtype=float)
+    return np.where(tur <= 4, 1.25 - 1/tur, 1)[()]
 
 
-def four_to_1(tur: float, itp: float = 0.95) -> float:
+def four_to_1(tur: float, itp: float = 0.95, full_output: bool = False) -> float:
     ''' Calculate guardband that results in the same PFA as if the TUR
         was 4:1.
 
@@ -65,12 +66,15 @@ def four_to_1(tur: float, itp: float = 0.95) -> float:
             tur: Test Uncertainty Ratio (Tolerance / Uncertainty)
             itp: In-tolerance probability (also called
                 end-of-period-reliability)
+            full_output: Also return convergence flags
     '''
-    target = PFA_norm(itp, TUR=4)
-    return pfa_target(tur, itp, target)
+    sigma_proc, _ = sigma_from_itp(itp)
+    target = PFA_gaussian(0, sigma_proc, 1/8, -1, 1)
+    return pfa_target(tur, itp, target, full_output=full_output)
 
 
-def pfa_target(tur: float, itp: float = 0.95, pfa: float = 0.08) -> float:
+def pfa_target(tur: float, itp: float = 0.95, pfa: float = 0.08, full_output: bool = False,
+               bias: float = 0) -> float:
     ''' Calculate guardband required to acheive the desired PFA
 
         Args:
@@ -78,8 +82,29 @@ def pfa_target(tur: float, itp: float = 0.95, pfa: float = 0.08) -> float:
             itp: In-tolerance probability (also called
                 end-of-period-reliability)
             pfa: Desired Probability of False Accept
+            full_output: Also return convergence flags
+            bias: Process bias, as fraction of the specification limit
+
+        Returns:
+            gbf: Guardband factor, nan where the target cannot be met
+            converged: Convergence flag, if full_output is True
+
+        Notes:
+            PFA is evaluated in closed form and increases with the guardband
+            factor, so all TUR/itp pairs are solved together by bracketed
+            regula falsi between guardband factors of 0 and 2.
     '''
-    return fsolve(lambda x: PFA_norm(itp, tur, GB=x)-pfa, x0=.8)[0]
+    tur, itp, pfa, bias = np.broadcast_arrays(*[np.asarray(v, dtype=float) for v in (tur, itp, pfa, bias)])
+    sigma_proc, _ = sigma_from_itp(itp, bias)
+    sigma_test = 1/tur/2
+
+    def func(gbf):
+        return PFA_gaussian(bias, sigma_proc, sigma_test, -1, 1, 1-gbf, 1-gbf) - pfa
+
+    gbf, converged = _solve_increasing(func, np.zeros(tur.shape), np.full(tur.shape, 2.))
+    if full_output:
+        return gbf[()], converged[()]
+    return gbf[()]
 
 
 def mincost(tur: float, itp: float = 0.95, cc_over_cp: float = 10) -> float:
@@ -95,8 +120,8 @@ def mincost(tur: float, itp: float = 0.95, cc_over_cp: float = 10) -> float:
     '''
     conf = 1 - (1 / (1 + cc_over_cp))
     sigtest = 1/tur/2
-    sigprod = 1/stats.norm.ppf((1+itp)/2)
-    k = stats.norm.ppf(conf) * np.sqrt(1 + sigtest**2/sigprod**2) - sigtest/sigprod**2
+    sigprod = 1/ndtri((1+itp)/2)
+    k = ndtri(conf) * np.sqrt(1 + sigtest**2/sigprod**2) - sigtest/sigprod**2
     return 1 - k * sigtest
 
 
@@ -110,5 +135,5 @@ def minimax(tur: float, cc_over_cp: float = 10) -> float:
             cc_over_cp: Ratio of cost of a false accept to cost of the part
     '''
     conf = 1 - (1 / (1 + cc_over_cp))
-    k = stats.norm.ppf(conf)
+    k = ndtri(conf)
     return 1 - k * (1/tur/2)
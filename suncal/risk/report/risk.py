@@ -4,8 +4,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.ticker import FormatStrFormatter
 
-from ..risk import specific_risk
-from ..risk_montecarlo import PFAR_MC
+from ..risk import specific_risk_batch, PFA_batch, PFR_batch
+from ..risk_montecarlo import PFAR_MC_chunked
 from .. import risk_sweep
 from ...common import report, plotting, distributions
 
@@ -87,8 +87,9 @@ class RiskReport:
         N = kwargs.get('samples', 100000)
         LL, UL = self.model.speclimits
         GB = self.model.gbofsts
-        pfa, pfr, psamples, tsamples, *_ = PFAR_MC(
-            self.model.procdist, self.model.testdist, LL, UL, *GB, N=N, testbias=self.model.testbias)
+        pfa, pfr, *_, psamples, tsamples = PFAR_MC_chunked(
+            self.model.procdist, self.model.testdist, LL, UL, *GB, N=N, testbias=self.model.testbias,
+            reservoir=min(N, 100000))
 
         LLplot = np.nan if not np.isfinite(LL) else LL
         ULplot = np.nan if not np.isfinite(UL) else UL
@@ -152,15 +153,12 @@ class RiskReport:
                     gbrange = np.linspace(0, dtest.std()*3, num=26)
                     xlabel = 'Guardband'
 
-                pfa = np.empty(len(gbrange))
-                pfr = np.empty(len(gbrange))
-                for i, gb in enumerate(gbrange):
-                    if simple:
-                        self.model.set_gbf(gb)
-                    else:
-                        self.model.gbofsts = (gb, gb)  # Always symmetric
-                    pfa[i] = self.model.PFA()
-                    pfr[i] = self.model.PFR()
+                if simple:
+                    gbofsts = (UL - LL) / 2 * (1 - gbrange)
+                else:
+                    gbofsts = gbrange  # Always symmetric
+                pfa = PFA_batch(dproc, dtest, LL, UL, gbofsts, gbofsts, self.model.testbias)
+                pfr = PFR_batch(dproc, dtest, LL, UL, gbofsts, gbofsts, self.model.testbias)
 
                 ax1 = fig.add_subplot(2, 1, 1)
                 ax1.plot(gbrange, pfa*100)
@@ -201,7 +199,6 @@ class RiskReport:
             dtest = self.model.testdist
 
             if dtest is not None:
-                kwds = distributions.get_distargs(dtest)
                 bias = self.model.testbias
                 w = (UL-LL)
                 xx = np.linspace(LL-w/2, UL+w/2, num=500)
@@ -210,15 +207,7 @@ class RiskReport:
                     xx = np.linspace(dtest.mean()-w if not np.isfinite(LL) else LL-w/2,
                                      dtest.mean()+w if not np.isfinite(UL) else UL+w/2,
                                      num=500)
-                fa_lower = np.empty(len(xx))
-                fa_upper = np.empty(len(xx))
-                for i, loc in enumerate(xx):
-                    dtest.set_median(loc-bias)
-                    kwds = distributions.get_distargs(dtest)
-                    dtestswp = dtest.dist(**kwds)  # Pass in rv_continuous, could be faster than Distribution object
-                    fa_lower[i] = specific_risk(dtestswp, LL=LL, UL=np.inf).total
-                    fa_upper[i] = specific_risk(dtestswp, LL=-np.inf, UL=UL).total
-                fa = 1-(fa_lower + fa_upper)
+                fa = 1 - specific_risk_batch(dtest, LL, UL, xx, testbias=bias).total
 
                 ax = fig.add_subplot(1, 1, 1)
                 ax.plot(xx, fa*100, color='C1')
@@ -273,12 +262,11 @@ class RiskReport:
 
             yvars = [yvar.lower()] if yvar.lower() != 'both' else ['pfa', 'pfr']
             for k, yvar in enumerate(yvars):
-                curves = risk_sweep.PFA_sweep_simple(
-                    xvar, zvar, xvals, zvals,
-                    GBFdflt=gbf, itpdflt=self.model.get_itp(),
-                    TURdflt=self.model.get_tur(), risk=yvar,
-                    sig0=sig0,
-                    tbias=tbias, pbias=pbias) * 100
+                axes = {xvar: xvals} if zvar == 'none' else {zvar: zvals, xvar: xvals}
+                result = risk_sweep.sweep_normal(
+                    axes, itp=self.model.get_itp(), tur=self.model.get_tur(),
+                    gbf=gbf, sig0=sig0, tbias=tbias, pbias=pbias, risk=yvar)
+                curves = result.values.reshape(-1, len(xvals)) * 100
 
                 xlabel = labels.get(xvar, 'x')
                 zlabel = labels.get(zvar, 'z')
@@ -6,7 +6,7 @@ import numpy as np
 from scipy import stats
 from scipy.optimize import fsolve
 
-from . import risk_simpson
+from . import risk_simpson, risk_normal, risk_adaptive
 from ..common import distributions
 
 
@@ -54,31 +54,58 @@ def specific_risk(dist, LL, UL):
     return Result(cpk, risk_total, risk_lower, risk_upper)
 
 
-def get_sigmaproc_from_itp(itp, bias=0):
-    ''' Get process standard deviation from in-tolerance probability.
-        Assumes normal distribution, but accounts for bias.
+def specific_risk_batch(dist, LL, UL, results, testbias=0):
+    ''' Calculate specific risk for an array of measurement results. The distribution
+        is shifted so its median is at each result (less testbias), and all results
+        are computed with one broadcast cdf call.
+
+        Args:
+            dist (stats.rv_frozen or distributions.Distribution): Distribution
+              of possible unit under test values, for any measurement result
+            LL (float): Lower specification limit
+            UL (float): Upper specification limit
+            results (array): Measurement results
+            testbias (float): Bias in the test measurement
+
+        Returns:
+            risk_total (array): Total risk (0-1 range) of nonconformance
+            risk_lower (array): Risk of nonconformance below LL
+            risk_upper (array): Risk of nonconformance above UL
+
+        Notes:
+            Probability of conformance is 1 - risk_total.
     '''
-    if bias == 0:
-        return 1/stats.norm.ppf((1+itp)/2)
-    else:
-        # With bias, PDF is asymetric, can't just use PPF
+    LL, UL = min(LL, UL), max(LL, UL)
+    base, median = risk_simpson._test_cdf(dist, 0)
+    shift = np.asarray(results, dtype=float) - testbias - median
+    risk_lower = base.cdf(LL - shift)
+    risk_upper = base.sf(UL - shift)
+    Result = namedtuple('SpecificRiskBatch', ['total', 'lower', 'upper'])
+    return Result(risk_lower + risk_upper, risk_lower, risk_upper)
+
 
-        def sp_risk(mu, sigma):
-            ''' Simplified version of specific risk function '''
-            rl = stats.norm(mu, sigma).cdf(-1)
-            ru = 1 - stats.norm(mu, sigma).cdf(1)
-            return rl + ru
+def get_sigmaproc_from_itp(itp, bias=0, full_output=False):
+    ''' Get process standard deviation from in-tolerance probability.
+        Assumes normal distribution, but accounts for bias. Accepts
+        arrays of itp and bias.
+
+        Args:
+            itp (float or array): In-tolerance probability (0-1)
+            bias (float or array): Process bias, as fraction of the limit
+            full_output (bool): Also return convergence flags
 
-        # fsolve is sensitive to initial guess x0 - try another x0 if first one doesn't work
-        out = fsolve(lambda x: (1-sp_risk(bias, x))-itp, x0=.1, full_output=1)
-        if out[2] != 1:
-            out = fsolve(lambda x: (1-sp_risk(bias, x))-itp, x0=.8, full_output=1)
-        if out[2] != 1:
-            return 0
-        return out[0][0]
+        Returns:
+            sigma (float or array): Process standard deviation, 0 where no solution is found
+            converged (bool or array): Convergence flag, if full_output is True
+    '''
+    sigma, converged = risk_normal.sigma_from_itp(itp, bias)
+    sigma = np.where(converged, sigma, 0)[()]
+    if full_output:
+        return sigma, converged[()]
+    return sigma
 
 
-def get_sigmaproc_from_itp_arb(dist, param, itp, LL, UL):
+def get_sigmaproc_from_itp_arb(dist, param, itp, LL, UL, full_output=False):
     ''' Get process standard deviation from itp for arbitrary (non-normal)
         distributions
 
@@ -87,34 +114,50 @@ def get_sigmaproc_from_itp_arb(dist, param, itp, LL, UL):
                 Probability distribution with parameters defined
             param (str): Name of the distribution parameter to adjust to
                 meet the itp value
-            itp (float): In-tolerance probability target (0-1)
+            itp (float or array): In-tolerance probability target (0-1)
             LL (float): Lower tolerance limit
             UL (float): Upper tolerance limit
+            full_output (bool): Return array of parameter values and convergence
+                flags, with nan where no solution is found
 
         Returns:
             param (float): Value of parameter that results in itp% of the
                 distribution falling between LL and UL. Returns None if
                 no solution is found.
     '''
-    fixedargs = dist.kwds
+    fixedargs = dict(dist.kwds)
     currentval = fixedargs.pop(param, 1)
+
     def sp_risk(**kwargs):
         ''' Simplified version of specific risk function '''
-        rl = distributions.get_distribution(dist.name, **kwargs).cdf(LL)
-        ru = 1 - distributions.get_distribution(dist.name, **kwargs).cdf(UL)
-        return rl + ru
-
-    out = fsolve(lambda x: (1-sp_risk(**{param:x}, **fixedargs))-itp, x0=currentval, full_output=1)
-    if out[2] != 1:
+        d = distributions.get_distribution(dist.name, **kwargs)
+        return d.cdf(LL) + d.sf(UL)
+
+    itps = np.atleast_1d(np.asarray(itp, dtype=float))
+    values = np.full(itps.shape, np.nan)
+    converged = np.zeros(itps.shape, dtype=bool)
+    x0 = currentval
+    for i, target in enumerate(itps.flat):
+        # Start from the previous solution, since tables of itp are usually ordered
+        out = fsolve(lambda x: (1-sp_risk(**{param: x[0]}, **fixedargs))-target, x0=x0, full_output=1)
+        if out[2] == 1:
+            values.flat[i] = x0 = out[0][0]
+            converged.flat[i] = True
+
+    if full_output:
+        return values.reshape(np.shape(itp)), converged.reshape(np.shape(itp))
+    if not converged.all():
         return None
-    return out[0][0]
+    return values.reshape(np.shape(itp))[()]
 
 
 def PFA(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0):
     ''' Calculate unconditional global Probability of False Accept for arbitrary
         process and test distributions.
 
-        Probability a DUT is OOT and Accepted.
+        Probability a DUT is OOT and Accepted. Computed in closed form when both
+        distributions are normal, otherwise by adaptive Simpson integration
+        (risk_adaptive).
 
         Args:
             dist_proc (stats.rv_frozen or distributions.Distribution):
@@ -131,14 +174,18 @@ def PFA(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0):
         Returns:
             PFA (float): Probability of False Accept
     '''
-    return risk_simpson.PFA(dist_proc, dist_test, LL, UL, GBL, GBU, testbias)
+    if risk_normal.is_normal(dist_proc) and risk_normal.is_normal(dist_test):
+        return risk_normal.PFA(dist_proc, dist_test, LL, UL, GBL, GBU, testbias)[()]
+    return risk_adaptive.PFA(dist_proc, dist_test, LL, UL, GBL, GBU, testbias).value
 
 
 def PFR(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0):
     ''' Calculate global Probability of False Reject (Producer Risk) for arbitrary
         process and test distributions.
 
-        Probability a DUT is in tolerance and rejected.
+        Probability a DUT is in tolerance and rejected. Computed in closed form when both
+        distributions are normal, otherwise by adaptive Simpson integration
+        (risk_adaptive).
 
         Args:
             dist_proc (stats.rv_frozen or distributions.Distribution):
@@ -155,14 +202,66 @@ def PFR(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0):
         Returns:
             PFR (float): Probability of False Reject
     '''
-    return risk_simpson.PFR(dist_proc, dist_test, LL, UL, GBL, GBU, testbias)
+    if risk_normal.is_normal(dist_proc) and risk_normal.is_normal(dist_test):
+        return risk_normal.PFR(dist_proc, dist_test, LL, UL, GBL, GBU, testbias)[()]
+    return risk_adaptive.PFR(dist_proc, dist_test, LL, UL, GBL, GBU, testbias).value
+
+
+def PFA_batch(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0):
+    ''' Calculate unconditional global Probability of False Accept for arrays of
+        guardbands and/or test biases, evaluated together in one integration.
+
+        Args:
+            dist_proc (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible unit under test values from process
+            dist_test (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible test measurement values
+            LL (float):Lower specification limit (absolute)
+            UL (float): Upper specification limit (absolute)
+            GBL (float or array): Lower guardband, as offset. Test limit is LL + GBL.
+            GBU (float or array): Upper guardband, as offset. Test limit is UL - GBU.
+            testbias (float or array): Bias (difference between distribution median and expected value)
+              in test distribution
+
+        Returns:
+            PFA (array): Probability of False Accept for each (broadcast) GBL, GBU, testbias
+    '''
+    if risk_normal.is_normal(dist_proc) and risk_normal.is_normal(dist_test):
+        return risk_normal.PFA(dist_proc, dist_test, LL, UL, GBL, GBU, testbias)
+    return risk_simpson.PFA_batch(dist_proc, dist_test, LL, UL, GBL, GBU, testbias)
+
+
+def PFR_batch(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0):
+    ''' Calculate global Probability of False Reject for arrays of
+        guardbands and/or test biases, evaluated together in one integration.
+
+        Args:
+            dist_proc (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible unit under test values from process
+            dist_test (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible test measurement values
+            LL (float):Lower specification limit (absolute)
+            UL (float): Upper specification limit (absolute)
+            GBL (float or array): Lower guardband, as offset. Test limit is LL + GBL.
+            GBU (float or array): Upper guardband, as offset. Test limit is UL - GBU.
+            testbias (float or array): Bias (difference between distribution median and expected value)
+              in test distribution
+
+        Returns:
+            PFR (array): Probability of False Reject for each (broadcast) GBL, GBU, testbias
+    '''
+    if risk_normal.is_normal(dist_proc) and risk_normal.is_normal(dist_test):
+        return risk_normal.PFR(dist_proc, dist_test, LL, UL, GBL, GBU, testbias)
+    return risk_simpson.PFR_batch(dist_proc, dist_test, LL, UL, GBL, GBU, testbias)
 
 
 def PFA_conditional(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0):
     ''' Calculate conditional global Probability of False Accept for arbitrary
         process and test distributions.
 
-        Probability a DUT is OOT given it was Accepted.
+        Probability a DUT is OOT given it was Accepted. Computed in closed form when both
+        distributions are normal, otherwise by adaptive Simpson integration
+        (risk_adaptive).
 
         Args:
             dist_proc (stats.rv_frozen or distributions.Distribution):
@@ -179,7 +278,9 @@ def PFA_conditional(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0):
         Returns:
             PFA (float): Probability of False Accept
     '''
-    return risk_simpson.PFA_conditional(dist_proc, dist_test, LL, UL, GBL, GBU, testbias)
+    if risk_normal.is_normal(dist_proc) and risk_normal.is_normal(dist_test):
+        return risk_normal.PFA_conditional(dist_proc, dist_test, LL, UL, GBL, GBU, testbias)[()]
+    return risk_adaptive.PFA_conditional(dist_proc, dist_test, LL, UL, GBL, GBU, testbias).value
 
 
 def PFA_norm(itp, TUR, GB=1, sig0=None, biastest=0, biasproc=0, observeditp=False):
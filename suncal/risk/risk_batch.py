@@ -0,0 +1,336 @@
+''' Batch evaluation of global risk for tables of cases, such as every test point
+    of a fleet of instruments.
+
+    Each case (row) defines specification limits, a process distribution, a test
+    distribution, and a guardband policy. Cases with normal process and test
+    distributions are evaluated together using the closed-form bivariate normal
+    engine and vectorized guardband methods. Cases with other distributions are
+    evaluated one RiskModel at a time across a process pool.
+
+    Table columns (missing columns take the default):
+        LL, UL: Specification limits (default -1, 1)
+        itp: In-tolerance probability of a normal process centered between the limits
+            (plus procbias). Ignored if procdist is given.
+        procbias: Offset of the normal process from the center of the limits (default 0)
+        tur: Test uncertainty ratio, for a normal test distribution. Ignored if testdist is given.
+        procdist, testdist: Distribution configuration, semicolon-separated
+            (e.g. "dist=uniform; median=10; a=3")
+        testbias: Bias in the test measurement (default 0)
+        guardband: Guardband policy. A guardband factor, or one of 'none', 'rss',
+            'dobbert', 'rp10', 'test', '4:1', 'pfa', 'mincost', 'minimax', 'mincost_exact',
+            'minimax_exact'. (default 'none')
+        pfa_target: Target PFA for the 'pfa' policy (default 0.08)
+        cost_ratio: Cost of false accept over cost of false reject for the
+            cost-based policies (default 10). The '_exact' policies minimize
+            the expected cost numerically using guardband_cost.
+
+    Results add the columns GBL, GBU, process_risk, PFA, and PFR, and an error column
+    with the reason any case could not be evaluated (its results are nan).
+
+    >>> cases = read_cases('fleet.csv')
+    >>> results = evaluate(cases)
+    >>> write_results('risk.csv', results)
+'''
+
+import os
+import csv
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.special import ndtr
+
+from ..common import distributions
+from . import guardband_tur, guardband_cost
+from .risk_normal import PFA_gaussian, PFR_gaussian, sigma_from_itp, _solve_increasing
+
+
+GUARDBAND_METHODS = ['none', 'rss', 'dobbert', 'rp10', 'test', '4:1', 'pfa', 'mincost', 'minimax',
+                     'mincost_exact', 'minimax_exact']
+RESULT_COLUMNS = ['GBL', 'GBU', 'process_risk', 'PFA', 'PFR']
+# Failures of a single case that are recorded in its row instead of stopping the batch
+CASE_ERRORS = (ValueError, TypeError, KeyError, AttributeError, ArithmeticError, np.linalg.LinAlgError)
+_DEFAULTS = {'LL': -1., 'UL': 1., 'itp': np.nan, 'tur': np.nan, 'procbias': 0., 'testbias': 0.,
+             'procdist': '', 'testdist': '', 'guardband': 'none', 'pfa_target': .08, 'cost_ratio': 10.}
+
+
+def parse_distconfig(config):
+    ''' Convert semicolon-separated distribution configuration string
+        (e.g. "dist=uniform; median=10; a=3") into a Distribution
+    '''
+    dist = {}
+    for keyval in str(config).split(';'):
+        key, val = keyval.split('=')
+        if key.strip() != 'dist':
+            dist[key.strip()] = float(val)
+        else:
+            dist[key.strip()] = val.strip()
+    return distributions.from_config(dist)
+
+
+def read_cases(fname):
+    ''' Read table of cases from a CSV or NPZ file
+
+        Args:
+            fname (str): File name. NPZ files contain one array per column.
+
+        Returns:
+            cases (dict): Column name: array of values
+    '''
+    if os.path.splitext(fname)[1].lower() == '.npz':
+        with np.load(fname) as data:
+            return {key: data[key] for key in data.files}
+
+    with open(fname, 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.reader(f))
+    header, rows = [h.strip() for h in rows[0]], rows[1:]
+    cases = {}
+    for i, name in enumerate(header):
+        values = [row[i].strip() if i < len(row) else '' for row in rows]
+        try:
+            cases[name] = np.array([float(v) if v else np.nan for v in values])
+        except ValueError:
+            cases[name] = np.array(values)
+    return cases
+
+
+def write_results(fname, results):
+    ''' Write results (dict of column arrays) to a CSV or NPZ file. '''
+    if os.path.splitext(fname)[1].lower() == '.npz':
+        np.savez_compressed(fname, **results)
+        return
+
+    with open(fname, 'w', encoding='utf-8', newline='') as f:
+        write_csv(f, results)
+
+
+def write_csv(f, results):
+    ''' Write results (dict of column arrays) as CSV to the open file f '''
+    writer = csv.writer(f)
+    writer.writerow(list(results.keys()))
+    writer.writerows(zip(*[np.asarray(v).tolist() for v in results.values()]))
+
+
+def _column(cases, name, size):
+    ''' Get column from the cases, filled with default value if missing '''
+    default = _DEFAULTS[name]
+    if name not in cases:
+        return np.full(size, default, dtype=object if isinstance(default, str) else float)
+    col = np.asarray(cases[name])
+    if isinstance(default, str):
+        return np.array(['' if (isinstance(v, float) and np.isnan(v)) else str(v).strip() for v in col],
+                        dtype=object)
+    col = col.astype(float)
+    return np.where(np.isnan(col), default, col)
+
+
+def _gbf_normal(method, itp, tur, sigma_proc, sigma_test, bias, testbias, pfa_target, cost_ratio):
+    ''' Guardband factor for arrays of normal cases (normalized to limits of +/-1)
+        that all use the same guardband method
+    '''
+    if method == 'none':
+        return np.ones(len(tur))
+    with np.errstate(invalid='ignore'):
+        if method == 'rss':
+            return guardband_tur.rss(tur)
+        if method == 'dobbert':
+            return guardband_tur.dobbert(tur)
+        if method == 'test':
+            return guardband_tur.test95(tur)
+        if method == 'rp10':
+            return guardband_tur.rp10(tur)
+        if method == 'mincost':
+            return guardband_tur.mincost(tur, itp, cost_ratio)
+        if method == 'minimax':
+            return guardband_tur.minimax(tur, cost_ratio)
+        if method == 'mincost_exact':
+            return guardband_cost.mincost(tur, itp, cost_ratio, 1, bias).gbf
+        if method == 'minimax_exact':
+            return guardband_cost.minimax(tur, cost_ratio, 1).gbf
+        if method == '4:1':
+            return guardband_tur.four_to_1(tur, itp)
+    if method != 'pfa':
+        raise ValueError(f'Unknown guardband method {method}')
+
+    # Solve for gbf giving target PFA (PFA increases with gbf)
+    def pfa(gbf):
+        return PFA_gaussian(bias, sigma_proc, sigma_test, -1, 1, 1-gbf, 1-gbf, testbias) - pfa_target
+    return _solve_increasing(pfa, np.zeros(len(tur)), np.full(len(tur), 2.))[0]
+
+
+def _evaluate_normal(LL, UL, mean, sigma_proc, sigma_test, testbias, policy, pfa_target, cost_ratio):
+    ''' Evaluate cases with normal process and test distributions, all arrays '''
+    half = (UL - LL) / 2
+    center = (UL + LL) / 2
+    # Normalize everything to limits of +/-1
+    bias = (mean - center) / half
+    sp = sigma_proc / half
+    st = sigma_test / half
+    tbias = testbias / half
+    itp = ndtr((1-bias)/sp) - ndtr((-1-bias)/sp)
+    tur = 1/st/2
+
+    gbf = np.full(len(LL), np.nan)
+    for method in np.unique(policy):
+        rows = policy == method
+        try:
+            gbf[rows] = float(method)
+            continue
+        except ValueError:
+            pass
+        gbf[rows] = _gbf_normal(method, itp[rows], tur[rows], sp[rows], st[rows], bias[rows],
+                                tbias[rows], pfa_target[rows], cost_ratio[rows])
+
+    gb = half * (1 - gbf)
+    return {'GBL': gb, 'GBU': gb, 'process_risk': 1 - itp,
+            'PFA': PFA_gaussian(mean, sigma_proc, sigma_test, LL, UL, gb, gb, testbias),
+            'PFR': PFR_gaussian(mean, sigma_proc, sigma_test, LL, UL, gb, gb, testbias)}
+
+
+def _evaluate_case(case):
+    ''' Evaluate one case using a RiskModel. Case is a tuple of
+        (LL, UL, procdist, testdist, testbias, policy, pfa_target, cost_ratio),
+        with distributions as config dictionaries.
+
+        Returns:
+            Tuple of GBL, GBU, process risk, PFA, PFR, and error message
+            ('' if the case was evaluated)
+    '''
+    from .risk_model import RiskModel
+    LL, UL, procdist, testdist, testbias, policy, pfa_target, cost_ratio = case
+    gbl = gbu = process_risk = np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        try:
+            model = RiskModel(distributions.from_config(procdist), distributions.from_config(testdist), (LL, UL))
+            model.testbias = testbias
+            process_risk = model.process_risk()
+            if policy == 'pfa':
+                model.guardband_pfa(pfa_target)
+            elif policy in ['mincost', 'minimax']:
+                model.guardband_cost(policy, costfa=cost_ratio, costfr=1)
+            elif policy in ['mincost_exact', 'minimax_exact']:
+                model.guardband_cost(policy.split('_')[0], costfa=cost_ratio, costfr=1, exact=True)
+            elif policy != 'none' and policy in GUARDBAND_METHODS:
+                model.guardband_tur(policy)
+            elif policy != 'none':
+                model.set_gbf(float(policy))
+            gbl, gbu = model.gbofsts
+            pfa, pfr = model.PFA(), model.PFR()
+        except CASE_ERRORS as exc:
+            return gbl, gbu, process_risk, np.nan, np.nan, f'{type(exc).__name__}: {exc}'
+    return gbl, gbu, process_risk, pfa, pfr, ''
+
+
+def _evaluate_cases(cases, workers=None, chunksize=64):
+    ''' Evaluate list of cases one at a time, across a process pool '''
+    workers = os.cpu_count() if workers is None else workers
+    if workers == 1 or len(cases) < 2*chunksize:
+        return [_evaluate_case(c) for c in cases]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_evaluate_case, cases, chunksize=chunksize))
+
+
+def evaluate(cases, workers=None):
+    ''' Evaluate global risk for a table of cases
+
+        Args:
+            cases (dict): Column name: array of values for each case. See module
+              documentation for columns.
+            workers (int): Number of processes for cases with non-normal
+              distributions. Defaults to the number of processors.
+
+        Returns:
+            results (dict): Input columns plus GBL, GBU, process_risk, PFA, and PFR arrays,
+              and error messages for cases that could not be evaluated
+    '''
+    size = len(next(iter(cases.values()))) if cases else 0
+    LL, UL = _column(cases, 'LL', size), _column(cases, 'UL', size)
+    LL, UL = np.minimum(LL, UL), np.maximum(LL, UL)
+    itp, tur = _column(cases, 'itp', size), _column(cases, 'tur', size)
+    procbias, testbias = _column(cases, 'procbias', size), _column(cases, 'testbias', size)
+    procdist, testdist = _column(cases, 'procdist', size), _column(cases, 'testdist', size)
+    policy = np.array([p.lower() for p in _column(cases, 'guardband', size)], dtype=object)
+    pfa_target, cost_ratio = _column(cases, 'pfa_target', size), _column(cases, 'cost_ratio', size)
+    for method in set(policy):
+        if method not in GUARDBAND_METHODS:
+            try:
+                float(method)
+            except ValueError as exc:
+                raise ValueError(f'Unknown guardband method {method}') from exc
+
+    # Parse each distinct distribution configuration once
+    parsed, invalid = {}, {}
+    for config in set(procdist) | set(testdist):
+        if config:
+            try:
+                parsed[config] = parse_distconfig(config)
+            except CASE_ERRORS as exc:
+                invalid[config] = f'{type(exc).__name__}: {exc}'
+    errors = np.array([invalid.get(procdist[i], invalid.get(testdist[i], '')) for i in range(size)],
+                      dtype=object)
+    half = (UL - LL) / 2
+    mean = (UL + LL) / 2 + procbias
+    sigma_proc = np.full(size, np.nan)
+    sigma_test = np.full(size, np.nan)
+    families = np.empty(size, dtype=object)
+    for i in np.flatnonzero(errors == ''):
+        dproc, dtest = parsed.get(procdist[i]), parsed.get(testdist[i])
+        try:
+            if dproc is not None:
+                mean[i], sigma_proc[i] = dproc.median(), dproc.std()
+            if dtest is not None:
+                sigma_test[i] = dtest.std()
+        except CASE_ERRORS as exc:
+            errors[i] = f'{type(exc).__name__}: {exc}'
+            continue
+        families[i] = (dproc.name if dproc is not None else 'normal',
+                       dtest.name if dtest is not None else 'normal')
+    valid = (errors == '')
+
+    finite = np.isfinite(half) & (half > 0)
+    errors[valid & ~finite] = 'Invalid specification limits'
+    noproc = (procdist == '')
+    rows = noproc & finite
+    sigma_proc[rows] = half[rows] * sigma_from_itp(itp[rows], procbias[rows] / half[rows])[0]
+    notest = (testdist == '')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma_test[notest] = half[notest] / tur[notest] / 2
+    # Cases whose itp or tur has no normal distribution
+    rows = valid & finite
+    for i in np.flatnonzero(rows & noproc & ~np.isfinite(sigma_proc)):
+        errors[i] = f'Cannot solve process distribution for itp={itp[i]} and procbias={procbias[i]}'
+    for i in np.flatnonzero(rows & notest & ~(np.isfinite(sigma_test) & (sigma_test > 0)) & (errors == '')):
+        errors[i] = f'Cannot solve test distribution for tur={tur[i]}'
+    valid = (errors == '')
+
+    results = {name: np.full(size, np.nan) for name in RESULT_COLUMNS}
+    normal = np.array([f == ('normal', 'normal') for f in families], dtype=bool) & valid
+    if np.any(normal):
+        out = _evaluate_normal(LL[normal], UL[normal], mean[normal], sigma_proc[normal], sigma_test[normal],
+                               testbias[normal], policy[normal], pfa_target[normal], cost_ratio[normal])
+        for name in RESULT_COLUMNS:
+            results[name][normal] = out[name]
+        for i in np.flatnonzero(normal & np.isnan(results['GBL'])):
+            errors[i] = f'Cannot solve guardband {policy[i]}'
+
+    # Remaining cases, one RiskModel each
+    other = np.flatnonzero(~normal & valid)
+    tasks = []
+    for i in other:
+        dproc = parsed.get(procdist[i])
+        if dproc is None:
+            dproc = distributions.get_distribution('normal', median=mean[i], std=sigma_proc[i])
+        dtest = parsed.get(testdist[i])
+        if dtest is None:
+            dtest = distributions.get_distribution('normal', median=0, std=sigma_test[i])
+        tasks.append((LL[i], UL[i], dproc.get_config(), dtest.get_config(), testbias[i], policy[i],
+                      pfa_target[i], cost_ratio[i]))
+    for i, (*out, error) in zip(other, _evaluate_cases(tasks, workers=workers)):
+        for name, value in zip(RESULT_COLUMNS, out):
+            results[name][i] = value
+        errors[i] = error
+
+    output = {name: np.asarray(value) for name, value in cases.items()}
+    output.update(results)
+    output['error'] = errors
+    return output
@@ -8,6 +8,8 @@ from ..common import distributions
 from . import risk
 from . import guardband
 from . import guardband_tur
+from . import guardband_cost
+from .conformance import DecisionEngine
 from .report.risk import RiskReport
 
 
@@ -138,6 +140,13 @@ class RiskModel:
         result = namedtuple('SpecificRisk', ['probability', 'accept'])
         return result(pfx, accept)
 
+    def decision_engine(self):
+        ''' Get a DecisionEngine for fast accept/reject decisions and specific risk
+            of many measurement results using this model's test distribution,
+            specification limits, guardbands, and test bias.
+        '''
+        return DecisionEngine.from_model(self)
+
     def process_risk(self):
         ''' Calculate total process risk, risk of process distribution being outside
             specification limits
@@ -238,12 +247,14 @@ class RiskModel:
             gbf = guardband_tur.four_to_1(tur, itp=self.get_itp())
         self.set_gbf(gbf)
 
-    def guardband_cost(self, method='mincost', costfa=100, costfr=10):
+    def guardband_cost(self, method='mincost', costfa=100, costfr=10, exact=False):
         ''' Guardband using cost-based method
 
             Notes:
                 mincost method: Minimize the total expected cost due to false decisions (Ref Easterling 1991)
                 minimax method: Minimize the maximum expected cost due to false decisions (Ref Easterling 1991)
+                exact: Minimize the expected cost numerically (see guardband_cost)
+                  rather than using Easterling's approximations
         '''
         tur = self.get_tur()
         if not self.is_simple():
@@ -251,7 +262,11 @@ class RiskModel:
                             'Results may not acheive desired PFA.')
 
         cc_over_cp = costfa/costfr
-        if method == 'minimax':
+        if exact and method == 'minimax':
+            gbf = guardband_cost.minimax(tur, costfa, costfr).gbf
+        elif exact:
+            gbf = guardband_cost.mincost(tur, self.get_itp(), costfa, costfr).gbf
+        elif method == 'minimax':
             gbf = guardband_tur.minimax(tur, cc_over_cp=cc_over_cp)
         else: # method == 'mincost':
             itp = self.get_itp()
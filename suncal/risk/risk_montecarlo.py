@@ -1,8 +1,11 @@
 ''' Calculate false accept and reject risk using Monte Carlo method '''
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+from scipy import stats
 
 from ..common import distributions
+from .risk_simpson import _test_cdf
 
 
 def PFAR_MC(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, N=100000, testbias=0):
@@ -62,3 +65,205 @@ def PFAR_MC(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, N=100000, testbias=0):
     except ZeroDivisionError:
         cpfa = 0.
     return Result(FA, FR, proc_samples, test_samples, cpfa)
+
+
+def _binomial_ci(k, n, conf=.95):
+    ''' Clopper-Pearson (exact) confidence interval on a binomial proportion k/n '''
+    if n == 0:
+        return (0., 1.)
+    alpha = 1 - conf
+    lower = stats.beta.ppf(alpha/2, k, n-k+1) if k > 0 else 0.
+    upper = stats.beta.ppf(1-alpha/2, k+1, n-k) if k < n else 1.
+    return (lower, upper)
+
+
+def _frozen(dist):
+    ''' Get frozen scipy distribution, which can be sent to another process '''
+    return dist.dist(**distributions.get_distargs(dist))
+
+
+def _mc_chunk(args):
+    ''' Run one chunk of the Monte Carlo risk simulation
+
+        Returns:
+            counts: (false accepts, false rejects, in-tolerance and accepted, accepted)
+            process_samples, test_samples: The first nkeep samples of the chunk
+    '''
+    dist_proc, base, shift, AL, AU, LL, UL, n, nkeep, seedseq = args
+    rng = np.random.default_rng(seedseq)
+    proc_samples = dist_proc.rvs(size=n, random_state=rng)
+    test_samples = base.rvs(size=n, random_state=rng)
+    test_samples += proc_samples - shift
+    accept = (test_samples > AL) & (test_samples < AU)
+    intol = (proc_samples >= LL) & (proc_samples <= UL)
+    naccept = np.count_nonzero(accept)
+    nintol_accept = np.count_nonzero(accept & intol)
+    counts = (naccept - nintol_accept,
+              np.count_nonzero(intol) - nintol_accept,
+              nintol_accept,
+              naccept)
+    return counts, proc_samples[:nkeep], test_samples[:nkeep]
+
+
+def PFAR_MC_chunked(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, N=100000, testbias=0,
+                    chunksize=1000000, workers=1, reservoir=10000, conf=.95, seed=None):
+    ''' Probability of False Accept/Reject using Monte Carlo Method, with the samples
+        generated in chunks (optionally across multiple processes) so memory use
+        is bounded for any N.
+
+        Args:
+            dist_proc (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible unit under test values from process
+            dist_test (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible test measurement values
+            LL (float):Lower specification limit (absolute)
+            UL (float): Upper specification limit (absolute)
+            GBL (float): Lower guardband, as offset. Test limit is LL + GBL.
+            GBU (float): Upper guardband, as offset. Test limit is UL - GBU.
+            N (int): Number of Monte Carlo samples
+            testbias (float): Bias (difference between distribution median and expected value)
+              in test distribution
+            chunksize (int): Number of samples generated at once
+            workers (int): Number of processes. Results for a given seed do not depend on workers.
+            reservoir (int): Number of (process, test) sample pairs to keep, for plotting
+            conf (float): Level of confidence for the binomial confidence intervals
+            seed (int): Random seed
+
+        Returns:
+            pfa: False accept probability, P(OOT and Accepted)
+            pfr: False reject probability, P(IT and Rejected)
+            cpfa: Conditional False Accept Probability, P(OOT | Accepted)
+            pfa_ci: Confidence interval (lower, upper) on pfa
+            pfr_ci: Confidence interval on pfr
+            cpfa_ci: Confidence interval on cpfa
+            process_samples: Random subset of the Monte Carlo samples for uut
+            test_samples: Test measurement samples corresponding to process_samples
+    '''
+    base, shift = _test_cdf(dist_test, testbias)
+    proc = _frozen(dist_proc)
+
+    nchunks = max(int(np.ceil(N / chunksize)), 1)
+    sizes = np.full(nchunks, N // nchunks)
+    sizes[:N % nchunks] += 1
+    # Each chunk keeps its share of the reservoir. Samples are independent,
+    # so the first samples of each chunk are a random subset.
+    nkeep = np.ceil(sizes * min(reservoir, N) / max(N, 1)).astype(int)
+    seeds = np.random.SeedSequence(seed).spawn(nchunks)
+    tasks = [(proc, base, shift, LL+GBL, UL-GBU, LL, UL, n, k, s) for n, k, s in zip(sizes, nkeep, seeds)]
+
+    if workers == 1 or nchunks == 1:
+        results = [_mc_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_mc_chunk, tasks))
+
+    nfa, nfr, nintol_accept, naccept = np.sum([r[0] for r in results], axis=0)
+    psamples = np.concatenate([r[1] for r in results])[:reservoir]
+    tsamples = np.concatenate([r[2] for r in results])[:reservoir]
+
+    Result = namedtuple('MCRiskChunked', ['pfa', 'pfr', 'cpfa', 'pfa_ci', 'pfr_ci', 'cpfa_ci',
+                                          'process_samples', 'test_samples'])
+    return Result(nfa/N, nfr/N, (naccept-nintol_accept)/naccept if naccept else 0.,
+                  _binomial_ci(nfa, N, conf), _binomial_ci(nfr, N, conf),
+                  _binomial_ci(naccept-nintol_accept, naccept, conf),
+                  psamples, tsamples)
+
+
+def _window_samples(dist, a, b, nstrata, rng):
+    ''' Draw two samples from each of nstrata equal-probability strata of dist
+        restricted to the interval (a, b).
+
+        Returns:
+            mass: Probability of dist between a and b
+            samples: Array of shape (nstrata, 2)
+    '''
+    u = (np.arange(nstrata)[:, np.newaxis] + rng.uniform(size=(nstrata, 2))) / nstrata
+    if a >= dist.median():
+        # Upper tail: work with survival function for precision
+        sa, sb = dist.sf(a), dist.sf(b)
+        mass = sa - sb
+        return mass, dist.isf(sb + mass*u)
+    fa, fb = dist.cdf(a), dist.cdf(b)
+    mass = fb - fa
+    return mass, dist.ppf(fa + mass*u)
+
+
+def PFAR_MC_stratified(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, N=10000, testbias=0, conf=.95, seed=None):
+    ''' Probability of False Accept/Reject using variance-reduced Monte Carlo,
+        suitable for very small risks.
+
+        The true value is sampled only within the windows near the specification
+        limits where a false accept or false reject is possible, weighted by the
+        exact process probability of each window, with stratified sampling of the
+        process cdf within each window. The probability of accepting each sampled
+        value is computed from the test distribution cdf rather than sampled
+        (conditional Monte Carlo). This takes the place of importance sampling
+        from a tilted test distribution: it has no test sampling variance, and no
+        likelihood-ratio weights are needed.
+
+        Args:
+            dist_proc (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible unit under test values from process
+            dist_test (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible test measurement values
+            LL (float):Lower specification limit (absolute)
+            UL (float): Upper specification limit (absolute)
+            GBL (float): Lower guardband, as offset. Test limit is LL + GBL.
+            GBU (float): Upper guardband, as offset. Test limit is UL - GBU.
+            N (int): Total number of Monte Carlo samples
+            testbias (float): Bias (difference between distribution median and expected value)
+              in test distribution
+            conf (float): Level of confidence for the confidence intervals
+            seed (int): Random seed
+
+        Returns:
+            pfa: False accept probability, P(OOT and Accepted)
+            pfr: False reject probability, P(IT and Rejected)
+            cpfa: Conditional False Accept Probability, P(OOT | Accepted)
+            pfa_ci: Confidence interval (lower, upper) on pfa
+            pfr_ci: Confidence interval on pfr
+            cpfa_ci: Confidence interval on cpfa
+    '''
+    rng = np.random.default_rng(seed)
+    AL, AU = LL + GBL, UL - GBU
+    base, offset = _test_cdf(dist_test, testbias)
+
+    def p_accept(x):
+        return np.maximum(base.cdf(AU - x + offset) - base.cdf(AL - x + offset), 0)
+
+    # Range of test error (test result - true value) beyond which acceptance is negligible
+    elo, ehi = base.ppf(1E-16) - offset, base.isf(1E-16) - offset
+    plo, phi = dist_proc.ppf(0), dist_proc.ppf(1)
+
+    # Windows of true value where false accept is possible (outside limits, test may accept)
+    fa_windows = [(max(plo, AL - ehi), LL), (UL, min(phi, AU - elo))]
+    # Windows where false reject is possible (inside limits, test may reject)
+    lo_end, hi_start = min(UL, AL - elo), max(LL, AU - ehi)
+    fr_windows = [(LL, UL)] if lo_end >= hi_start else [(LL, lo_end), (hi_start, UL)]
+
+    def estimate(windows, func, nsamples):
+        windows = [(a, b) for a, b in windows if b > a]
+        value = variance = 0.
+        nstrata = max(nsamples // (2*max(len(windows), 1)), 1)
+        for a, b in windows:
+            mass, x = _window_samples(dist_proc, a, b, nstrata, rng)
+            g = func(x) * mass
+            value += g.mean()
+            variance += ((g[:, 0] - g[:, 1])**2).sum() / 4 / nstrata**2
+        return value, variance
+
+    pfa, var_pfa = estimate(fa_windows, p_accept, N//2)
+    pfr, var_pfr = estimate(fr_windows, lambda x: 1 - p_accept(x), N - N//2)
+
+    # P(IT and accepted) = P(IT) - PFR, so CPFA = PFA / (PFA + P(IT) - PFR)
+    p_intol = dist_proc.cdf(UL) - dist_proc.cdf(LL)
+    intol_accepted = p_intol - pfr
+    p_accepted = pfa + intol_accepted
+    cpfa = pfa / p_accepted if p_accepted > 0 else 0.
+    var_cpfa = (intol_accepted**2 * var_pfa + pfa**2 * var_pfr) / p_accepted**4 if p_accepted > 0 else 0.
+
+    k = stats.norm.ppf((1+conf)/2)
+    Result = namedtuple('MCRiskEstimate', ['pfa', 'pfr', 'cpfa', 'pfa_ci', 'pfr_ci', 'cpfa_ci'])
+    return Result(pfa, pfr, cpfa,
+                  *[(max(v - k*np.sqrt(var), 0), v + k*np.sqrt(var))
+                    for v, var in [(pfa, var_pfa), (pfr, var_pfr), (cpfa, var_cpfa)]])
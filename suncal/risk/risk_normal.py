@@ -0,0 +1,266 @@
+''' False accept/reject risk for normal process and test distributions, computed in
+    closed form. With both distributions normal, the true value and the test
+    measurement are bivariate normal, and PFA and PFR are rectangle probabilities
+    of that distribution, evaluated exactly using Owen's T function. All functions
+    accept arrays and broadcast over them.
+
+    References:
+        [1] D. B. Owen. Tables for Computing Bivariate Normal Probabilities.
+            Annals of Mathematical Statistics. 27, 1075-1090 (1956)
+'''
+
+import numpy as np
+from scipy.special import ndtr, ndtri, owens_t
+
+
+def is_normal(dist):
+    ''' Determine whether the distribution (stats.rv_frozen or distributions.Distribution)
+        is a normal distribution with nonzero standard deviation
+    '''
+    if dist is None or getattr(getattr(dist, 'dist', None), 'name', None) != 'norm':
+        return False
+    try:
+        return bool(np.isfinite(dist.std()) and dist.std() > 0)
+    except (TypeError, ValueError):
+        return False
+
+
+def bivariate_cdf(h, k, rho):
+    ''' Cumulative distribution of the standard bivariate normal distribution,
+        P(Z1 < h, Z2 < k), where Z1 and Z2 have correlation rho.
+
+        Args:
+            h, k (float or array): Upper limits in standard deviations.
+              May be infinite.
+            rho (float or array): Correlation coefficient, -1 < rho < 1
+
+        Returns:
+            Probability (array)
+    '''
+    h, k, rho = np.broadcast_arrays(*[np.asarray(v, dtype=float) for v in (h, k, rho)])
+    finite = np.isfinite(h) & np.isfinite(k)
+    hf = np.where(finite, h, 1.)
+    kf = np.where(finite, k, 1.)
+    denom = np.sqrt(1 - rho**2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a_h = (kf / hf - rho) / denom
+        a_k = (hf / kf - rho) / denom
+        a_h = np.where(hf == 0, np.copysign(np.inf, kf - rho*hf), a_h)
+        a_k = np.where(kf == 0, np.copysign(np.inf, hf - rho*kf), a_k)
+        beta = np.where((hf*kf > 0) | ((hf*kf == 0) & (hf + kf >= 0)), 0, .5)
+        cdf = .5*ndtr(hf) + .5*ndtr(kf) - owens_t(hf, a_h) - owens_t(kf, a_k) - beta
+    cdf = np.where((hf == 0) & (kf == 0), .25 + np.arcsin(rho) / (2*np.pi), cdf)
+
+    # Infinite limits reduce to univariate normal
+    cdf = np.where(np.isposinf(h), ndtr(k), cdf)
+    cdf = np.where(np.isposinf(k), ndtr(h), cdf)
+    cdf = np.where(np.isneginf(h) | np.isneginf(k), 0., cdf)
+    cdf = np.where(np.isnan(h) | np.isnan(k) | np.isnan(rho), np.nan, cdf)
+    return np.clip(cdf, 0, 1)
+
+
+def sigma_from_itp(itp, bias=0, rtol=1E-13, maxiter=50):
+    ''' Standard deviation of a normal process with in-tolerance probability itp
+        between limits of -1 and +1, for arrays of itp and bias.
+
+        Args:
+            itp (float or array): In-tolerance probability (0-1)
+            bias (float or array): Process mean, as fraction of the limit (-1 < bias < 1)
+            rtol (float): Relative tolerance on the solution
+            maxiter (int): Maximum number of Newton iterations
+
+        Returns:
+            sigma (array): Process standard deviation. Nan where not converged.
+            converged (array): Boolean convergence flag for each element
+
+        Notes:
+            Closed form for zero bias. Otherwise solves for u = 1/sigma using Newton's
+            method, safeguarded by bisection, within the bracket
+            ndtri(itp)/(1-|bias|) <= u <= ndtri((1+itp)/2)/(1-|bias|).
+    '''
+    itp, bias = np.broadcast_arrays(np.asarray(itp, dtype=float), np.asarray(bias, dtype=float))
+    b = abs(bias)
+    valid = (itp > 0) & (itp < 1) & (b < 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lo = np.where(valid, np.maximum(ndtri(itp) / (1-b), 0), 0.)
+        hi = np.where(valid, ndtri((1+itp)/2) / (1-b), 1.)
+    u = hi.copy()
+    done = ~valid | (b == 0)
+    for _ in range(maxiter):
+        if np.all(done):
+            break
+        f = ndtr((1-b)*u) - ndtr((-1-b)*u) - itp
+        df = ((1-b)*np.exp(-((1-b)*u)**2/2) + (1+b)*np.exp(-((1+b)*u)**2/2)) / np.sqrt(2*np.pi)
+        lo = np.where(f < 0, u, lo)  # itp increases with u
+        hi = np.where(f > 0, u, hi)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            unew = u - f/df
+        outside = ~((unew > lo) & (unew < hi))
+        unew = np.where(outside, (lo + hi)/2, unew)
+        done = done | (abs(unew - u) <= rtol*u) | (f == 0)
+        u = np.where(done, u, unew)
+    converged = valid & done
+    with np.errstate(divide='ignore'):
+        sigma = np.where(converged, 1/u, np.nan)
+    return sigma, converged
+
+
+def _solve_increasing(func, lo, hi, xtol=1E-12, maxiter=100):
+    ''' Find roots of increasing vectorized func between arrays lo and hi using the
+        Illinois (modified regula falsi) method.
+
+        Returns:
+            x (array): Roots. Nan where the root is not bracketed.
+            converged (array): Boolean convergence flag for each element
+    '''
+    flo, fhi = func(lo), func(hi)
+    valid = (flo <= 0) & (fhi >= 0)
+    side = np.zeros(np.shape(lo))
+    x = lo.copy()
+    done = ~valid
+    for _ in range(maxiter):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            xnew = np.where(fhi != flo, hi - fhi * (hi - lo) / (fhi - flo), (lo + hi) / 2)
+        xnew = np.where(valid, np.clip(xnew, lo, hi), x)
+        done = done | (abs(xnew - x) < xtol)
+        x = xnew
+        if np.all(done):
+            break
+        fx = func(x)
+        below = fx < 0
+        lo, flo = np.where(below, x, lo), np.where(below, fx, flo)
+        hi, fhi = np.where(below, hi, x), np.where(below, fhi, fx)
+        # Halve the stale endpoint's value when the same side moves twice
+        fhi = np.where(below & (side < 0), fhi/2, fhi)
+        flo = np.where(~below & (side > 0), flo/2, flo)
+        side = np.where(below, -1, 1)
+    return np.where(valid, x, np.nan), valid & done
+
+
+def _standardize(mean_proc, sigma_proc, sigma_test, LL, UL, GBL, GBU, testbias):
+    ''' Get standardized limits of the true value (x) and test measurement (y),
+        and correlation between them
+    '''
+    sigma_y = np.sqrt(sigma_proc**2 + sigma_test**2)
+    mean_y = mean_proc + testbias
+    xlo = (LL - mean_proc) / sigma_proc
+    xhi = (UL - mean_proc) / sigma_proc
+    ylo = (LL + GBL - mean_y) / sigma_y
+    yhi = (UL - GBU - mean_y) / sigma_y
+    rho = sigma_proc / sigma_y
+    return xlo, xhi, ylo, yhi, rho
+
+
+def PFA_gaussian(mean_proc, sigma_proc, sigma_test, LL, UL, GBL=0, GBU=0, testbias=0):
+    ''' Probability of False Accept for normal process and test distributions
+
+        Args:
+            mean_proc (float or array): Mean of process distribution
+            sigma_proc (float or array): Standard deviation of process distribution
+            sigma_test (float or array): Standard deviation of test measurement
+            LL (float or array): Lower specification limit (absolute)
+            UL (float or array): Upper specification limit (absolute)
+            GBL (float or array): Lower guardband, as offset. Test limit is LL + GBL.
+            GBU (float or array): Upper guardband, as offset. Test limit is UL - GBU.
+            testbias (float or array): Bias in test measurement
+
+        Returns:
+            PFA (array): Probability of False Accept
+    '''
+    xlo, xhi, ylo, yhi, rho = _standardize(mean_proc, sigma_proc, sigma_test, LL, UL, GBL, GBU, testbias)
+    # Below LL and accepted, plus above UL and accepted (reflected to stay in the lower tail)
+    below = bivariate_cdf(xlo, yhi, rho) - bivariate_cdf(xlo, ylo, rho)
+    above = bivariate_cdf(-xhi, -ylo, rho) - bivariate_cdf(-xhi, -yhi, rho)
+    return np.maximum(below, 0) + np.maximum(above, 0)
+
+
+def PFR_gaussian(mean_proc, sigma_proc, sigma_test, LL, UL, GBL=0, GBU=0, testbias=0):
+    ''' Probability of False Reject for normal process and test distributions
+
+        Args:
+            mean_proc (float or array): Mean of process distribution
+            sigma_proc (float or array): Standard deviation of process distribution
+            sigma_test (float or array): Standard deviation of test measurement
+            LL (float or array): Lower specification limit (absolute)
+            UL (float or array): Upper specification limit (absolute)
+            GBL (float or array): Lower guardband, as offset. Test limit is LL + GBL.
+            GBU (float or array): Upper guardband, as offset. Test limit is UL - GBU.
+            testbias (float or array): Bias in test measurement
+
+        Returns:
+            PFR (array): Probability of False Reject
+    '''
+    xlo, xhi, ylo, yhi, rho = _standardize(mean_proc, sigma_proc, sigma_test, LL, UL, GBL, GBU, testbias)
+    # In tolerance and rejected low, plus in tolerance and rejected high
+    low = bivariate_cdf(xhi, ylo, rho) - bivariate_cdf(xlo, ylo, rho)
+    high = bivariate_cdf(-xlo, -yhi, rho) - bivariate_cdf(-xhi, -yhi, rho)
+    return np.maximum(low, 0) + np.maximum(high, 0)
+
+
+def PFA(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0):
+    ''' Calculate Probability of False Accept (Consumer Risk) for normal distributions.
+
+        Args:
+            dist_proc (stats.rv_frozen or distributions.Distribution):
+              Normal distribution of possible unit under test values from process
+            dist_test (stats.rv_frozen or distributions.Distribution):
+              Normal distribution of possible test measurement values
+            LL (float):Lower specification limit (absolute)
+            UL (float): Upper specification limit (absolute)
+            GBL (float or array): Lower guardband, as offset. Test limit is LL + GBL.
+            GBU (float or array): Upper guardband, as offset. Test limit is UL - GBU.
+            testbias (float or array): Bias (difference between distribution median and expected value)
+              in test distribution
+
+        Returns:
+            PFA (array): Probability of False Accept
+    '''
+    # Only the test distribution's spread matters. It is centered on the true value, plus testbias.
+    return PFA_gaussian(dist_proc.mean(), dist_proc.std(), dist_test.std(), LL, UL, GBL, GBU, testbias)
+
+
+def PFR(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0):
+    ''' Calculate Probability of False Reject (Producer Risk) for normal distributions.
+
+        Args:
+            dist_proc (stats.rv_frozen or distributions.Distribution):
+              Normal distribution of possible unit under test values from process
+            dist_test (stats.rv_frozen or distributions.Distribution):
+              Normal distribution of possible test measurement values
+            LL (float):Lower specification limit (absolute)
+            UL (float): Upper specification limit (absolute)
+            GBL (float or array): Lower guardband, as offset. Test limit is LL + GBL.
+            GBU (float or array): Upper guardband, as offset. Test limit is UL - GBU.
+            testbias (float or array): Bias (difference between distribution median and expected value)
+              in test distribution
+
+        Returns:
+            PFR (array): Probability of False Reject
+    '''
+    return PFR_gaussian(dist_proc.mean(), dist_proc.std(), dist_test.std(), LL, UL, GBL, GBU, testbias)
+
+
+def PFA_conditional(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0):
+    ''' Conditional Probability of False Accept for normal distributions.
+        Probability a DUT is OOT given it was accepted.
+
+        Args:
+            dist_proc (stats.rv_frozen or distributions.Distribution):
+              Normal distribution of possible unit under test values from process
+            dist_test (stats.rv_frozen or distributions.Distribution):
+              Normal distribution of possible test measurement values
+            LL (float):Lower specification limit (absolute)
+            UL (float): Upper specification limit (absolute)
+            GBL (float or array): Lower guardband, as offset. Test limit is LL + GBL.
+            GBU (float or array): Upper guardband, as offset. Test limit is UL - GBU.
+            testbias (float or array): Bias (difference between distribution median and expected value)
+              in test distribution
+
+        Returns:
+            CPFA (array): Conditional Probability of False Accept
+    '''
+    mean_proc, sigma_proc, sigma_test = dist_proc.mean(), dist_proc.std(), dist_test.std()
+    _, _, ylo, yhi, _ = _standardize(mean_proc, sigma_proc, sigma_test, LL, UL, GBL, GBU, testbias)
+    accepted = ndtr(yhi) - ndtr(ylo)
+    pfa = PFA_gaussian(mean_proc, sigma_proc, sigma_test, LL, UL, GBL, GBU, testbias)
+    return pfa / accepted
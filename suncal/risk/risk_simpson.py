@@ -4,6 +4,7 @@
 from collections import namedtuple
 import numpy as np
 from scipy.integrate import simpson
+from scipy import signal
 
 from ..common import distributions
 
@@ -34,49 +35,206 @@ def integration_limit_infinities(dist_proc, dist_test, LL, UL):
                   Limit(minus_inf_test, plus_inf_test))
 
 
-def PFA(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0, N=5001):
-    ''' Calculate Probability of False Accept (Consumer Risk) using
-        sampled distributions and Simpson integration.
+def _test_cdf(dist_test, testbias):
+    ''' Get the zero-location test distribution and the offset that shifts it
+        to be centered on a true value. The test distribution of a unit with
+        true value t has cdf(x) = base.cdf(x - t + offset).
+    '''
+    dtest_kwds = distributions.get_distargs(dist_test)
+    locorig = dtest_kwds.pop('loc', 0)
+    try:
+        base = dist_test.dist(loc=0, **dtest_kwds)
+    except TypeError:
+        base = dist_test.dist(**dtest_kwds)  # rv_histogram has no loc
+    offset = dist_test.median() - testbias - locorig
+    return base, offset
+
+
+def _batch_args(*args):
+    ''' Broadcast the guardband/bias arguments to a common shape, flattened '''
+    args = np.broadcast_arrays(*[np.asarray(a, dtype=float) for a in args])
+    return args[0].shape, [a.ravel() for a in args]
+
+
+def _batch_simpson(integrand, procvals, nbatch, maxsize=2**22):
+    ''' Simpson-integrate integrand(rows, procvals), which returns shape
+        (len(rows), len(procvals)), in blocks of rows to limit memory
+    '''
+    step = max(1, maxsize // len(procvals))
+    out = np.empty(nbatch)
+    for start in range(0, nbatch, step):
+        rows = slice(start, min(start+step, nbatch))
+        out[rows] = simpson(integrand(rows, procvals), x=procvals, axis=-1)
+    return out
+
+
+def PFA_batch(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0, N=5001):
+    ''' Calculate Probability of False Accept (Consumer Risk) for arrays of guardbands
+        and test biases using Simpson integration. The process pdf is evaluated once and
+        shared by every guardband, so a whole guardband curve costs about the same as
+        a single PFA.
 
         Args:
-            dist_proc (array): Sampled values from process distribution
-            dist_test (array): Sampled values from test measurement distribution
+            dist_proc (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible unit under test values from process
+            dist_test (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible test measurement values
             LL (float):Lower specification limit (absolute)
             UL (float): Upper specification limit (absolute)
-            GBL (float): Lower guardband, as offset. Test limit is LL + GBL.
-            GBU (float): Upper guardband, as offset. Test limit is UL - GBU.
-            testbias (float): Bias (difference between distribution median and expected value)
+            GBL (float or array): Lower guardband, as offset. Test limit is LL + GBL.
+            GBU (float or array): Upper guardband, as offset. Test limit is UL - GBU.
+            testbias (float or array): Bias (difference between distribution median and expected value)
               in test distribution
             N (int): Number of divisions for Simpson numerical integration
 
         Returns:
-            PFA (float): Probability of False Accept
+            PFA (array): Probability of False Accept, with the broadcast shape
+              of GBL, GBU, and testbias
     '''
+    shape, (GBL, GBU, testbias) = _batch_args(GBL, GBU, testbias)
     limits = integration_limit_infinities(dist_proc, dist_test, LL, UL)
-    test_expected = dist_test.median() - testbias
-    dtest_kwds = distributions.get_distargs(dist_test)
-    locorig = dtest_kwds.pop('loc', 0)
-    dtest_kwds.pop('loc', None)
+    base, offset = _test_cdf(dist_test, testbias)
 
-    def integrand(t):
-        d = dist_test.dist(loc=t-(test_expected-locorig), **dtest_kwds)
-        return (d.cdf(UL-GBU) - d.cdf(LL+GBL)) * dist_proc.pdf(t)
+    def integrand(rows, t):
+        shift = offset[rows, np.newaxis] - t
+        accept = base.cdf((UL-GBU)[rows, np.newaxis] + shift) - base.cdf((LL+GBL)[rows, np.newaxis] + shift)
+        return accept * dist_proc.pdf(t)
 
-    c = 0
+    c = np.zeros(len(GBL))
     if limits.proc.lo < LL:
         procvals = np.linspace(limits.proc.lo, LL, N)
-        jointpdf = integrand(procvals)
-        c += simpson(jointpdf, x=procvals)
+        c += _batch_simpson(integrand, procvals, len(GBL))
 
     if limits.proc.hi > UL:
         procvals = np.linspace(UL, limits.proc.hi, N)
-        jointpdf = integrand(procvals)
-        c += simpson(jointpdf, x=procvals)
+        c += _batch_simpson(integrand, procvals, len(GBL))
+    return c.reshape(shape)
 
-    return c
 
+def PFR_batch(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0, N=5001):
+    ''' Calculate Probability of False Reject (Producer Risk) for arrays of guardbands
+        and test biases using Simpson integration.
 
-def PFR(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0, N=5001):
+        Args:
+            dist_proc (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible unit under test values from process
+            dist_test (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible test measurement values
+            LL (float):Lower specification limit (absolute)
+            UL (float): Upper specification limit (absolute)
+            GBL (float or array): Lower guardband, as offset. Test limit is LL + GBL.
+            GBU (float or array): Upper guardband, as offset. Test limit is UL - GBU.
+            testbias (float or array): Bias (difference between distribution median and expected value)
+              in test distribution
+            N (int): Number of divisions for Simpson numerical integration
+
+        Returns:
+            PFR (array): Probability of False Reject, with the broadcast shape
+              of GBL, GBU, and testbias
+    '''
+    shape, (GBL, GBU, testbias) = _batch_args(GBL, GBU, testbias)
+    base, offset = _test_cdf(dist_test, testbias)
+
+    def integrand(rows, t):
+        shift = offset[rows, np.newaxis] - t
+        reject = base.cdf((LL+GBL)[rows, np.newaxis] + shift) + (1 - base.cdf((UL-GBU)[rows, np.newaxis] + shift))
+        return reject * dist_proc.pdf(t)
+
+    procvals = np.linspace(LL, UL, N)
+    return _batch_simpson(integrand, procvals, len(GBL)).reshape(shape)
+
+
+def _simpson_weights(n, h):
+    ''' Composite Simpson weights for n (odd) evenly spaced points with spacing h '''
+    if n < 3:
+        return np.zeros(n)
+    w = np.full(n, 2.)
+    w[1::2] = 4
+    w[0] = w[-1] = 1
+    return w * h / 3
+
+
+class AcceptanceTable:
+    ''' PFA, PFR, and probability of acceptance tabulated as functions of the
+        acceptance limits, for fast guardband searches.
+
+        The integrals
+            Gout(a) = P(test result < a and true value outside LL to UL)
+            Gin(a) = P(test result < a and true value inside LL to UL)
+        are tabulated on a grid of acceptance limits a. Simpson integration over
+        true values on a grid with the same spacing makes every Gout and Gin value
+        one term of a discrete convolution of the test cdf with the weighted process
+        pdf, so the whole table costs about as much as a single PFA integral.
+        Risk for any acceptance limits is then a difference of interpolated values.
+
+        Args:
+            dist_proc (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible unit under test values from process
+            dist_test (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible test measurement values
+            LL (float): Lower specification limit (absolute). Must be finite.
+            UL (float): Upper specification limit (absolute). Must be finite.
+            testbias (float): Bias (difference between distribution median and expected value)
+              in test distribution
+            margin (float): Guardbands from -margin to +margin are covered by the
+              table. Defaults to half the tolerance.
+            N (int): Number of grid points between LL and UL
+    '''
+    def __init__(self, dist_proc, dist_test, LL, UL, testbias=0, margin=None, N=2001):
+        N = N + (1 - N % 2)  # Odd, for Simpson
+        margin = (UL-LL)/2 if margin is None else abs(margin)
+        self.LL, self.UL = LL, UL
+        self.h = h = (UL-LL) / (N-1)
+
+        # Grid of true values, extended below LL and above UL to cover the process
+        limits = integration_limit_infinities(dist_proc, dist_test, LL, UL)
+        nlo = 2 * int(np.ceil(max(LL - limits.proc.lo, 0) / h / 2))
+        nhi = 2 * int(np.ceil(max(limits.proc.hi - UL, 0) / h / 2))
+        procvals = LL + h * np.arange(-nlo, N + nhi)
+        pdf = dist_proc.pdf(procvals)
+        q_in = np.zeros(len(procvals))
+        q_in[nlo:nlo+N] = _simpson_weights(N, h) * pdf[nlo:nlo+N]
+        q_out = np.zeros(len(procvals))
+        q_out[:nlo+1] = _simpson_weights(nlo+1, h) * pdf[:nlo+1]
+        q_out[nlo+N-1:] += _simpson_weights(nhi+1, h) * pdf[nlo+N-1:]
+
+        # Grid of acceptance limits. Test cdf depends only on (a - t), which takes
+        # len(procvals) + len(alimits) - 1 distinct values on the two grids.
+        nmargin = int(np.ceil(margin / h))
+        self.alimits = LL + h * np.arange(-nmargin, N + nmargin)
+        base, offset = _test_cdf(dist_test, testbias)
+        k = np.arange(-(len(procvals)-1), len(self.alimits))
+        cdf = base.cdf(self.alimits[0] - procvals[0] + k*h + offset)
+        valid = slice(len(procvals)-1, len(procvals)-1+len(self.alimits))
+        self.Gout = signal.convolve(cdf, q_out)[valid]
+        self.Gin = signal.convolve(cdf, q_in)[valid]
+        self.Pin = q_in.sum()
+
+    def _accept(self, G, GBL, GBU):
+        ''' Probability of acceptance from the tabulated G, for acceptance limits LL+GBL and UL-GBU '''
+        accept = (np.interp(self.UL - np.asarray(GBU, dtype=float), self.alimits, G) -
+                  np.interp(self.LL + np.asarray(GBL, dtype=float), self.alimits, G))
+        return np.maximum(accept, 0)
+
+    def PFA(self, GBL=0, GBU=0):
+        ''' Probability of False Accept for (arrays of) guardband offsets '''
+        return self._accept(self.Gout, GBL, GBU)
+
+    def PFR(self, GBL=0, GBU=0):
+        ''' Probability of False Reject for (arrays of) guardband offsets '''
+        return np.maximum(self.Pin - self._accept(self.Gin, GBL, GBU), 0)
+
+    def accepted(self, GBL=0, GBU=0):
+        ''' Probability of accepting a unit, for (arrays of) guardband offsets '''
+        return self._accept(self.Gout + self.Gin, GBL, GBU)
+
+    def PFA_conditional(self, GBL=0, GBU=0):
+        ''' Conditional Probability of False Accept for (arrays of) guardband offsets '''
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.PFA(GBL, GBU) / self.accepted(GBL, GBU)
+
+
+def PFA(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0, N=5001):
     ''' Calculate Probability of False Accept (Consumer Risk) using
         sampled distributions and Simpson integration.
 
@@ -94,22 +252,30 @@ def PFR(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0, N=5001):
         Returns:
             PFA (float): Probability of False Accept
     '''
-    test_expected = dist_test.median() - testbias
-    dtest_kwds = distributions.get_distargs(dist_test)
-    locorig = dtest_kwds.pop('loc', 0)
+    return PFA_batch(dist_proc, dist_test, LL, UL, GBL, GBU, testbias, N=N)[()]
 
-    def integrand1(t):
-        d = dist_test.dist(loc=t-(test_expected-locorig), **dtest_kwds)
-        return d.cdf(LL+GBL) * dist_proc.pdf(t)
 
-    def integrand2(t):
-        d = dist_test.dist(loc=t-(test_expected-locorig), **dtest_kwds)
-        return (1-d.cdf(UL-GBU)) * dist_proc.pdf(t)
+def PFR(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0, N=5001):
+    ''' Calculate Probability of False Reject (Producer Risk) using
+        Simpson integration.
+
+        Args:
+            dist_proc (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible unit under test values from process
+            dist_test (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible test measurement values
+            LL (float):Lower specification limit (absolute)
+            UL (float): Upper specification limit (absolute)
+            GBL (float): Lower guardband, as offset. Test limit is LL + GBL.
+            GBU (float): Upper guardband, as offset. Test limit is UL - GBU.
+            testbias (float): Bias (difference between distribution median and expected value)
+              in test distribution
+            N (int): Number of divisions for Simpson numerical integration
 
-    x = np.linspace(LL, UL, N)
-    c1 = simpson(integrand1(x), x=x)
-    c2 = simpson(integrand2(x), x=x)
-    return c1 + c2
+        Returns:
+            PFR (float): Probability of False Reject
+    '''
+    return PFR_batch(dist_proc, dist_test, LL, UL, GBL, GBU, testbias, N=N)[()]
 
 
 def PFA_conditional(dist_proc, dist_test, LL, UL, GBL=0, GBU=0, testbias=0, N=5001):
@@ -1,8 +1,321 @@
-''' Functions for generating Risk Curves '''
+''' Functions for generating Risk Curves
 
+    Sweeps evaluate PFA or PFR over an N-D grid of risk parameters. The grid
+    is defined by an ordered dictionary of {variable: values}, with one grid
+    axis per entry, and every grid point is evaluated in one broadcast calculation.
+
+    Sweep variables:
+        itp: In-tolerance probability of the process
+        pr: Process risk, 1 - itp
+        sig0: Specification limit over process standard deviation, SL/sigma
+        tur: Test uncertainty ratio
+        gbf: Guardband factor. Acceptance limit A = T * GBF.
+        gb, gbl, gbu: Guardband offsets (absolute)
+        tbias (or bias): Test measurement bias
+        pbias: Process bias
+
+    sweep_normal uses normal process and test distributions with specification
+    limits of +/-1. sweep starts from arbitrary process and test distributions,
+    scaling each about its median to meet the itp, sig0, or tur of the grid point,
+    and shifting by the biases. The input distributions are not modified.
+
+    >>> result = sweep_normal({'tur': [1.5, 2, 4], 'itp': np.linspace(.5, .95)})
+    >>> result.values.shape
+    (3, 50)
+'''
+
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+from scipy.special import ndtr
+
+from ..common import distributions
+from . import guardband_tur
+from .risk import PFA, PFR, PFA_batch, PFR_batch
+from .risk_normal import PFA_gaussian, PFR_gaussian, sigma_from_itp, _solve_increasing
+from .risk_simpson import _test_cdf
+
+
+SweepResult = namedtuple('SweepResult', ['values', 'names', 'axes', 'risk'])
+
+SWEEP_VARIABLES = ['itp', 'pr', 'sig0', 'tur', 'gbf', 'gb', 'gbl', 'gbu', 'tbias', 'pbias']
+GBF_METHODS = {'rss': guardband_tur.rss,
+               'rds': guardband_tur.rss,
+               'dobbert': guardband_tur.dobbert,
+               'rp10': guardband_tur.rp10,
+               'test': guardband_tur.test95,
+               '4:1': guardband_tur.four_to_1}
+
+
+def _grid(axes, defaults):
+    ''' Place each sweep axis along its own dimension of the grid
+
+        Args:
+            axes (dict): Ordered {variable: values}
+            defaults (dict): Values of variables that are not swept
+
+        Returns:
+            names (list): Name of the variable along each axis
+            axvals (list): Array of values along each axis
+            values (dict): Value of every variable. Swept variables are
+              arrays that broadcast to the grid shape.
+    '''
+    names = ['tbias' if name.lower() == 'bias' else name.lower() for name in axes]
+    for name in names:
+        if name not in SWEEP_VARIABLES:
+            raise ValueError(f'Unknown sweep variable {name}')
+    if len(set(names)) != len(names):
+        raise ValueError('Sweep variables must be unique')
+    if len(set(names) & {'itp', 'pr', 'sig0'}) > 1:
+        raise ValueError('Only one of itp, pr, and sig0 may be swept')
+    if 'gbf' in names and set(names) & {'gb', 'gbl', 'gbu'}:
+        raise ValueError('Cannot sweep gbf with gb, gbl, or gbu')
+
+    values = dict(defaults)
+    axvals = [np.atleast_1d(np.asarray(v, dtype=float)) for v in axes.values()]
+    for i, (name, vals) in enumerate(zip(names, axvals)):
+        shape = [1] * len(axvals)
+        shape[i] = len(vals)
+        values[name] = vals.reshape(shape)
+        if name in ['itp', 'pr', 'sig0']:
+            # The swept variable alone defines the process spread
+            values.update({k: None for k in {'itp', 'pr', 'sig0'} - {name}})
+        elif name == 'gbf':
+            values.update({'gb': None, 'gbl': None, 'gbu': None})
+        elif name in ['gb', 'gbl', 'gbu']:
+            values['gbf'] = None
+    if values.get('gb') is not None:
+        values['gbl'] = values['gbu'] = values['gb']
+    if values.get('pr') is not None:
+        values['itp'] = 1 - np.asarray(values['pr'], dtype=float)
+    return names, axvals, values
+
+
+def _gbf(gbf, tur, itp):
+    ''' Guardband factor from a number or name of TUR-based guardband method '''
+    if isinstance(gbf, str):
+        try:
+            method = GBF_METHODS[gbf.lower()]
+        except KeyError as exc:
+            raise ValueError(f'Unknown guardband method {gbf}') from exc
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return method(tur, itp) if gbf == '4:1' else method(tur)
+    return np.asarray(gbf, dtype=float)
+
+
+def sweep_normal(axes, itp=.95, tur=4, gbf=1, sig0=None, tbias=0, pbias=0, risk='PFA'):
+    ''' Sweep PFA or PFR with normal process and test distributions
+
+        Args:
+            axes (dict): Ordered {variable: values} defining the sweep grid.
+              Variables may be 'itp', 'pr', 'sig0', 'tur', 'gbf', 'tbias', 'pbias'.
+            itp (float): In-tolerance probability, if itp, pr, and sig0 are not swept
+            tur (float): Test uncertainty ratio, if not swept
+            gbf (float or str): Guardband factor, or name of guardband method
+              ('rss', 'dobbert', 'rp10', 'test', '4:1'), if not swept
+            sig0 (float): SL/sigma of the process. Overrides itp when not None.
+            tbias (float): Test measurement bias, as fraction of SL, if not swept
+            pbias (float): Process bias, as fraction of SL, if not swept
+            risk (str): Calculate 'PFA' or 'PFR'
+
+        Returns:
+            values (array): Risk at each grid point, with one axis per sweep variable
+            names (list): Sweep variable along each axis
+            axes (list): Values along each axis
+            risk (str): 'PFA' or 'PFR'
+    '''
+    assert risk.lower() in ['pfa', 'pfr']
+    defaults = {'itp': itp if sig0 is None else None, 'pr': None, 'sig0': sig0,
+                'tur': tur, 'gbf': gbf, 'tbias': tbias, 'pbias': pbias}
+    names, axvals, v = _grid(axes, defaults)
+    if set(names) & {'gb', 'gbl', 'gbu'}:
+        raise ValueError('Normal sweeps define guardbands using gbf')
+    shape = tuple(len(a) for a in axvals)
+
+    pbias = np.asarray(v['pbias'], dtype=float)
+    tur = np.asarray(v['tur'], dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        if v['sig0'] is not None:
+            sigma = 1 / np.asarray(v['sig0'], dtype=float)
+            itp = ndtr((1-pbias)/sigma) - ndtr((-1-pbias)/sigma)
+        else:
+            itp = np.asarray(v['itp'], dtype=float)
+            sigma, _ = sigma_from_itp(itp, pbias)  # Nan where no process has this itp
+        sigmatest = 1/tur/2
+
+        gb = 1 - _gbf(v['gbf'], tur, itp)  # Guardband factor to absolute guardband width
+        riskfunc = PFR_gaussian if risk.lower() == 'pfr' else PFA_gaussian
+        values = riskfunc(pbias, sigma, sigmatest, -1, 1, gb, gb, np.asarray(v['tbias'], dtype=float))
+
+    # Grid points with no valid process or test distribution, or no guardband
+    solved = (sigma > 0) & np.isfinite(sigma) & (sigmatest > 0) & np.isfinite(sigmatest) & np.isfinite(gb)
+    values = np.where(solved, values, np.nan)
+    return SweepResult(np.broadcast_to(values, shape).copy(), names, axvals, risk.upper())
+
+
+def _process_scale(dist_proc, LL, UL, itp, shift):
+    ''' Scale factor, about the median, that gives dist_proc in-tolerance
+        probability itp after shifting by shift. Nan where no solution.
+    '''
+    med = dist_proc.median()
+    lo, hi = dist_proc.interval(1-1E-12)
+    itp, shift = np.broadcast_arrays(np.asarray(itp, dtype=float), np.asarray(shift, dtype=float))
+    shape = itp.shape
+    itp, shift = itp.ravel(), shift.ravel()
+    up, down = UL - med - shift, med + shift - LL
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Solve for the inverse scale s. Process within limits when s reaches smax.
+        smax = np.maximum((hi - med) / up, (med - lo) / down) * 1.01
+        smax = np.where((up > 0) & (down > 0) & np.isfinite(smax), smax, np.nan)
+
+        def func(s):
+            return dist_proc.cdf(med + s*up) - dist_proc.cdf(med - s*down) - itp
+        s, converged = _solve_increasing(func, np.zeros_like(itp), smax)
+        return np.where(converged & (s > 0), 1/s, np.nan).reshape(shape)
+
+
+def _simpson_weights(N):
+    ''' Simpson rule weights for N (odd) equally spaced points over a unit interval '''
+    w = np.ones(N)
+    w[1:-1:2] = 4
+    w[2:-1:2] = 2
+    return w / 3 / (N-1)
+
+
+def _sweep_points(dist_proc, dist_test, LL, UL, params, risk='PFA', N=2001, maxsize=2**21):
+    ''' Calculate risk at a set of sweep points by Simpson integration.
+
+        Args:
+            dist_proc, dist_test: Unscaled process and test distributions
+            LL, UL (float): Specification limits
+            params (tuple): Arrays of process scale, process shift, test scale,
+              test bias, lower guardband, and upper guardband for each point
+            risk (str): 'PFA' or 'PFR'
+            N (int): Number of integration points per region
+
+        Returns:
+            risk (array): Risk at each point
+    '''
+    kp, sp, kt, tb, gbl, gbu = params
+    base, bmed = _test_cdf(dist_test, 0)
+    med = dist_proc.median()
+    lo, hi = dist_proc.interval(1-1E-12)
+    N = N + 1 - N % 2
+    u01 = np.linspace(0, 1, N)
+    weights = _simpson_weights(N)
+
+    # Integrate over the unscaled process variable u, where t = med + sp + kp*(u - med)
+    uL = np.clip(med + (LL - med - sp) / kp, lo, hi)
+    uU = np.clip(med + (UL - med - sp) / kp, lo, hi)
+    if risk.lower() == 'pfr':
+        regions = [(uL, np.maximum(uL, uU))]
+    else:
+        regions = [(np.full_like(uL, lo), uL), (uU, np.full_like(uU, hi))]
+
+    out = np.zeros(len(kp))
+    step = max(1, maxsize // N)
+    for start in range(0, len(kp), step):
+        rows = slice(start, start+step)
+        col = np.s_[rows, np.newaxis]
+        AL, AU = (LL + gbl)[col], (UL - gbu)[col]
+        for a, b in regions:
+            u = a[col] + (b - a)[col] * u01
+            t = med + sp[col] + kp[col] * (u - med)
+            with np.errstate(invalid='ignore'):
+                lower = base.cdf((AL - t - tb[col]) / kt[col] + bmed)
+                upper = base.cdf((AU - t - tb[col]) / kt[col] + bmed)
+            prob = upper - lower if risk.lower() == 'pfa' else 1 - upper + lower
+            out[rows] += (prob * dist_proc.pdf(u)) @ weights * (b - a)[rows]
+    return out
+
 
-from .risk import PFA, PFR, PFR_norm, PFA_norm
+def _sweep_chunk(args):
+    ''' Evaluate one chunk of sweep points (for process pool) '''
+    return _sweep_points(*args)
+
+
+def sweep(dist_proc, dist_test, LL, UL, axes, GBL=0, GBU=0, testbias=0, risk='PFA',
+          itp=None, sig0=None, tur=None, gbf=None, pbias=0, N=2001, workers=1):
+    ''' Sweep PFA or PFR of arbitrary process and test distributions
+
+        Args:
+            dist_proc (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible unit under test values from process
+            dist_test (stats.rv_frozen or distributions.Distribution):
+              Distribution of possible test measurement values
+            LL (float): Lower specification limit (absolute)
+            UL (float): Upper specification limit (absolute)
+            axes (dict): Ordered {variable: values} defining the sweep grid.
+              Variables may be 'itp', 'pr', 'sig0', 'tur', 'gbf', 'gb', 'gbl',
+              'gbu', 'tbias', 'pbias'.
+            GBL (float): Lower guardband, as offset, if not swept
+            GBU (float): Upper guardband, as offset, if not swept
+            testbias (float): Bias in test distribution, if not swept
+            risk (str): Calculate 'PFA' or 'PFR'
+            itp (float): In-tolerance probability, if not swept. Process distribution
+              is scaled about its median to meet itp.
+            sig0 (float): SL/sigma of process distribution, if not swept, where SL
+              is half the tolerance
+            tur (float): Test uncertainty ratio, if not swept. Test distribution
+              is scaled to meet the TUR.
+            gbf (float or str): Guardband factor or method name ('rss', 'dobbert',
+              'rp10', 'test', '4:1'). Overrides GBL and GBU when not None.
+            pbias (float): Process bias (absolute shift of process distribution)
+            N (int): Number of points in each Simpson integration region
+            workers (int): Number of processes. Defaults to 1, or the number
+              of processors if None.
+
+        Returns:
+            values (array): Risk at each grid point, with one axis per sweep variable
+            names (list): Sweep variable along each axis
+            axes (list): Values along each axis
+            risk (str): 'PFA' or 'PFR'
+
+        Notes:
+            dist_proc and dist_test are left unchanged.
+    '''
+    assert risk.lower() in ['pfa', 'pfr']
+    defaults = {'itp': itp, 'pr': None, 'sig0': sig0, 'tur': tur, 'gbf': gbf,
+                'gb': None, 'gbl': GBL, 'gbu': GBU, 'tbias': testbias, 'pbias': pbias}
+    names, axvals, v = _grid(axes, defaults)
+    shape = tuple(len(a) for a in axvals)
+    half = (UL - LL) / 2
+
+    shift = np.asarray(v['pbias'], dtype=float)
+    if v['sig0'] is not None:
+        kp = half / np.asarray(v['sig0'], dtype=float) / dist_proc.std()
+    elif v['itp'] is not None:
+        kp = _process_scale(dist_proc, LL, UL, v['itp'], shift)
+    else:
+        kp = np.ones(1)
+
+    kt = np.ones(1) if v['tur'] is None else half / (2*np.asarray(v['tur'], dtype=float)) / dist_test.std()
+
+    if v['gbf'] is not None:
+        if isinstance(v['gbf'], str):
+            med = dist_proc.median()
+            itppt = (dist_proc.cdf(med + (UL - med - shift) / kp)
+                     - dist_proc.cdf(med + (LL - med - shift) / kp))
+            gbf = _gbf(v['gbf'], half / (2*kt*dist_test.std()), itppt)
+        else:
+            gbf = _gbf(v['gbf'], None, None)
+        gbl = gbu = half * (1 - gbf)
+    else:
+        gbl, gbu = v['gbl'], v['gbu']
+
+    params = [np.broadcast_to(np.asarray(p, dtype=float), shape).ravel()
+              for p in (kp, shift, kt, v['tbias'], gbl, gbu)]
+    npoints = len(params[0])
+    workers = os.cpu_count() if workers is None else workers
+    if workers == 1 or npoints < 2*workers:
+        values = _sweep_points(dist_proc, dist_test, LL, UL, params, risk, N)
+    else:
+        chunks = np.array_split(np.arange(npoints), workers)
+        args = [(dist_proc, dist_test, LL, UL, [p[c] for p in params], risk, N) for c in chunks]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            values = np.concatenate(list(pool.map(_sweep_chunk, args)))
+    return SweepResult(values.reshape(shape), names, axvals, risk.upper())
 
 
 def PFA_sweep_simple(xvar='itp', zvar='TUR', xvals=None, zvals=None,
@@ -14,7 +327,7 @@ def PFA_sweep_simple(xvar='itp', zvar='TUR', xvals=None, zvals=None,
             zvar (string): Step variable - 'itp', 'tur', 'gbf', 'tbias', 'pbias'
             xvals (array): List of sweep values for x axis
             zvals (array): List of step values for step/z axis
-            GBFdlft (float): Default guardband value, if gbf is not being swept
+            GBFdlft (float or str): Default guardband value or method, if gbf is not being swept
             itpdflt (float): Default itp value, if itp is not being swept
             TURdflt (float): Default tur value, if tur is not being swept
             sig0 (float): Process standard deviation in terms of #SL, overrides itp
@@ -23,69 +336,25 @@ def PFA_sweep_simple(xvar='itp', zvar='TUR', xvals=None, zvals=None,
             risk (string): Calculate 'PFA' or 'PFR'
 
         Returns:
-            risk (array): 2D array (shape len(xvals) x len(zvals)) of risk values
+            risk (array): 2D array (shape len(zvals) x len(xvals)) of risk values
     '''
     assert xvar.lower() in ['itp', 'tur', 'gbf', 'tbias', 'pbias', 'sig0']
     assert zvar.lower() in ['itp', 'tur', 'gbf', 'tbias', 'pbias', 'sig0', 'none']
-    assert risk.lower() in ['pfa', 'pfr']
-
-    if zvar == 'none':
-        zvals = [None]
-        xx = np.array([xvals])
-        zz = np.array([])
-    else:
-        xx, zz = np.meshgrid(xvals, zvals)
-    riskfunc = PFR_norm if risk.lower() == 'pfr' else PFA_norm
-
-    if xvar.lower() == 'itp':
-        itp = xx
-    elif zvar.lower() == 'itp':
-        itp = zz
-    else:
-        itp = np.full(xx.shape, itpdflt)
-
-    if xvar.lower() == 'tur':
-        TUR = xx
-    elif zvar.lower() == 'tur':
-        TUR = zz
-    else:
-        TUR = np.full(xx.shape, TURdflt)
-
-    if xvar.lower() == 'gbf':
-        GBF = xx
-    elif zvar.lower() == 'gbf':
-        GBF = zz
-    else:
-        GBF = np.full(xx.shape, GBFdflt)
+    axes = {xvar: xvals} if zvar.lower() == 'none' else {zvar: zvals, xvar: xvals}
+    result = sweep_normal(axes, itp=itpdflt, tur=TURdflt, gbf=GBFdflt, sig0=sig0,
+                          tbias=tbias, pbias=pbias, risk=risk)
+    return result.values.reshape(-1, len(xvals))
 
-    if xvar.lower() == 'tbias':
-        tbias = xx
-    elif zvar.lower() == 'tbias':
-        tbias = zz
-    else:
-        tbias = np.full(xx.shape, tbias)
 
-    if xvar.lower() == 'pbias':
-        pbias = xx
-    elif zvar.lower() == 'pbias':
-        pbias = zz
-    else:
-        pbias = np.full(xx.shape, pbias)
-
-    if xvar.lower() == 'sig0':
-        sig0 = 1/xx
-    elif zvar.lower() == 'sig0':
-        sig0 = 1/zz
-    else:
-        sig0 = np.full(xx.shape, 1/sig0 if sig0 is not None else None)
-
-    curves = np.empty_like(xx)
-    for zidx in range(len(zvals)):
-        for xidx in range(len(xvals)):
-            curves[zidx, xidx] = riskfunc(itp[zidx, xidx], TUR[zidx, xidx], GBF[zidx, xidx],
-                                          sig0=sig0[zidx, xidx],
-                                          biastest=tbias[zidx, xidx], biasproc=pbias[zidx, xidx])
-    return curves
+def _with_param(dist, param, value):
+    ''' Copy of distribution with one parameter changed '''
+    try:
+        config = dist.get_config()
+    except AttributeError:
+        # stats.rv_frozen
+        return dist.dist(**{**distributions.get_distargs(dist), param: value})
+    config[param] = value
+    return distributions.from_config(config)
 
 
 def PFA_sweep(xvarparam, zvarparam, xvardist=None, zvardist=None, xvals=None, zvals=None,
@@ -94,10 +363,10 @@ def PFA_sweep(xvarparam, zvarparam, xvardist=None, zvardist=None, xvals=None, zv
     ''' Sweep PFA vs. any distribution parameter for producing risk curves
 
         Args:
-            xvarparam (string): Name of distribution parameter for sweep variable, or 'gb', 'gbl', 'gbu'
-            zvarparam (string):Name of distribution parameter for step variable, or 'gb', 'gbl', 'gbu'
-            xvardist (Distribution): Distribution to change in x sweep
-            zvardist (Distribution): Distribution to change in z step
+            xvarparam (string): Name of distribution parameter for sweep variable, or 'gb', 'gbl', 'gbu', 'bias'
+            zvarparam (string):Name of distribution parameter for step variable, or 'gb', 'gbl', 'gbu', 'bias'
+            xvardist (Distribution): Distribution to change in x sweep (dist_proc or dist_test)
+            zvardist (Distribution): Distribution to change in z step (dist_proc or dist_test)
             xvals (array): List of sweep values for x axis
             zvals (array): List of step values for step/z axis
             dist_proc (Distribution): Process distribution
@@ -106,40 +375,49 @@ def PFA_sweep(xvarparam, zvarparam, xvardist=None, zvardist=None, xvals=None, zv
             GBL, GBU (float): Lower and upper guardbands, absolute
             testbias (float): Bias in test measurement
             risk (string): Calculate 'PFA' or 'PFR'
-            approx (bool): Use trapezoidal approximation for integral (faster but less accurate)
+            approx (bool): Unused. Kept for compatibility.
 
         Returns:
-            risk (array): 2D array (shape len(xvals) x len(zvals)) of risk values
+            risk (array): 2D array (shape len(zvals) x len(xvals)) of risk values
+
+        Notes:
+            Distributions are copied with the swept parameter changed, leaving
+            the arguments unchanged. Use sweep() to sweep itp, tur, gbf, etc.
     '''
-    riskfunc = PFR if risk == 'pfr' else PFA
+    riskfunc = PFR if risk.lower() == 'pfr' else PFA
+    batchfunc = PFR_batch if risk.lower() == 'pfr' else PFA_batch
+    limits = ['gb', 'gbl', 'gbu', 'bias']
+
+    def apply(param, vardist, val, dists, lims):
+        ''' Apply swept value to copies of distributions or limits '''
+        param = param.lower() if param.lower() in limits else param
+        if param in ['gb', 'gbl']:
+            lims['GBL'] = val
+        if param in ['gb', 'gbu']:
+            lims['GBU'] = val
+        if param == 'bias':
+            lims['testbias'] = val
+        if param not in limits:
+            key = 'proc' if vardist is dist_proc else 'test'
+            dists[key] = _with_param(dists[key], param, val)
 
-    xx, zz = np.meshgrid(xvals, zvals)
-    curves = np.empty_like(xx)
+    xvals = np.asarray(xvals, dtype=float)
+    curves = np.empty((len(zvals), len(xvals)))
     for zidx, z in enumerate(zvals):
-        if zvarparam.lower() == 'gb':
-            GBL = z
-            GBU = z
-        elif zvarparam.lower() == 'gbl':
-            GBL = z
-        elif zvarparam.lower() == 'gbu':
-            GBU = z
-        elif zvarparam.lower() == 'bias':
-            testbias = z
-        else:
-            zvardist.update_kwds(**{zvarparam: z})
+        zdists = {'proc': dist_proc, 'test': dist_test}
+        zlims = {'GBL': GBL, 'GBU': GBU, 'testbias': testbias}
+        apply(zvarparam, zvardist, z, zdists, zlims)
+
+        if xvarparam.lower() in limits:
+            # Guardband and bias sweeps evaluate the whole row in one integration
+            xlims = dict(zlims)
+            apply(xvarparam, xvardist, xvals, zdists, xlims)
+            curves[zidx, :] = batchfunc(zdists['proc'], zdists['test'], LL, UL,
+                                        xlims['GBL'], xlims['GBU'], xlims['testbias'])
+            continue
 
         for xidx, x in enumerate(xvals):
-            if xvarparam.lower() == 'gb':
-                GBL = x
-                GBU = x
-            elif xvarparam.lower() == 'gbl':
-                GBL = x
-            elif xvarparam.lower() == 'gbu':
-                GBU = x
-            elif xvarparam.lower() == 'bias':
-                testbias = x
-            else:
-                xvardist.update_kwds(**{xvarparam: x})
-
-            curves[zidx, xidx] = riskfunc(dist_proc, dist_test, LL, UL, GBL, GBU, testbias, approx=approx)
+            dists, lims = dict(zdists), dict(zlims)
+            apply(xvarparam, xvardist, x, dists, lims)
+            curves[zidx, xidx] = riskfunc(dists['proc'], dists['test'], LL, UL, **lims)
     return curves
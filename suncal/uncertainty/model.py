@@ -10,7 +10,7 @@ import numpy as np
 import sympy
 from pint import DimensionalityError
 
-from ..common import uparser, matrix, unitmgr
+from ..common import uparser, matrix, unitmgr, autodiff
 from .variables import Variables
 from .results.gum import GumResults, GumOutputData
 from .results.monte import McResults
@@ -64,6 +64,41 @@ class ModelBase:
                     else:
                         raise ValueError('Correlated samples must have same length')
 
+    def _degrees_freedom_numeric(self, Uy, Cx):
+        ''' Welch-Satterthwaite effective degrees of freedom of each model function,
+            evaluated numerically from the sensitivity matrix and the variables'
+            (memoized) uncertainties and degrees of freedom.
+
+            Args:
+                Uy: Numeric covariance matrix of the model functions
+                Cx: Numeric sensitivity matrix
+
+            Returns:
+                Dictionary of {functionname: degf}
+        '''
+        uncerts = list(self.variables.uncertainties.values())
+        if not uncerts:
+            return {name: np.inf for name in self.functionnames}
+        nu = np.array(list(self.variables.degrees_freedom.values()), dtype=float)
+        uy = [np.sqrt(Uy[i][i]) for i in range(len(self.functionnames))]
+
+        withunits = any(unitmgr.has_units(x) for x in uncerts + uy) or any(
+            unitmgr.has_units(c) for row in Cx for c in row)
+        if withunits:
+            # Dimensionless ratio of each input's contribution to the combined uncertainty
+            ratios = np.array([[np.nan if u == 0 else unitmgr.strip_units(c*ux/u, reduce=True)
+                                for c, ux in zip(row, uncerts)] for row, u in zip(Cx, uy)], dtype=float)
+        else:
+            with np.errstate(all='ignore'):
+                ratios = np.asarray(Cx, dtype=float) * np.asarray(uncerts, dtype=float)
+                ratios = ratios / np.asarray(uy, dtype=float)[:, np.newaxis]
+
+        with np.errstate(all='ignore'):
+            denom = (ratios**4 / nu).sum(axis=1)
+            degf = 1 / denom
+        degf = np.where(np.isnan(degf), np.inf, degf)
+        return dict(zip(self.functionnames, degf))
+
 
 class Model(ModelBase):
     ''' Measurement model of made from string expression parsed by Sympy
@@ -104,6 +139,7 @@ class Model(ModelBase):
             varnames.remove(constname)
 
         self.variables = Variables(*varnames)
+        self._symbolic_cache = {}  # Symbolic results depend only on which inputs are correlated
 
     def _build_baseexprs(self):
         ''' Parse expressions into base variables only (substitute any chained dependencies
@@ -133,9 +169,18 @@ class Model(ModelBase):
         ''' Sensitivity matrix (Cx), See GUM 6.2.1.3 '''
         Cx = []
         for exp in self.basesympys.values():
+            # Only differentiate the terms of a sum that depend on each variable.
+            # Avoids O(N^2) derivatives for models with many inputs.
+            terms = exp.args if isinstance(exp, sympy.Add) else (exp,)
+            varterms = {}
+            for term in terms:
+                for symbol in term.free_symbols:
+                    varterms.setdefault(str(symbol), []).append(term)
+
             Cx_row = []
             for var in self.varnames:
-                Cx_row.append(sympy.Derivative(exp, sympy.Symbol(var), evaluate=True).simplify())
+                part = sympy.Add(*varterms.get(var, []))
+                Cx_row.append(sympy.Derivative(part, sympy.Symbol(var), evaluate=True).simplify())
             Cx.append(Cx_row)
         return Cx
 
@@ -173,11 +218,19 @@ class Model(ModelBase):
         return self.eval()
 
     def calculate_symbolic(self):
-        ''' Run the calculation, symbolic
+        ''' Run the calculation, symbolic. The result is cached and only
+            recomputed when the set of correlated inputs changes.
 
             Returns:
                 GumOutputData containing sympy expression for results
         '''
+        key = (tuple(self.varnames), self.variables.correlated_pairs())
+        if key not in self._symbolic_cache:
+            self._symbolic_cache[key] = self._calculate_symbolic()
+        return self._symbolic_cache[key]
+
+    def _calculate_symbolic(self):
+        ''' Run the symbolic calculation without caching '''
         Cx = self._sensitivity()
         CxT = matrix.transpose(Cx)
         Ux = self.variables.covariance_symbolic()
@@ -200,16 +253,11 @@ class Model(ModelBase):
         subvalues.update(self.constants)
         expected = matrix.eval_dict(symbolic.expected, subvalues)
         uncerts = matrix.eval_dict(symbolic.uncertainty, subvalues)
-        subvalues.update(expected)
-        subvalues.update(uncerts)  # degf needs to sub these too
 
         Cx = matrix.eval_matrix(symbolic.Cx, subvalues)
         Ux = matrix.eval_matrix(symbolic.Ux, subvalues)
         Uy = matrix.eval_matrix(symbolic.Uy, subvalues)
-        degf = matrix.eval_dict(symbolic.degf, subvalues)
-        degf = {name: unitmgr.strip_units(df, reduce=True) for name, df in degf.items()}
-        degf = {name: np.inf if np.isnan(value) else value for name, value in degf.items()}
-        degf = dict(zip(self.functionnames, degf.values()))        # Rename to use funciton name instead of nu_XXX
+        degf = self._degrees_freedom_numeric(Uy, Cx)
         uncerts = dict(zip(self.functionnames, uncerts.values()))  # Rename to use funciton name instead of u_XXX
 
         warns = []
@@ -219,17 +267,20 @@ class Model(ModelBase):
         outnumeric = GumOutputData(uncerts, Uy, Ux, Cx, degf, expected, self.sympys)
         return GumResults(outnumeric, symbolic, self.variables.info,  self.constants, self.descriptions, warns)
 
-    def monte_carlo(self, samples=1000000, copula='gaussian'):
+    def monte_carlo(self, samples=1000000, copula='gaussian', incremental=False):
         ''' Calculate Monte Carlo samples
 
             Args:
                 samples (int): number of random samples
                 copula (str): 'gaussian' or 't'
+                incremental (bool): Reuse the random samples of any input or
+                  uncertainty component not changed since the previous incremental
+                  calculation, only resampling the modified ones.
 
             Returns:
                 McResults instance
         '''
-        samplevalues = self.variables.sample(samples, copula=copula)
+        samplevalues = self.variables.sample(samples, copula=copula, incremental=incremental)
         samplevalues.update(self.constants)
         values = matrix.eval_dict(self.basesympys, samplevalues)
 
@@ -265,14 +316,18 @@ class ModelCallable(Model):
             names (str): Names of the parameters returned by function
             unitsin (list of str): Units associated with each argument to function
             unitsout (list of str): Units expected from each output of function
+            autodiff (bool): Calculate sensitivity coefficients using automatic differentiation
+              when the function supports it (numpy ufuncs, unitless inputs). Falls back
+              on numerical differentiation otherwise.
         '''
-    def __init__(self, function, names=None, argnames=None, unitsin=None, unitsout=None):
+    def __init__(self, function, names=None, argnames=None, unitsin=None, unitsout=None, autodiff=True):
         # unitsin, unitsout should be ureg units (not string)
         super().__init__()
         self.function = function  # N-output function
         self.functionnames = names
         self.unitsin = unitsin
         self.unitsout = unitsout
+        self.autodiff = autodiff
         self.variables = None
         self.argnames = argnames
         self._callable_name = None
@@ -387,6 +442,30 @@ class ModelCallable(Model):
 
     def _sensitivity(self):
         ''' Sensitivity matrix [Cx] '''
+        if self.autodiff:
+            try:
+                return self._sensitivity_autodiff()
+            except Exception:  # Function can't operate on dual numbers. Any exception is possible here.
+                logging.info('Automatic differentiation of {} failed. Using numerical derivatives.'.format(
+                    str(self.function)))
+        return self._sensitivity_numeric()
+
+    def _sensitivity_autodiff(self):
+        ''' Sensitivity matrix [Cx] using forward-mode automatic differentiation '''
+        self._extract_output_names()
+        means = self.variables.expected
+        if any(unitmgr.has_units(v) for v in means.values()):
+            raise TypeError('Automatic differentiation does not support units')
+
+        names = self.variables.names
+        _, jac = autodiff.jacobian(lambda *args: uparser.callf(self.function, dict(zip(names, args))),
+                                   *means.values())
+        if jac.shape != (len(self.functionnames), len(names)):
+            raise ValueError('Function output does not match function names')
+        return [list(row) for row in jac]
+
+    def _sensitivity_numeric(self):
+        ''' Sensitivity matrix [Cx] using central differences '''
         means = self.variables.expected
         uncerts = self.variables.uncertainties
         delta = 1E-6  # delta parameter for numeric derivative
@@ -407,17 +486,6 @@ class ModelCallable(Model):
             CxT.append([((result1[fname]-result2[fname])/(2*dx)) for fname in self.functionnames])
         return matrix.transpose(CxT)
 
-    def _degrees_freedom(self, Uy, Ux, Cx):
-        ''' Get expressions for degrees of freedom. Uses Cx, Ux, Uy, already computed '''
-        variabledegfs = self.variables.degrees_freedom
-        uncerts = [np.sqrt(Ux[i][i]) for i in range(len(Ux))]
-        degf = {}
-        for i, funcname in enumerate(self.functionnames):
-            denom = sum((u*c)**4/v for u, c, v in zip(uncerts, Cx[i], variabledegfs.values()))
-            df = (Uy[i][i]**2 / denom)
-            degf[funcname] = df
-        return degf
-
     def expected(self):
         ''' Calculate expected value of all functions in model '''
         return self.eval(self.variables.expected)
@@ -435,8 +503,7 @@ class ModelCallable(Model):
         Uy = matrix.matmul(matrix.matmul(Cx, Ux), CxT)
         uncerts = {name: np.sqrt(x) for name, x in zip(self.functionnames, matrix.diagonal(Uy))}
         uncerts = dict(zip(self.functionnames, uncerts.values()))  # Rename to use funciton name instead of u_XXX
-        degf = self._degrees_freedom(Uy, Ux, Cx)
-        degf = {name: unitmgr.strip_units(df, reduce=False) for name, df in zip(self.functionnames, degf.values())}
+        degf = self._degrees_freedom_numeric(Uy, Cx)
 
         warns = []
         if not all(all(np.isfinite(u) for u in k) for k in Uy):
@@ -445,17 +512,20 @@ class ModelCallable(Model):
         outnumeric = GumOutputData(uncerts, Uy, Ux, Cx, degf, expected, None)
         return GumResults(outnumeric, None, self.variables.info, None, None)
 
-    def monte_carlo(self, samples=1000000, copula='gaussian'):
+    def monte_carlo(self, samples=1000000, copula='gaussian', incremental=False):
         ''' Calculate Monte Carlo samples
 
             Args:
                 samples (int): number of random samples
                 copula (str): 'gaussian' or 't'
+                incremental (bool): Reuse the random samples of any input or
+                  uncertainty component not changed since the previous incremental
+                  calculation, only resampling the modified ones.
 
             Returns:
                 McResults instance
         '''
-        samples = self.variables.sample(samples, copula=copula)
+        samples = self.variables.sample(samples, copula=copula, incremental=incremental)
         values = self._eval_vectorized(samples)
 
         warns = []
@@ -1,7 +1,8 @@
 ''' Manage RandomVariables assigned to an uncertainty propagation model '''
 
 import warnings
-from collections import namedtuple
+import itertools
+from collections import namedtuple, Counter
 import numpy as np
 import sympy
 from scipy import stats
@@ -16,6 +17,60 @@ from ..datasets.dataset import uncert_autocorrelated
 VariableInfo = namedtuple('VariableInfo', ['expected', 'uncertainty', 'degf',
                                            'correlation', 'descriptions', 'components'])
 
+# Version numbers assigned to variables and components whenever they change.
+# Shared counter so a new component can never reuse the version of an old one.
+_versions = itertools.count(1)
+
+# Set DEBUG_STATS = True to count memoized statistic hits and misses in STAT_COUNTS,
+# keyed by '<statistic>.hit' and '<statistic>.miss'
+DEBUG_STATS = False
+STAT_COUNTS = Counter()
+
+
+def _memoized(obj, name, func):
+    ''' Get statistic `name` of obj from its cache, calling func() to
+        recompute it if obj.version has changed since it was stored
+    '''
+    version = obj.version
+    cached = obj._statcache.get(name)
+    if cached is not None and cached[0] == version:
+        if DEBUG_STATS:
+            STAT_COUNTS[f'{name}.hit'] += 1
+        return cached[1]
+
+    if DEBUG_STATS:
+        STAT_COUNTS[f'{name}.miss'] += 1
+    value = func()
+    obj._statcache[name] = (version, value)
+    return value
+
+
+class SampleCache:
+    ''' Most recent random samples of a variable or uncertainty component, reused
+        by incremental Monte Carlo while the component is unchanged.
+    '''
+    def __init__(self):
+        self.key = None
+        self.source = None  # Reference keeps correlated source samples alive so id() stays unique
+        self.samples = None
+
+    @staticmethod
+    def _sourcekey(source):
+        ''' Number of samples, or identity of the normal samples used for correlated sampling '''
+        return id(source) if isinstance(source, np.ndarray) else source
+
+    def get(self, version, source):
+        ''' Get cached samples, or None if the version or sample source has changed '''
+        if self.samples is not None and self.key == (version, self._sourcekey(source)):
+            return self.samples
+        return None
+
+    def put(self, version, source, samples):
+        ''' Store samples generated with the version and source '''
+        self.key = (version, self._sourcekey(source))
+        self.source = source
+        self.samples = samples
+
 
 class RandomVariable:
     ''' A random variable with one Type A and 0+ Type B uncertainties. Note
@@ -31,7 +86,10 @@ class RandomVariable:
         self._typeb = []  # List of Type B components
         self.description = ''
         self.num_new_meas = self.value.size
-        self._autocorr = True
+        self._autocor = True
+        self._version = next(_versions)
+        self._samplecache = SampleCache()
+        self._statcache = {}
 
     def __repr__(self):
         return f'<RandomVariable {self.expected} ± {self.uncertainty} (k = 1)>'
@@ -63,11 +121,33 @@ class RandomVariable:
             self.num_new_meas = self.value.size
         if description is not None:
             self.description = description
+        self._touch()
         return self   # for chaining
 
+    def _touch(self):
+        ''' Mark the variable as changed '''
+        self._version = next(_versions)
+
+    @property
+    def value(self):
+        ''' Measured value(s) of the RandomVariable '''
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        ''' Set measured value(s), marking the variable as changed '''
+        self._value = value
+        self._touch()
+
+    @property
+    def version(self):
+        ''' Token that changes whenever the variable or any of its Type B components change '''
+        return (self._version,) + tuple(b.version for b in self._typeb)
+
     def clear_typeb(self):
         ''' Remove all type b components '''
         self._typeb = []
+        self._touch()
         return self
 
     def typeb(self, dist='normal', description='', **kwargs):
@@ -82,10 +162,15 @@ class RandomVariable:
                 The same RandomVariable object (use for chaining multiple typeb function calls)
         '''
         self._typeb.append(Typeb(dist=dist, nominal=self.expected, description=description, **kwargs))
+        self._touch()
         return self   # for chaining
 
     def _typea_variance_ofmean(self):
         ''' Calculate Type A variance of the mean '''
+        return _memoized(self, 'typea_variance', self._calc_typea_variance_ofmean)
+
+    def _calc_typea_variance_ofmean(self):
+        ''' Calculate Type A variance of the mean, without caching '''
         if self.value.size < 2:
             units = unitmgr.split_units(self.value)[1]
             if units:
@@ -113,27 +198,35 @@ class RandomVariable:
     @property
     def expected(self):
         ''' Expected value of the RandomVariable '''
-        return self.value.mean()
+        return _memoized(self, 'expected', self.value.mean)
 
     @property
     def variance(self):
         ''' Combined variance of the RandomVariable '''
+        return _memoized(self, 'variance', self._calc_variance)
+
+    def _calc_variance(self):
+        ''' Combined variance, without caching '''
         variance = self._typea_variance_ofmean()
         for typeb in self._typeb:
             typeb_variance = typeb.variance
             if unitmgr.has_units(variance) and not unitmgr.has_units(typeb_variance):
                 typeb_variance = unitmgr.Quantity(typeb_variance, variance.units)
-            variance += typeb_variance
+            variance = variance + typeb_variance
         return variance
 
     @property
     def uncertainty(self):
         ''' Combined standard uncertainty of the RandomVariable '''
-        return np.sqrt(self.variance)
+        return _memoized(self, 'uncertainty', lambda: np.sqrt(self.variance))
 
     @property
     def degrees_freedom(self):
         ''' Effective degrees of freedom of the RandomVariable '''
+        return _memoized(self, 'degrees_freedom', self._calc_degrees_freedom)
+
+    def _calc_degrees_freedom(self):
+        ''' Effective degrees of freedom, without caching '''
         nu_a = np.inf
         if self.value.size > 1:
             nu_a = self.value.size - 1
@@ -155,6 +248,16 @@ class RandomVariable:
     @property
     def info(self):
         ''' Information about the RandomVariable uncertainty components '''
+        uncerts = [dict(unc) for unc in _memoized(self, 'info', self._calc_info)]
+        # Names and descriptions can be assigned directly, so they aren't cached
+        for i, typeb in enumerate(self._typeb, start=len(uncerts)-len(self._typeb)):
+            uncerts[i] = {'name': typeb.name, 'description': typeb.description, **uncerts[i]}
+        return uncerts
+
+    def _calc_info(self):
+        ''' Information about the uncertainty components, without caching.
+            Type B names and descriptions are added by info.
+        '''
         uncerts = []
         typeaunc = self._typea_variance_ofmean()
         if typeaunc != 0:
@@ -163,14 +266,12 @@ class RandomVariable:
                 'description': f'Type A uncertainty from {self.value.size} measurements',
                 'data': self.value,
                 'num_newmeas': self.num_new_meas,
-                'uncertainty': np.sqrt(self._typea_variance_ofmean()),
+                'uncertainty': np.sqrt(typeaunc),
                 'degf': self.value.size - 1
             })
 
         for typeb in self._typeb:
             uncerts.append({
-                'name': typeb.name,
-                'description': typeb.description,
                 'dist': typeb.distname,
                 'uncertainty': typeb.uncertainty,
                 'degf': typeb.degf
@@ -190,71 +291,83 @@ class RandomVariable:
         idx = names.index(name)
         return self._typeb[idx]
 
-    def sample(self, nsamples):
-        ''' Generate random samples (uncorrelated with other variables)
+    def _sample_typea(self, draw, source, incremental=False):
+        ''' Random samples of the Type A component, or the expected value if there
+            is no Type A data.
 
             Args:
-                nsamples (int): Number of random samples
-
-            Returns:
-                Array of sampled values
+                draw (callable): Function returning standard normal samples
+                source: Number of samples, or the normal samples used for correlation
+                incremental (bool): Reuse the cached samples if the Type A data is unchanged.
+                  Standard normal samples are cached and scaled by the current
+                  uncertainty, so changing a Type B component doesn't redraw them.
         '''
-        samples = 0
+        if self.value.size <= 1:
+            return self.value.mean()
+
+        standard = None
+        if incremental:
+            standard = self._samplecache.get(self._version, source)
+        if standard is None:
+            standard = draw()
+            if incremental:
+                self._samplecache.put(self._version, source, standard)
+
         units = None
-        if self.value.size > 1:
-            mean = self.value.mean()
-            unc = self.uncertainty
-            if unitmgr.has_units(mean):
-                units = mean.units
-                mean = mean.magnitude
-                unc = unc.to(units).magnitude
-            samples = stats.norm.rvs(mean, unc, nsamples)
-            if units:
-                samples = samples * units
-        else:
-            samples = self.value.mean()
-            if unitmgr.has_units(samples):
-                units = samples.units
+        mean = self.value.mean()
+        unc = self.uncertainty
+        if unitmgr.has_units(mean):
+            units = mean.units
+            mean = mean.magnitude
+            unc = unc.to(units).magnitude
+        samples = standard * unc + mean
+        if units:
+            samples = samples * units
+        return samples
 
-        for typeb in self._typeb:
-            b_samples = typeb.sample(nsamples)
+    def _add_typeb_samples(self, samples, bsamples):
+        ''' Add samples of each Type B component to the Type A samples '''
+        units = unitmgr.split_units(samples)[1]
+        for b_samples in bsamples:
             if units and not unitmgr.has_units(b_samples):
                 b_samples = b_samples * units
-            samples += b_samples
+            samples = samples + b_samples  # Not in-place, samples may be cached
         return samples
 
-    def sample_correlated(self, norm_samples):
+    def sample(self, nsamples, incremental=False):
+        ''' Generate random samples (uncorrelated with other variables)
+
+            Args:
+                nsamples (int): Number of random samples
+                incremental (bool): Reuse samples from the previous call for
+                  any component that has not changed since
+
+            Returns:
+                Array of sampled values
+        '''
+        samples = self._sample_typea(lambda: stats.norm.rvs(size=nsamples),
+                                     nsamples, incremental)
+        return self._add_typeb_samples(
+            samples, (typeb.sample(nsamples, incremental=incremental) for typeb in self._typeb))
+
+    def sample_correlated(self, norm_samples, incremental=False):
         ''' Generate random samples, correlated with other RandomVariables
 
             Args:
                 norm_samples (array): array of random normal samples generated
                 with multivariate_normal, correlated with other
                 norm_samples used for other RandomVariables.
+                incremental (bool): Reuse samples from the previous call for
+                  any component that has not changed since, if norm_samples
+                  is the same array
 
             Returns:
                 Array of random samples
          '''
-        samples = 0
-        units = None
-        if self.value.size > 1:
-            mean = self.value.mean()
-            unc = self.uncertainty
-            if unitmgr.has_units(mean):
-                units = mean.units
-                mean = mean.magnitude
-                unc = unc.to(units).magnitude
-            samples += stats.norm.ppf(norm_samples, loc=mean, scale=unc)
-            if units:
-                samples = samples * units
-        else:
-            samples = self.value.mean()
-
-        for typeb in self._typeb:
-            b_samples = typeb.sample_correlated(norm_samples)
-            if units and not unitmgr.has_units(b_samples):
-                b_samples = b_samples * units
-            samples += b_samples
-        return samples
+        samples = self._sample_typea(lambda: stats.norm.ppf(norm_samples),
+                                     norm_samples, incremental)
+        return self._add_typeb_samples(
+            samples, (typeb.sample_correlated(norm_samples, incremental=incremental) for typeb in self._typeb))
 
 
 class Typeb:
@@ -277,20 +390,47 @@ class Typeb:
         self.description = description
         self.name = 'Type B' if name is None else name
         self.nominal = nominal
-        self.degf = np.inf
+        self._statcache = {}
+        self._degf = np.inf
         self.kwargs = kwargs
-        self.units = kwargs.pop('units', None)
-        if self.units and isinstance(self.units, str):
-            self.units = unitmgr.parse_units(self.units)
+        units = kwargs.pop('units', None)
+        if units and isinstance(units, str):
+            units = unitmgr.parse_units(units)
+        self.units = units
 
         kwargs_magnitude = self._parse_kwds(kwargs)
         self.distribution = get_distribution(dist, **kwargs_magnitude)
+        self.version = next(_versions)
+        self._samplecache = SampleCache()
 
     def set_kwargs(self, **newkwargs):
         ''' Set new kwargs to the Distribution instance '''
         self.kwargs.update(newkwargs)
         kwargs_magnitude = self._parse_kwds(self.kwargs)
         self.distribution = get_distribution(self.distname, **kwargs_magnitude)
+        self.version = next(_versions)
+
+    @property
+    def degf(self):
+        ''' Degrees of freedom of the component '''
+        return self._degf
+
+    @degf.setter
+    def degf(self, value):
+        ''' Set degrees of freedom, marking the component as changed '''
+        self._degf = value
+        self.version = next(_versions)
+
+    @property
+    def units(self):
+        ''' Units of the component '''
+        return self._units
+
+    @units.setter
+    def units(self, value):
+        ''' Set units, marking the component as changed '''
+        self._units = value
+        self.version = next(_versions)
 
     def _parse_kwds(self, kwargs):
         ''' Parse the keyword args, converting string uncertainties such as "1%" into values '''
@@ -341,6 +481,10 @@ class Typeb:
     @property
     def variance(self):
         ''' Variance of the component '''
+        return _memoized(self, 'typeb_variance', self._calc_variance)
+
+    def _calc_variance(self):
+        ''' Variance of the component, without caching '''
         variance = self.distribution.var()
         if self.units:
             variance = variance * self.units**2
@@ -349,7 +493,7 @@ class Typeb:
     @property
     def uncertainty(self):
         ''' Standard uncertainty of the component '''
-        return np.sqrt(self.variance)
+        return _memoized(self, 'typeb_uncertainty', lambda: np.sqrt(self.variance))
 
     def isvalid(self):
         ''' Check whether the distribution parameters are valid '''
@@ -359,35 +503,47 @@ class Typeb:
             return False
         return True
 
-    def sample(self, nsamples=1000000):
+    def _sample(self, draw, source, incremental=False):
+        ''' Draw samples, or reuse the cached ones if the component is unchanged '''
+        if incremental:
+            samples = self._samplecache.get(self.version, source)
+            if samples is not None:
+                return samples
+
+        samples = draw()
+        if self.units:
+            samples = samples * self.units
+        if incremental:
+            self._samplecache.put(self.version, source, samples)
+        return samples
+
+    def sample(self, nsamples=1000000, incremental=False):
         ''' Generate random samples
 
             Args:
                 nsamples (int): Number of random samples
+                incremental (bool): Reuse samples from the previous call
+                  if the component has not changed since
 
             Returns:
                 1D Array of random samples
         '''
-        samples = self.distribution.rvs(nsamples)
-        if self.units:
-            samples = samples * self.units
-        return samples
+        return self._sample(lambda: self.distribution.rvs(nsamples), nsamples, incremental)
 
-    def sample_correlated(self, norm_samples):
+    def sample_correlated(self, norm_samples, incremental=False):
         ''' Generate random samples, correlated with other RandomVariables
 
             Args:
                 norm_samples (array): array of random normal samples generated
                 with multivariate_normal, correlated with other
                 norm_samples used for other RandomVariables.
+                incremental (bool): Reuse samples from the previous call
+                  if the component has not changed since
 
             Returns:
                 1D Array of random samples
          '''
-        samples = self.distribution.ppf(norm_samples)
-        if self.units:
-            samples = samples * self.units
-        return samples
+        return self._sample(lambda: self.distribution.ppf(norm_samples), norm_samples, incremental)
 
     def pdf(self, stds=4, num=200):
         ''' Get X and Y of probability Density Function
@@ -412,12 +568,26 @@ class Variables:
 
         Args:
             *names (str): names of all new RandomVariables to define
+
+        Note:
+            Correlations are stored sparsely, only for pairs of variables with
+            nonzero correlation, so models with many inputs stay fast.
     '''
     def __init__(self, *names):
         self.variables = {}
         for name in names:
             self.variables[name] = RandomVariable()
-        self._correlation = np.eye(len(self.variables))
+        self._correlations = {}  # {(name1, name2): coefficient} with name1 < name2, nonzero only
+        self._normcache = (None, None)  # Correlated normal samples for incremental sampling
+
+    @staticmethod
+    def _pairkey(var1, var2):
+        ''' Key into the sparse correlation dictionary '''
+        return (var1, var2) if var1 < var2 else (var2, var1)
+
+    def _index(self):
+        ''' Dictionary of variable name to index in names '''
+        return {name: i for i, name in enumerate(self.variables)}
 
     @property
     def names(self):
@@ -446,40 +616,34 @@ class Variables:
 
     @property
     def correlation_coefficients(self):
-        ''' Dictionary of correlation coefficients between RandomVariables, including
-            0 for uncorrelated values
+        ''' Dictionary of correlation coefficients between RandomVariables, as
+            sigma_XY symbols. Only correlated (nonzero) pairs are included.
         '''
         symbols = {}
-        for idx1, name1 in enumerate(self.names):
-            for idx2, name2 in enumerate(self.names):
-                if name1 < name2:
-                    symbols[f'sigma_{name1}{name2}'] = self._correlation[idx1, idx2]
-                    symbols[f'sigma_{name2}{name1}'] = self._correlation[idx2, idx1]
+        for (name1, name2), coeff in self._correlations.items():
+            symbols[f'sigma_{name1}{name2}'] = coeff
+            symbols[f'sigma_{name2}{name1}'] = coeff
         return symbols
 
     @property
     def correlation_list(self):
-        ''' Get parseable dictionary of correlation coefficients
+        ''' Get parseable dictionary of nonzero correlation coefficients
             in the form {(v1, v2): correlation}
         '''
-        coeffs = {}
-        for idx1, name1 in enumerate(self.names):
-            for idx2, name2 in enumerate(self.names):
-                if name1 < name2:
-                    coeffs[(name1, name2)] = self._correlation[idx1, idx2]
-        return coeffs
+        return dict(self._correlations)
 
     @property
     def info(self):
-        ''' Info about all the RandomVariables '''
+        ''' Info about all the RandomVariables. Correlation only includes nonzero coefficients. '''
         components = {name: v.info for name, v in self.variables.items()}
         descriptions = {name: v.description for name, v in self.variables.items()}
         return VariableInfo(self.expected, self.uncertainties, self.degrees_freedom,
                             self.correlation_coefficients, descriptions, components)
 
     def symbol_values(self):
-        ''' Return dictionary of ALL variable values, uncertainties, correlations
-            (use for substituting in sympy expressions)
+        ''' Return dictionary of ALL variable values, uncertainties, and nonzero correlations
+            (use for substituting in sympy expressions). Zero correlations never
+            appear in the symbolic expressions.
          '''
         # Rename uncertainties to u_X, degf to nu_X, for substitution into sympy expressions
         symbols = self.expected
@@ -513,10 +677,18 @@ class Variables:
                 correlation (float): correlation coefficient between
                   the two variables
         '''
-        idx1 = self.names.index(var1)
-        idx2 = self.names.index(var2)
-        self._correlation[idx1, idx2] = correlation
-        self._correlation[idx2, idx1] = correlation
+        for name in (var1, var2):
+            if name not in self.variables:
+                raise ValueError(f'{name} is not a variable in the model')
+        if var1 == var2:
+            return
+
+        correlation = float(correlation)
+        key = self._pairkey(var1, var2)
+        if correlation == 0:
+            self._correlations.pop(key, None)
+        else:
+            self._correlations[key] = correlation
 
     def set_correlation(self, corr, names):
         ''' Set correlation of inputs as a matrix.
@@ -526,10 +698,9 @@ class Variables:
                     is number of inputs. Only upper triangle is considered.
                 names (list): List of variable names corresponding to the rows/columns of cor
         '''
-        for idx1, name1 in enumerate(names):
-            for idx2, name2 in enumerate(names):
-                if idx1 < idx2:
-                    self.correlate(name1, name2, corr[idx1, idx2])
+        corr = np.asarray(corr, dtype=float)
+        for idx1, idx2 in zip(*np.triu_indices(len(names), k=1)):
+            self.correlate(names[idx1], names[idx2], corr[idx1, idx2])
 
     def get_correlation_coeff(self, var1, var2):
         ''' Get correlation coefficient between two variables
@@ -538,9 +709,12 @@ class Variables:
                 var1 (str): name of variable
                 var2 (str): name of variable
         '''
-        idx1 = self.names.index(var1)
-        idx2 = self.names.index(var2)
-        return self._correlation[idx1, idx2]
+        for name in (var1, var2):
+            if name not in self.variables:
+                raise ValueError(f'{name} is not a variable in the model')
+        if var1 == var2:
+            return 1.
+        return self._correlations.get(self._pairkey(var1, var2), 0.)
 
     def correlation_symbolic(self):
         ''' Get correlation matrix as symbols
@@ -548,25 +722,32 @@ class Variables:
             Returns:
                 List of lists of sympy expressions
         '''
-        corr = []
-        for idx1, name1 in enumerate(self.names):
-            row = []
-            for idx2, name2 in enumerate(self.names):
-                if name1 == name2:
-                    row.append(1.0)
-                elif self._correlation[idx1][idx2] == 0:
-                    row.append(0.0)
-                else:
-                    if idx1 < idx2:
-                        row.append(sympy.Symbol(f'sigma_{name1}{name2}'))
-                    else:
-                        row.append(sympy.Symbol(f'sigma_{name2}{name1}'))
-            corr.append(row)
+        names = self.names
+        corr = [[0.0]*len(names) for _ in names]
+        index = self._index()
+        for idx, name in enumerate(names):
+            corr[idx][idx] = 1.0
+        for name1, name2 in self._correlations:
+            idx1, idx2 = sorted((index[name1], index[name2]))
+            symbol = sympy.Symbol(f'sigma_{names[idx1]}{names[idx2]}')
+            corr[idx1][idx2] = symbol
+            corr[idx2][idx1] = symbol
         return corr
 
-    def correlation_matrix(self):
-        ''' Correlation matrix between variables '''
-        return self._correlation
+    def correlation_matrix(self, names=None):
+        ''' Correlation matrix between variables
+
+            Args:
+                names (list): Variable names for the rows/columns. Defaults to all variables.
+        '''
+        names = self.names if names is None else names
+        index = {name: i for i, name in enumerate(names)}
+        corr = np.eye(len(names))
+        for (name1, name2), coeff in self._correlations.items():
+            if name1 in index and name2 in index:
+                corr[index[name1], index[name2]] = coeff
+                corr[index[name2], index[name1]] = coeff
+        return corr
 
     def covariance_symbolic(self):
         ''' covariance matrix [Ux] as sympy expressions
@@ -574,15 +755,18 @@ class Variables:
             Returns:
                 List of lists of sympy expressions
         '''
-        S = []
-        for i, name in enumerate(self.variables.keys()):
-            row = [0]*i
-            row.append(sympy.Symbol(f'u_{name}'))
-            row.extend([0]*(len(self.variables) - i - 1))
-            S.append(row)
-
+        # Equivalent to [S][corr][S] with S = diag(u_X), built directly
+        # since [corr] is mostly zeros.
+        uncerts = [sympy.Symbol(f'u_{name}') for name in self.names]
+        Ux = [[sympy.S.Zero]*len(uncerts) for _ in uncerts]
+        for i, u in enumerate(uncerts):
+            Ux[i][i] = u**2
         corr = self.correlation_symbolic()
-        Ux = matrix.matmul(matrix.matmul(S, corr), S)
+        index = self._index()
+        for name1, name2 in self._correlations:
+            i, j = index[name1], index[name2]
+            Ux[i][j] = uncerts[i] * corr[i][j] * uncerts[j]
+            Ux[j][i] = uncerts[j] * corr[j][i] * uncerts[i]
         return Ux
 
     def covariance(self):
@@ -591,72 +775,103 @@ class Variables:
             Returns:
                 List of lists of float
         '''
+        names = self.names
+        uncerts = list(self.uncertainties.values())
         Ux = []
-        for i, v1 in enumerate(self.variables.values()):
+        for i, (name1, u1) in enumerate(zip(names, uncerts)):
             row = []
-            for j, v2 in enumerate(self.variables.values()):
+            for j, (name2, u2) in enumerate(zip(names, uncerts)):
                 if i == j:
-                    row.append(v1.uncertainty**2)
-                elif self._correlation[i, j] != 0:
-                    row.append(v1.uncertainty * v2.uncertainty * self._correlation[i, j])
+                    row.append(u1**2)
                 else:
-                    row.append(v1.uncertainty * v2.uncertainty * 0)  # *0 produces a 0 with correct units
+                    # *0 produces a 0 with correct units
+                    row.append(u1 * u2 * self._correlations.get(self._pairkey(name1, name2), 0))
             Ux.append(row)
         return Ux
 
+    def correlated_pairs(self):
+        ''' Get frozenset of (name1, name2) pairs with nonzero correlation '''
+        return frozenset(self._correlations)
+
     def has_correlation(self):
         ''' Determine whether any inputs are correlated '''
-        for i in range(len(self.names)):
-            for j in range(len(self.names)):
-                if i < j and self._correlation[i, j] != 0:
-                    return True
-        return False
+        return len(self._correlations) > 0
 
-    def sample(self, nsamples=1000000, copula='gaussian'):
+    def _correlated_names(self, copula='gaussian'):
+        ''' Names of variables that must be sampled through the copula '''
+        if not self.has_correlation():
+            return []
+        if copula == 'gaussian':
+            # Uncorrelated variables in a Gaussian copula are independent,
+            # so only the correlated ones need the multivariate samples.
+            correlated = set(itertools.chain.from_iterable(self._correlations))
+            return [name for name in self.variables if name in correlated]
+        return self.names
+
+    def sample(self, nsamples=1000000, copula='gaussian', incremental=False):
         ''' Generate random samples
 
             Args:
                 nsamples (int): number of random samples
                 copula (str): 'gaussian' or 't'
+                incremental (bool): Only resample variables and uncertainty components
+                  that changed since the last incremental call. Unchanged components
+                  reuse their previous samples. Changing the correlations resamples
+                  all correlated variables.
 
             Returns:
                 Dictionary of arrays of random samples
          '''
-        if self.has_correlation():
-            norm_samples = self._correlated_samples(nsamples=nsamples, copula=copula)
-            samples = {name: var.sample_correlated(norm_samples[name]) for name, var in self.variables.items()}
-        else:
-            samples = {name: var.sample(nsamples) for name, var in self.variables.items()}
+        norm_samples = {}
+        names = self._correlated_names(copula)
+        if names:
+            if incremental:
+                key = (nsamples, copula, tuple(names), self.correlation_matrix(names).tobytes())
+                if self._normcache[0] != key:
+                    self._normcache = (key, self._correlated_samples(nsamples=nsamples, copula=copula, names=names))
+                norm_samples = self._normcache[1]
+            else:
+                norm_samples = self._correlated_samples(nsamples=nsamples, copula=copula, names=names)
+
+        samples = {}
+        for name, var in self.variables.items():
+            if name in norm_samples:
+                samples[name] = var.sample_correlated(norm_samples[name], incremental=incremental)
+            else:
+                samples[name] = var.sample(nsamples, incremental=incremental)
         return samples
 
-    def _correlated_samples(self, nsamples=1000000, copula='gaussian', degf=np.inf):
+    def _correlated_samples(self, nsamples=1000000, copula='gaussian', degf=np.inf, names=None):
         ''' Generate correlated NORMAL random samples for each of the inputs
 
             Args:
                 nsamples (int): number of random samples
                 copula (str): 'gaussian' or 't'
                 degf (float): Degrees of freedom for 't' copula
+                names (list): Names of variables to sample. Defaults to all variables.
 
             Returns:
                 Dictionary of arrays of random samples
          '''
+        names = self.names if names is None else names
+        correlation = self.correlation_matrix(names)
         # Note: correlation==covariance since all std's are 1 right now.
         # Generate correlated random samples
         if copula == 'gaussian':
             with warnings.catch_warnings(record=True) as w:
                 # Roundabout way of catching a numpy warning that should really be an exception
                 warnings.simplefilter('always')
-                normsamples = stats.multivariate_normal.rvs(cov=self._correlation, size=nsamples)
+                normsamples = stats.multivariate_normal.rvs(cov=correlation, size=nsamples)
                 if len(w) > 0:
                     warnings.warn('Correlation Matrix is not positive semi-definite')
                 normsamples = stats.norm.cdf(normsamples)
 
         elif copula == 't':
-            mean = np.zeros(self._correlation.shape[0])
+            mean = np.zeros(correlation.shape[0])
             with warnings.catch_warnings(record=True) as w:
                 warnings.simplefilter('always')
                 # Note: Scipy now has multivariate_t, but it does not account for covariance.
-                normsamples = multivariate_t_rvs(mean=mean, corr=self._correlation, size=nsamples, df=degf)
+                normsamples = multivariate_t_rvs(mean=mean, corr=correlation, size=nsamples, df=degf)
                 normsamples = stats.t.cdf(normsamples, df=degf)
                 if len(w) > 0:
                     raise ValueError('Correlation Matrix is not positive semi-definite')
@@ -666,6 +881,6 @@ class Variables:
         normsamples[np.where(normsamples == 1.0)] = 1 - 1E-9  # If rounded to 1 or 0, then we get infinity.
         normsamples[np.where(normsamples == 0.0)] = 1E-9
         samples = {}
-        for idx, name in enumerate(self.names):
+        for idx, name in enumerate(names):
             samples[name] = normsamples[:, idx]
         return samples
@@ -1,6 +1,8 @@
 ''' Test command-line interface '''
 
+import os
 import numpy as np
+from scipy import stats
 
 from suncal import Model
 from suncal import project
@@ -140,6 +142,50 @@ def test_risk(capsys):
     assert report == report2
 
 
+def test_riskbatch(tmpdir):
+    ''' Test batch risk from a table of cases '''
+    fname = os.path.join(tmpdir, 'cases.csv')
+    with open(fname, 'w') as f:
+        f.write('LL,UL,itp,tur,procbias,testbias,procdist,guardband,pfa_target\n')
+        f.write('-1,1,.9,2,0,0,,none,\n')
+        f.write('9,11,.85,3,.1,.02,,rss,\n')
+        f.write('-2,2,.95,1.5,-.2,0,,pfa,.01\n')
+        f.write('-1,1,,2,0,0,dist=uniform; median=0; a=1.2,dobbert,\n')
+        f.write('-1,1,,2,0,0,dist=nosuchdist,rss,\n')  # Failure is recorded, doesn't stop the batch
+        f.write('-1,1,1.2,2,0,0,,none,\n')  # No process distribution has this itp
+        f.write('-1,1,.9,0,0,0,,none,\n')
+    outname = os.path.join(tmpdir, 'results.csv')
+    cli.main_risk(['--batch', fname, '-o', outname])
+    results = risk.risk_batch.read_cases(outname)
+
+    # Compare against RiskModel
+    dproc = [distributions.get_distribution('normal', median=0, std=1/stats.norm.ppf(.95)),
+             distributions.get_distribution('normal', median=10.1, std=risk.risk.get_sigmaproc_from_itp(.85, .1)),
+             distributions.get_distribution('normal', median=-.2, std=2*risk.risk.get_sigmaproc_from_itp(.95, -.1)),
+             distributions.get_distribution('uniform', median=0, a=1.2)]
+    dtest = [distributions.get_distribution('normal', median=0, std=std) for std in [.25, 1/6, 2/3, .25]]
+    speclimits = [(-1, 1), (9, 11), (-2, 2), (-1, 1)]
+    for i in range(4):
+        model = risk.risk_model.RiskModel(dproc[i], dtest[i], speclimits[i])
+        model.testbias = results['testbias'][i]
+        if i == 1:
+            model.set_gbf(risk.guardband_tur.rss(3))
+        elif i == 2:
+            model.guardband_pfa(.01)
+        elif i == 3:
+            model.set_gbf(risk.guardband_tur.dobbert(2))
+        assert np.isclose(results['GBL'][i], model.gbofsts[0], rtol=1E-6, atol=1E-9)
+        assert np.isclose(results['process_risk'][i], model.process_risk(), rtol=1E-6)
+        assert np.isclose(results['PFA'][i], model.PFA(), rtol=1E-6)
+        assert np.isclose(results['PFR'][i], model.PFR(), rtol=1E-6)
+    assert np.isnan(results['PFA'][4])
+    assert 'nosuchdist' in results['error'][4]
+    assert np.isnan(results['PFA'][5:]).all()
+    assert 'itp=1.2' in results['error'][5]
+    assert 'tur=0.0' in results['error'][6]
+    assert all(error == '' for error in results['error'][:4])
+
+
 def test_curve(capsys):
     ''' Test Curve fit command line '''
     x = np.array([30, 100, 200, 300, 400, 500, 600, 700, 800, 900, 1000, 1100, 1200, 1300, 1400, 1500])
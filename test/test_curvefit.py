@@ -135,6 +135,44 @@ def test_linefitgum():
     assert '0.0041' in rpt
 
 
+def test_gumautodiff():
+    ''' GUM line fit gradient from automatic differentiation matches numerical gradient '''
+    from suncal.curvefit import uncertarray
+    uy = np.full(len(x), 2.)
+    ux = np.zeros(len(x))
+    fit = CurveFit(Array(x, y, uy=uy))
+
+    def func(xx, yy):
+        return fit.fitcalc(xx, yy, ux=None, uy=None)[0]
+    mean, cov, grad = uncertarray._GUM(func, x, y, ux, uy)
+    meannum, gradnum = uncertarray._gradient_numeric(func, x.copy(), y.copy(), ux, uy)
+    assert np.allclose(mean, meannum)
+    assert np.allclose(grad, gradnum, atol=1E-8)
+    assert np.allclose(cov, fit.calculate_lsq().covariance)
+
+
+def test_gumanalytic():
+    ''' GUM gradient from analytic model derivatives matches exact linear least squares,
+        and vectorized confidence band matches the band from numerical derivatives
+    '''
+    xx = np.linspace(1, 10, 20)
+    yy = 1 + .2*xx + .05*xx**2 + np.random.default_rng(1).normal(scale=.05, size=len(xx))
+    fit = CurveFit(Array(xx, yy, uy=.05), 'quad')
+    gum = fit.calculate_gum()
+    basis = np.vstack([np.ones_like(xx), xx, xx**2]).T
+    assert np.allclose(fit._fit_sensitivity(gum.coeffs)[:, len(xx):], np.linalg.pinv(basis), atol=1E-10)
+    assert np.allclose(gum.covariance, .05**2 * np.linalg.inv(basis.T @ basis))
+
+    def logistic(x, a, b, c, d):
+        return d + a / (1 + np.exp((x-c)/b))
+    yy = logistic(xx, 3, 1.5, 5, 1) + np.random.default_rng(2).normal(scale=.05, size=len(xx))
+    out = CurveFit(Array(xx, yy, uy=.05), 'a / (1 + exp((x-c)/b)) + d', p0=(3, 1.5, 5, 1)).calculate_lsq()
+    outnum = CurveFit(Array(xx, yy, uy=.05), logistic, p0=(3, 1.5, 5, 1)).calculate_lsq()
+    xband = np.linspace(0, 11, 500)
+    assert np.allclose(out.confidence_band(xband), outnum.confidence_band(xband), rtol=1E-5)
+    assert np.isclose(out.confidence_band(5.), out.confidence_band([5.])[0])
+
+
 def test_curvefit():
     ''' Curve fit with no uncertainty in x or y. Uses scipy.optimize.curve_fit. '''
     # Data from S. Glantz, B. Slinker, Applied Regression & analysis of Variance, 2nd edition. McGraw Hill, 2001.
@@ -193,6 +231,64 @@ def test_curvefit():
     assert np.allclose(lsq.uncerts, mc.uncerts, atol=.005)
 
 
+def test_linearmc():
+    ''' Batched Monte Carlo of linear-in-parameter models matches fitting each sample '''
+    for model, ux in [('line', .5), ('quad', 0), ('a + b*x + 2*x**2', .5)]:
+        np.random.seed(100)
+        fit = CurveFit(Array(x, y, uy=2, ux=ux), model)
+        assert fit.linear_basis is not None
+        mc = fit.monte_carlo(samples=200)
+        for i in [0, 199]:
+            xs, ys = fit.arr.xsamples[:, i], fit.arr.ysamples[:, i]
+            coeff, _ = fit.fitcalc(xs, ys, ux=None, uy=None)
+            assert np.allclose(mc.samples[i], coeff, rtol=1E-6)
+    assert CurveFit(Array(x, y), 'exp', p0=(1, 10, 1)).linear_basis is None
+
+
+def test_arraysample():
+    ''' Vectorized sampling is reproducible and streams in chunks '''
+    arr = Array(x, y, uy=2, ux=.5)
+    arr.sample(4000, rng=np.random.default_rng(1), chunksize=1500)
+    assert arr.xsamples.shape == (len(x), 4000)
+    assert np.allclose(arr.ysamples.mean(axis=1), y, atol=.2)
+    assert np.allclose(arr.xsamples.std(axis=1), .5, rtol=.1)
+    arr2 = Array(x, y, uy=2, ux=.5)
+    arr2.sample(4000, rng=np.random.default_rng(1), chunksize=1500)
+    assert np.array_equal(arr.ysamples, arr2.ysamples)
+    chunks = list(arr2.iter_samples(4000, rng=np.random.default_rng(1), chunksize=1500))
+    assert [c[0].shape[1] for c in chunks] == [1500, 1500, 1000]
+    assert np.array_equal(np.hstack([c[1] for c in chunks]), arr.ysamples)
+
+    fit = CurveFit(Array(x, y, uy=2, ux=.5), 'line')
+    mc = fit.monte_carlo(samples=1000, rng=5)
+    stored = fit.arr.xsamples
+    curvefit.uncertarray.MAX_STORED, maxstored = 100, curvefit.uncertarray.MAX_STORED
+    try:
+        fit = CurveFit(Array(x, y, uy=2, ux=.5), 'line')
+        streamed = fit.monte_carlo(samples=1000, rng=5)
+    finally:
+        curvefit.uncertarray.MAX_STORED = maxstored
+    assert stored is not None and fit.arr.xsamples is None
+    assert np.allclose(mc.samples, streamed.samples)
+
+
+def test_nonlinearmc():
+    ''' Parallel, warm-started Monte Carlo of nonlinear fits '''
+    xx = np.linspace(0, 10, 20)
+    yy = 5*np.exp(-xx/3) + 1
+    fit = CurveFit(Array(xx, yy, uy=.05), 'a*exp(-x/b) + c', p0=(1, 1, 0))
+    serial = fit.monte_carlo(samples=400, rng=1, chunksize=100)
+    parallel = fit.monte_carlo(samples=400, workers=2, chunksize=100)  # Reuses stored samples
+    assert np.allclose(serial.samples, parallel.samples)
+    assert np.allclose(serial.coeffs, [5, 3, 1], rtol=.01)
+    assert list(fit.mc_failures) == [0, 0, 0, 0]
+
+    fit = CurveFit(Array(xx, yy, uy=.05), 'a*exp(-x/b) + c', p0=(1, 1, 0))
+    early = fit.monte_carlo(samples=4000, rng=1, chunksize=200, rtol=.2)
+    assert len(early.samples) < 4000
+    assert np.allclose(early.uncerts, serial.uncerts, rtol=.2)
+
+
 def test_curvefitcustom():
     ''' Test curvefit with custom model '''
     # Leak standard decay example data. Decays to 0, so use custom exponential with c=0
@@ -310,6 +406,36 @@ def test_mcmc2():
     assert np.isclose(out.uncerts[1], 0.37, rtol=.01, atol=.01)
 
 
+def test_mcmcchains():
+    ''' Test convergence diagnostics and early stopping of multi-chain MCMC '''
+    # Independent draws have R-hat near 1 and ESS near the number of draws,
+    # AR(1) chains with coefficient phi have ESS of N*(1-phi)/(1+phi)
+    rng = np.random.default_rng(1)
+    diag = curvefit.curvefit.mcmc_diagnostics(rng.normal(size=(4, 5000, 1)))
+    assert np.isclose(diag.rhat[0], 1, atol=.01)
+    assert np.isclose(diag.ess[0], 20000, rtol=.1)
+    phi = .9
+    ar = np.zeros((4, 5000, 1))
+    noise = rng.normal(size=ar.shape)
+    for i in range(1, 5000):
+        ar[:, i] = phi*ar[:, i-1] + noise[:, i]
+    assert np.isclose(curvefit.curvefit.mcmc_diagnostics(ar).ess[0], 20000*(1-phi)/(1+phi), rtol=.2)
+    assert curvefit.curvefit.mcmc_diagnostics(ar + np.arange(4)[:, None, None]).rhat[0] > 1.1  # Chains disagree
+
+    x = np.linspace(0, 1, 11)
+    y = np.array([0.98, 0.63, 0.95, 0.74, 1.33, 1.08, 1.38, 1.38, 1.70, 1.69, 2.10])
+    fit = CurveFit(Array(x, y, uy=0.2), 'a + b*x**2', p0=(1, 1))
+    lsq = fit.calculate_lsq()
+    out = fit.markov_chain_monte_carlo(samples=40000, chains=4, rng=1, rhat=1.01, ess=400)
+    assert fit.mcmctrace.shape[0] == 4
+    assert len(out.samples) < 32000  # Stopped early
+    assert np.all(out.rhat < 1.01) and np.all(out.ess > 400)
+    assert np.all(abs(out.acceptance - .44) < .1)  # Adapted proposal widths
+    assert np.allclose(out.coeffs, lsq.coeffs, atol=.02)
+    assert np.allclose(out.uncerts, lsq.uncerts, rtol=.1)
+    assert 'R-hat' in out.report.acceptance().get_md()
+
+
 def test_mcmc3():
     ''' Test Markov-Chain Monte Carlo by comparing results of calculator with results
         computed using published code from [1] (in supplemental info). To generate the
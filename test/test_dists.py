@@ -160,3 +160,32 @@ def test_customconfig():
     assert np.isclose(dist.median(), 10)
     config2 = dist.get_config()
     assert config == config2
+
+
+def test_fastpath():
+    # Fast paths match scipy, and the cached frozen distribution follows changes to the parameters
+    x = np.linspace(-5, 5, 201)
+    q = np.linspace(0, 1, 51)
+    for name, kwds in [('normal', {'std': 1.5}), ('uniform', {'a': 2}), ('triangular', {'a': 3}),
+                       ('t', {'std': 1, 'df': 4})]:
+        dist = distributions.get_distribution(name, median=.5, **kwds)
+        ref = dist.dist(**dist.distargs)
+        assert dist._fast is None  # Frozen distribution is created when first needed
+        assert np.allclose(dist.cdf(x), ref.cdf(x))
+        assert np.allclose(dist.sf(x), ref.sf(x))
+        assert np.allclose(dist.pdf(x), ref.pdf(x))
+        assert np.allclose(dist.ppf(q), ref.ppf(q))
+        assert np.isclose(dist.std(), ref.std())
+        assert np.isclose(dist.median(), ref.median())
+
+        dist.set_median(2)
+        assert np.isclose(dist.median(), 2)
+        dist.set_mean(3)
+        assert np.isclose(dist.mean(), 3)
+
+    dist = distributions.get_distribution('normal', std=1)
+    assert np.isclose(dist.std(), 1)
+    dist.update_kwds(std=2)
+    assert np.isclose(dist.std(), 2)
+    dist.fit(stats.norm(loc=0, scale=3).rvs(size=2000, random_state=1))
+    assert np.isclose(dist.std(), 3, rtol=.1)
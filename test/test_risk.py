@@ -1,7 +1,9 @@
+import warnings
 import numpy as np
 from scipy import stats
 
 from suncal import risk
+from suncal.common import distributions
 
 
 def test_risknorm():
@@ -66,6 +68,98 @@ def test_simpson_quad_pfr():
     testit(stats.uniform(0, 2), stats.norm(3, 0.25))
 
 
+def test_batch():
+    # Batched PFA/PFR over guardband and bias arrays match the point-by-point Simpson
+    # integration of earlier versions (values computed one guardband and bias at a time)
+    dproc = stats.norm(loc=.05, scale=.5)
+    dtest = stats.uniform(loc=-.2, scale=.4)
+    gbs = np.linspace(0, .3, 7)
+    bias = np.array([[0], [.02]])
+    pfa = risk.PFA_batch(dproc, dtest, -1, 1, gbs, gbs/2, bias)
+    pfr = risk.PFR_batch(dproc, dtest, -1, 1, gbs, gbs/2, bias)
+    assert pfa.shape == pfr.shape == (2, 7)
+    pfa_expected = [[0.008469315884, 0.006053115652, 0.0040172226, 0.002447632527,
+                     0.001446588448, 0.000839513451, 0.000385013242],
+                    [0.008198597649, 0.005766257421, 0.003697597102, 0.002073891314,
+                     0.000991986132, 0.000462936165, 0.000142140959]]
+    pfr_expected = [[0.01429941047, 0.020847217166, 0.029219155415, 0.039679754631,
+                     0.052514734888, 0.067733693578, 0.085275136782],
+                    [0.015092960819, 0.021491833995, 0.029653510503, 0.039834955157,
+                     0.052314896631, 0.067288603085, 0.084593307292]]
+    assert np.allclose(pfa, pfa_expected, rtol=1E-8, atol=0)
+    assert np.allclose(pfr, pfr_expected, rtol=1E-8, atol=0)
+    assert np.isclose(risk.PFA(dproc, dtest, -1, 1, gbs[3], gbs[3]/2, .02), pfa_expected[1][3], rtol=1E-8)
+    assert np.all(np.diff(pfa[0]) < 0)  # More guardband, less PFA
+    assert np.all(np.diff(pfr[0]) > 0)
+
+
+def test_risk_normal():
+    # Closed-form bivariate normal risk matches numerical integration
+    from scipy.integrate import quad
+    for h, k, rho in [(-1, .5, .3), (0, 0, .9), (2, -1, -.5), (-5, -4, .97), (0, 1, .99)]:
+        expected = quad(lambda x: stats.norm.pdf(x) * stats.norm.cdf((k-rho*x)/np.sqrt(1-rho**2)),
+                        -np.inf, h, epsabs=1E-15, epsrel=1E-13)[0]
+        assert np.isclose(risk.risk_normal.bivariate_cdf(h, k, rho), expected, rtol=1E-12, atol=1E-15)
+    assert risk.risk_normal.bivariate_cdf(np.inf, .3, .5) == stats.norm.cdf(.3)
+    assert risk.risk_normal.bivariate_cdf(-np.inf, .3, .5) == 0
+
+    dproc = stats.norm(loc=.1, scale=.4)
+    dtest = stats.norm(loc=0, scale=.2)
+    for gb, bias in [(0, 0), (.1, .02), (-.05, 0)]:
+        assert np.isclose(risk.risk_normal.PFA(dproc, dtest, -1, 1, gb, gb, bias),
+                          risk.risk_simpson.PFA(dproc, dtest, -1, 1, gb, gb, bias), rtol=1E-9, atol=1E-12)
+        assert np.isclose(risk.risk_normal.PFR(dproc, dtest, -1, 1, gb, gb, bias),
+                          risk.risk_simpson.PFR(dproc, dtest, -1, 1, gb, gb, bias), rtol=1E-9, atol=1E-12)
+        assert np.isclose(risk.risk_normal.PFA_conditional(dproc, dtest, -1, 1, gb, gb, bias),
+                          risk.risk_simpson.PFA_conditional(dproc, dtest, -1, 1, gb, gb, bias), rtol=1E-9)
+
+    # Normal distributions select the closed-form engine, others use Simpson
+    assert risk.risk_normal.is_normal(dproc)
+    assert not risk.risk_normal.is_normal(stats.uniform(-1, 2))
+
+    # No guardband (nan) gives nan risk, not zero
+    assert np.isnan(risk.risk_normal.bivariate_cdf(-1, np.nan, .5))
+    assert np.isnan(risk.PFA(stats.norm(0, .3), stats.norm(0, .1), -1, 1, np.nan, np.nan))
+    assert np.isnan(risk.PFR(stats.norm(0, .3), stats.norm(0, .1), -1, 1, np.nan, np.nan))
+    result = risk.risk_batch.evaluate({'itp': [.95, .95], 'tur': [4, 4], 'guardband': ['pfa', 'pfa'],
+                                       'pfa_target': [.5, .01]}, workers=1)  # .5 is unreachable
+    assert np.isnan(result['PFA'][0]) and np.isnan(result['PFR'][0])
+    assert np.isclose(result['PFA'][1], .01)
+
+
+def test_risk_adaptive():
+    # Adaptive integration meets the tolerance and reports its error
+    for dproc, dtest in [(stats.norm(0, .5), stats.norm(0, .125)),
+                         (stats.norm(0, .3), stats.norm(0, .0005)),   # Narrow test distribution
+                         (stats.norm(5, 1), stats.norm(0, .001))]:    # Far in the tails
+        pfa = risk.risk_adaptive.PFA(dproc, dtest, -1, 1, .0002, .0002, atol=1E-12, rtol=1E-8)
+        pfr = risk.risk_adaptive.PFR(dproc, dtest, -1, 1, .0002, .0002, atol=1E-12, rtol=1E-8)
+        exact_pfa = risk.risk_normal.PFA(dproc, dtest, -1, 1, .0002, .0002)
+        exact_pfr = risk.risk_normal.PFR(dproc, dtest, -1, 1, .0002, .0002)
+        assert abs(pfa.value - exact_pfa) <= max(1E-12, 1E-8*exact_pfa)
+        assert abs(pfr.value - exact_pfr) <= max(1E-12, 1E-8*exact_pfr)
+        assert abs(pfa.value - exact_pfa) <= 2*pfa.error + 1E-15
+        assert pfa.evaluations < 2000
+
+    # Kinks in a uniform test distribution
+    from scipy.integrate import quad
+    dproc, dtest = stats.norm(0, .6), stats.uniform(-.2, .4)
+    pfa = risk.risk_adaptive.PFA(dproc, dtest, -1, 1)
+
+    def integrand(t):
+        return (dtest.cdf(1-t) - dtest.cdf(-1-t)) * dproc.pdf(t)
+    expected = (quad(integrand, -10, -1, points=[-1.2, -.8], epsabs=1E-15)[0] +
+                quad(integrand, 1, 10, points=[.8, 1.2], epsabs=1E-15)[0])
+    assert np.isclose(pfa.value, expected, rtol=1E-8)
+    assert np.isclose(risk.risk_adaptive.PFA_conditional(dproc, dtest, -1, 1).value,
+                      risk.risk_simpson.PFA_conditional(dproc, dtest, -1, 1), rtol=1E-4)
+    assert risk.PFA(dproc, dtest, -1, 1) == pfa.value  # Used for non-normal distributions
+
+    # Uniform process with very narrow normal test distribution
+    dproc, dtest = stats.uniform(-1.2, 2.4), stats.norm(0, 1E-4)
+    assert np.isclose(risk.PFA(dproc, dtest, -1, 1), 2 / 2.4 * 1E-4 * stats.norm.pdf(0), rtol=1E-6)
+
+
 def test_riskmontecarlo():
     # Compare Monte Carlo results
     np.random.seed(883322)
@@ -83,6 +177,49 @@ def test_riskmontecarlo():
     assert np.isclose(FR1, risk.PFR(d1, d2, LL=9.9, UL=11), atol=.01)
 
 
+def test_mcstratified():
+    # Variance-reduced MC resolves very small PFA with few samples
+    dproc = stats.norm(loc=0, scale=.25)
+    dtest = stats.norm(loc=0, scale=.05)
+    result = risk.PFAR_MC_stratified(dproc, dtest, LL=-1, UL=1, GBL=.1, GBU=.1, N=1000, seed=1)
+    pfa = risk.PFA(dproc, dtest, -1, 1, .1, .1)
+    assert pfa < 1E-6
+    assert result.pfa_ci[0] < pfa < result.pfa_ci[1]
+    assert np.isclose(result.pfa, pfa, rtol=.01)
+    assert np.isclose(result.pfr, risk.PFR(dproc, dtest, -1, 1, .1, .1), rtol=.01)
+    assert np.isclose(result.cpfa, risk.PFA_conditional(dproc, dtest, -1, 1, .1, .1), rtol=.01)
+
+    # Non-normal distributions
+    dproc = stats.uniform(loc=-1.2, scale=2.4)
+    dtest = stats.norm(loc=.02, scale=.1)
+    result = risk.PFAR_MC_stratified(dproc, dtest, LL=-1, UL=1, GBL=.05, GBU=.05, N=2000, seed=1)
+    assert np.isclose(result.pfa, risk.PFA(dproc, dtest, -1, 1, .05, .05), rtol=.01)
+    assert np.isclose(result.pfr, risk.PFR(dproc, dtest, -1, 1, .05, .05), rtol=.01)
+
+    # Histogram test distribution
+    dproc = stats.norm(loc=0, scale=.5)
+    dtest = distributions.get_distribution('histogram', data=np.random.default_rng(1).normal(0, .25, 20000))
+    result = risk.PFAR_MC_stratified(dproc, dtest, LL=-1, UL=1, seed=1)
+    assert np.isclose(result.pfa, risk.PFA(dproc, dtest, -1, 1), rtol=.01)
+    assert np.isclose(result.pfr, risk.PFR(dproc, dtest, -1, 1), rtol=.01)
+
+
+def test_mcchunked():
+    # Chunked MC agrees with integration, and bounds the samples it keeps
+    dproc = stats.norm(loc=0, scale=.5)
+    dtest = stats.norm(loc=0, scale=.125)
+    result = risk.PFAR_MC_chunked(dproc, dtest, LL=-1, UL=1, N=200000, chunksize=30000, reservoir=5000, seed=1)
+    assert result.pfa_ci[0] < risk.PFA(dproc, dtest, -1, 1) < result.pfa_ci[1]
+    assert result.pfr_ci[0] < risk.PFR(dproc, dtest, -1, 1) < result.pfr_ci[1]
+    assert len(result.process_samples) == len(result.test_samples) == 5000
+
+    # Same seed gives same result in parallel
+    parallel = risk.PFAR_MC_chunked(dproc, dtest, LL=-1, UL=1, N=200000, chunksize=30000, reservoir=5000,
+                                    seed=1, workers=2)
+    assert parallel.pfa == result.pfa and parallel.pfr == result.pfr
+    assert np.all(parallel.process_samples == result.process_samples)
+
+
 def test_findguardband():
     d1 = stats.norm(loc=0, scale=4)
     d2 = stats.norm(loc=0, scale=2)
@@ -99,6 +236,30 @@ def test_findguardband():
     assert not np.isfinite(gb2)
 
 
+def test_guardbandtable():
+    # Tabulated acceptance integrals match Simpson integration
+    dproc = stats.uniform(loc=-1.2, scale=2.4)
+    dtest = stats.norm(loc=.02, scale=.125)
+    table = risk.risk_simpson.AcceptanceTable(dproc, dtest, LL=-1, UL=1)
+    gbs = np.array([-.2, 0, .1, .2])
+    assert np.allclose(table.PFA(gbs, gbs), risk.PFA_batch(dproc, dtest, -1, 1, gbs, gbs), rtol=1E-3)
+    assert np.allclose(table.PFR(gbs, gbs[::-1]), risk.PFR_batch(dproc, dtest, -1, 1, gbs, gbs[::-1]), atol=1E-4)
+
+    # Guardband solvers hit the target with exact PFA
+    gb = risk.guardband.target(dproc, dtest, LL=-1, UL=1, target_PFA=.001)
+    assert np.isclose(risk.PFA(dproc, dtest, -1, 1, gb, gb), .001, rtol=1E-9)
+    gb = risk.guardband.target_conditional(dproc, dtest, LL=-1, UL=1, target_PFA=.001)
+    assert np.isclose(risk.PFA_conditional(dproc, dtest, -1, 1, gb, gb), .001, rtol=1E-9)
+
+    dproc = stats.norm(loc=.1, scale=.6)
+    gbl, gbu = risk.guardband.optimize(dproc, dtest, -1, 1, target=.005)
+    assert np.isclose(risk.PFA(dproc, dtest, -1, 1, gbl, gbu), .005, rtol=1E-9)
+    assert gbl < gbu  # Process is biased high
+    # Symmetric guardband meeting the same PFA has higher PFR
+    gb = risk.guardband.target(dproc, dtest, LL=-1, UL=1, target_PFA=.005)
+    assert risk.PFR(dproc, dtest, -1, 1, gbl, gbu) < risk.PFR(dproc, dtest, -1, 1, gb, gb)
+
+
 def test_guardbandnorm():
     # TUR-based guardbands
     TUR = 2.5
@@ -123,6 +284,85 @@ def test_guardbandnorm():
     assert np.isclose(risk.guardband_tur.rp10(TUR), 1.25-1/TUR)
 
 
+def test_guardbandnorm_vectorized():
+    # TUR-based guardbands and itp solvers for arrays match the scalar results
+    tur = np.array([1.5, 2, 3, 4.5])
+    itp = np.array([.7, .8, .9, .95])
+    gbf, converged = risk.guardband_tur.pfa_target(tur, itp, pfa=.01, full_output=True)
+    assert converged.all()
+    for i in range(len(tur)):
+        assert np.isclose(risk.PFA_norm(itp[i], tur[i], gbf[i]), .01)
+        assert np.isclose(gbf[i], risk.guardband_tur.pfa_target(tur[i], itp[i], pfa=.01))
+        assert np.isclose(risk.guardband_tur.four_to_1(tur, itp)[i], risk.guardband_tur.four_to_1(tur[i], itp[i]))
+    assert np.allclose(risk.guardband_tur.rp10(tur), [1.25-1/1.5, 1.25-1/2, 1.25-1/3, 1])
+    assert np.allclose(risk.guardband_tur.test95(tur), [1-1/1.5, 1-1/2, 1-1/3, 1])
+
+    bias = np.array([0, .1, -.3, .5])
+    sigma, converged = risk.risk.get_sigmaproc_from_itp(itp, bias, full_output=True)
+    assert converged.all()
+    assert np.allclose(stats.norm(bias, sigma).cdf(1) - stats.norm(bias, sigma).cdf(-1), itp)
+    assert not risk.risk.get_sigmaproc_from_itp(.9, 1.5, full_output=True)[1]
+
+    gbf = risk.guardband_tur.pfa_target(tur, itp, pfa=.01, bias=.1)
+    for i in range(len(tur)):
+        assert np.isclose(risk.PFA_norm(itp[i], tur[i], gbf[i], biasproc=.1), .01)
+
+
+def test_risksweep():
+    # Normal sweep over a 3D grid matches the closed-form risk at each point
+    result = risk.risk_sweep.sweep_normal({'tur': [1.5, 4], 'itp': [.8, .95], 'gbf': [.8, 1]})
+    assert result.values.shape == (2, 2, 2)
+    assert result.names == ['tur', 'itp', 'gbf']
+    assert np.isclose(result.values[0, 1, 0], risk.PFA_norm(.95, 1.5, .8))
+
+    # Grid points with no solution are nan, without warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        unsolved = risk.risk_sweep.sweep_normal({'itp': [0, .9, 1.2], 'tur': [0, -1, 2]}, gbf='rss')
+    assert np.isnan(unsolved.values[[0, 2]]).all()
+    assert np.isnan(unsolved.values[:, :2]).all()
+    assert np.isclose(unsolved.values[1, 2], risk.PFA_norm(.9, 2, risk.guardband_tur.rss(2)))
+
+    # General sweep scales the distributions without changing them
+    dproc = distributions.get_distribution('normal', std=1)
+    dtest = distributions.get_distribution('normal', std=.1)
+    configs = dproc.get_config(), dtest.get_config()
+    general = risk.risk_sweep.sweep(dproc, dtest, -1, 1, {'tur': [1.5, 4], 'itp': [.8, .95], 'gbf': [.8, 1]})
+    assert np.allclose(general.values, result.values, atol=1E-9)
+    assert (dproc.get_config(), dtest.get_config()) == configs
+
+    dproc = stats.uniform(loc=-1.5, scale=3)
+    dtest = stats.triang(c=.5, loc=-.3, scale=.6)
+    result = risk.risk_sweep.sweep(dproc, dtest, -1, 1, {'gb': [0, .1], 'tbias': [0, .05]}, risk='PFR')
+    assert np.isclose(result.values[1, 1], risk.PFR(dproc, dtest, -1, 1, .1, .1, .05))
+    assert np.allclose(result.values, risk.risk_sweep.sweep(dproc, dtest, -1, 1, {'gb': [0, .1], 'tbias': [0, .05]},
+                                                            risk='PFR', workers=2).values)
+
+
+def test_guardbandcost():
+    # Batch cost optimization matches scalar minimization and Easterling's approximation
+    from scipy import optimize
+    tur = np.array([1.5, 2, 4, 4])
+    itp = np.array([.8, .9, .95, .95])
+    costfa = np.array([100, 10, 100, 5])
+    risk.guardband_cost.clear_cache()
+    result = risk.guardband_cost.mincost(tur, itp, costfa, 1)
+    assert risk.guardband_cost._curves.cache_info().currsize == 3
+    assert np.allclose(result.gbf, risk.guardband_tur.mincost(tur, itp, costfa), atol=.001)
+    sigma = risk.risk.get_sigmaproc_from_itp(itp[0])
+
+    def cost(gbf):
+        return (costfa[0]*risk.risk_normal.PFA_gaussian(0, sigma, 1/tur[0]/2, -1, 1, 1-gbf, 1-gbf) +
+                risk.risk_normal.PFR_gaussian(0, sigma, 1/tur[0]/2, -1, 1, 1-gbf, 1-gbf))
+    best = optimize.minimize_scalar(cost, bounds=(0, 1), method='bounded', options={'xatol': 1E-9})
+    assert np.isclose(result.gbf[0], best.x, atol=1E-5)
+    assert np.isclose(result.cost[0], best.fun, rtol=1E-8)
+
+    worst = risk.guardband_cost.minimax(tur, costfa, 1)
+    assert np.all(worst.cost >= result.cost)
+    assert np.isclose(risk.guardband_cost.minimax(4, 100).gbf, worst.gbf[2])
+
+
 def test_cpk():
     # Test process capability index
     LL = 9
@@ -161,6 +401,73 @@ def test_cpk():
     assert np.isclose(rUL, rUL2)
 
 
+def test_specificbatch():
+    # Batch specific risk matches specific_risk at each measurement result
+    LL, UL = 9, 11
+    xx = np.linspace(8, 12, 25)
+    batch = risk.specific_risk_batch(stats.norm(loc=0, scale=.4), LL, UL, xx, testbias=.1)
+    for x, total, lower, upper in zip(xx, *batch):
+        _, r, rLL, rUL = risk.specific_risk(stats.norm(loc=x-.1, scale=.4), LL, UL)
+        assert np.isclose(total, r, atol=1E-12)
+        assert np.isclose(lower, rLL, atol=1E-12)
+        assert np.isclose(upper, rUL, atol=1E-12)
+
+    # Guardband edges have exactly the target specific risk
+    d = distributions.get_distribution('triangular', median=10, a=.4)
+    GBL, GBU = risk.guardband.specific(d, LL, UL, .02)
+    assert np.isclose(GBL, GBU)
+    assert np.allclose(risk.specific_risk_batch(d, LL, UL, [LL+GBL, UL-GBU]).total, .02)
+
+    # Histogram test distributions have no loc parameter
+    rng = np.random.default_rng(1)
+    dtest = distributions.get_distribution('histogram', data=rng.normal(0, .25, 20000))
+    xx = [0, .9, 1.1]
+    batch = risk.specific_risk_batch(dtest, -1, 1, xx, testbias=.05)
+    for x, total in zip(xx, batch.total):
+        dtest.set_median(x-.05)
+        assert np.isclose(total, risk.specific_risk(dtest, -1, 1).total, atol=1E-12)
+
+    model = risk.risk_model.RiskModel(distributions.get_distribution('normal', median=0, std=.5), dtest, (-1, 1))
+    model.report.probconform()
+
+
+def test_decisionengine():
+    # Streamed decisions match RiskModel.specific_risk one measurement at a time
+    model = risk.risk_model.RiskModel()
+    model.gbofsts = (.1, .05)
+    model.testbias = .02
+    results = np.random.default_rng(1).normal(0, .6, size=100)
+    engine = model.decision_engine()
+    decisions = list(engine.stream(np.array_split(results, 3)))
+    accept = np.concatenate([d.accept for d in decisions])
+    specific = np.concatenate([d.risk for d in decisions])
+    for x, acc, r in zip(results, accept, specific):
+        model.set_testmedian(x)
+        expected = model.specific_risk()
+        assert acc == expected.accept
+        assert np.isclose(r, expected.probability, atol=1E-14)
+
+    # Running totals
+    assert engine.count == 100
+    assert engine.naccept == accept.sum()
+    assert np.isclose(engine.PFA, specific[accept].sum()/100)
+    assert np.isclose(engine.PFR, specific[~accept].sum()/100)
+    assert np.isclose(decisions[-1].pfa[-1], engine.PFA)
+    engine.reset()
+    assert engine.count == 0
+
+    # Histogram test distributions have no loc parameter
+    dtest = distributions.get_distribution('histogram', data=np.random.default_rng(2).normal(0, .25, 20000))
+    model = risk.risk_model.RiskModel(distributions.get_distribution('normal', median=0, std=.5), dtest, (-1, 1))
+    model.gbofsts = (.1, .1)
+    decisions = model.decision_engine().decide([0, .85, .95, 1.1])
+    assert list(decisions.accept) == [True, True, False, False]
+    for x, acc, r in zip([0, .85, .95, 1.1], decisions.accept, decisions.risk):
+        dtest.set_median(x)
+        total = risk.specific_risk(dtest, -1, 1).total
+        assert np.isclose(r, total if acc else 1-total, atol=1E-12)
+
+
 def test_gb():
     # Test PFA/PFR with guard band, based on more numbers in Deaver (page 10)
     # First, using PFA_tur() ...
@@ -184,6 +491,27 @@ def test_riskdeaver():
     assert np.isclose(risk.deaver.PFA_deaver(SL=2.5, TUR=1), .005, atol=.001)
 
 
+def test_riskdeaver_vectorized():
+    # Closed-form Deaver risks match the double integrals of Deaver's equations
+    import math
+    from scipy.integrate import dblquad
+    SL = np.array([.5, 1, 2, 3])
+    TUR = np.array([.5, 2, 4, 10])
+    GB = np.array([.8, 1, .91, 1.2])
+    pfa = risk.deaver.PFA_deaver(SL, TUR, GB)
+    pfr = risk.deaver.PFR_deaver(SL, TUR, GB)
+    for i, (sl, tur, gb) in enumerate(zip(SL, TUR, GB)):
+        pfaquad, _ = dblquad(lambda y, t: math.exp(-(y*y + t*t)/2) / math.pi, sl, math.inf,
+                             gfun=lambda t: -tur*(t+sl*gb), hfun=lambda t: -tur*(t-sl*gb), epsabs=1E-13)
+        pfrquad, _ = dblquad(lambda y, t: math.exp(-(y*y + t*t)/2) / math.pi, -sl, sl,
+                             gfun=lambda t: tur*(gb*sl-t), hfun=lambda t: math.inf, epsabs=1E-13)
+        assert np.isclose(pfa[i], pfaquad, rtol=0, atol=1E-9)
+        assert np.isclose(pfr[i], pfrquad, rtol=0, atol=1E-9)
+
+    accept = stats.norm(scale=np.sqrt(1+1/4**2)).cdf(2*.9) * 2 - 1
+    assert np.isclose(risk.deaver.CPFA_deaver(2, 4, .9), risk.deaver.PFA_deaver(2, 4, .9) / accept)
+
+
 def test_riskdist():
     # Verify risk.PFA and risk.PFR functions using distributions with normal is same as Deaver method for normal
     assert np.isclose(risk.deaver.PFA_deaver(SL=2, TUR=4),
@@ -8,6 +8,7 @@ import sympy
 from suncal import Model, ModelCallable
 from suncal.project import ProjectUncert
 from suncal.common import unitmgr
+from suncal.uncertainty.variables import RandomVariable
 
 
 def test_chain():
@@ -334,3 +335,187 @@ def test_bracketqty():
     assert 'suncalconst' not in derv
     assert len(out.variablenames) == 1
     assert len(out.gum.constants) == 3
+
+
+def test_incremental():
+    ''' Test incremental Monte Carlo only resamples changed inputs '''
+    u = Model('f = a + b', 'g = a * b')
+    u.var('a').measure(10).typeb(std=.1).typeb(std=.2, name='u2')
+    u.var('b').measure(5).typeb(dist='uniform', a=.5)
+    mc1 = u.monte_carlo(samples=1000, incremental=True)
+    mc2 = u.monte_carlo(samples=1000, incremental=True)
+    assert np.allclose(mc1.varsamples['a'], mc2.varsamples['a'])
+    assert np.allclose(mc1.samples['f'], mc2.samples['f'])
+
+    # Changing one component of b leaves a and b's unchanged samples alone
+    u.var('b').get_typeb('Type B').set_kwargs(a=1)
+    mc3 = u.monte_carlo(samples=1000, incremental=True)
+    assert np.allclose(mc1.varsamples['a'], mc3.varsamples['a'])
+    assert not np.allclose(mc1.varsamples['b'], mc3.varsamples['b'])
+    assert np.isclose(mc3.varsamples['b'].std(), 1/np.sqrt(3), rtol=.1)
+
+    # Changing a nominal value resamples that variable
+    u.var('a').measure(20)
+    mc4 = u.monte_carlo(samples=1000, incremental=True)
+    assert np.isclose(mc4.expected['f'], 25, rtol=.01)
+    assert np.allclose(mc3.varsamples['b'], mc4.varsamples['b'])
+
+    # Non-incremental always resamples
+    mc5 = u.monte_carlo(samples=1000)
+    assert not np.allclose(mc4.varsamples['b'], mc5.varsamples['b'])
+
+    # Editing a Type B component rescales the cached Type A samples instead of redrawing them
+    c = RandomVariable().measure(np.array([1., 2., 3., 4.])).typeb(std=.1)
+    c.sample(1000, incremental=True)
+    standard = c._samplecache.samples
+    c.get_typeb('Type B').set_kwargs(std=.3)
+    c.sample(1000, incremental=True)
+    assert c._samplecache.samples is standard
+
+    # Correlated inputs reuse the copula samples while correlation is unchanged
+    u.variables.correlate('a', 'b', .5)
+    mc6 = u.monte_carlo(samples=1000, incremental=True)
+    mc7 = u.monte_carlo(samples=1000, incremental=True)
+    assert np.allclose(mc6.varsamples['a'], mc7.varsamples['a'])
+    u.variables.correlate('a', 'b', .6)
+    mc8 = u.monte_carlo(samples=1000, incremental=True)
+    assert not np.allclose(mc6.varsamples['a'], mc8.varsamples['a'])
+
+    # Symbolic solution is reused until the correlation structure changes
+    assert u.calculate_symbolic() is u.calculate_symbolic()
+
+
+def test_autodiff():
+    ''' Test automatic differentiation of callable models matches numerical derivatives '''
+    def myfunc(a, b, c):
+        return a * np.exp(b / c), np.sqrt(a**2 + b**2) - np.arctan2(b, c)
+
+    u = ModelCallable(myfunc)
+    u.var('a').measure(2).typeb(std=0.01)
+    u.var('b').measure(1E-3).typeb(std=1E-6)
+    u.var('c').measure(5E3).typeb(std=10)
+    cx_ad = np.array(u._sensitivity_autodiff())
+    cx_num = np.array(u._sensitivity_numeric())
+    assert np.allclose(cx_ad[:, 0], cx_num[:, 0], rtol=1E-6)
+    a, b, c = 2, 1E-3, 5E3
+    assert np.isclose(cx_ad[0][0], np.exp(b/c), rtol=1E-14)
+    assert np.isclose(cx_ad[0][1], a / c * np.exp(b/c), rtol=1E-14)  # Badly scaled for numerical derivative
+    assert np.isclose(cx_ad[0][2], -a * b / c**2 * np.exp(b/c), rtol=1E-14)
+
+    # Functions that can't use dual numbers fall back on numerical derivatives
+    def notufunc(a, b):
+        return float(a) * b
+    u = ModelCallable(notufunc)
+    u.var('a').measure(2).typeb(std=0.01)
+    u.var('b').measure(3).typeb(std=0.01)
+    gum = u.calculate_gum()
+    assert np.isclose(gum.uncertainty['notufunc'], np.sqrt(.03**2 + .02**2))
+
+
+def test_sparsecorrelation():
+    ''' Test sparse correlation storage in models with many inputs '''
+    n = 100
+    names = [f'x{i}' for i in range(n)]
+    u = Model('f = ' + ' + '.join(names))
+    for name in names:
+        u.var(name).measure(1).typeb(std=.1)
+    u.variables.correlate('x1', 'x2', .5)
+    u.variables.correlate('x2', 'x3', '-0.25')  # String values from config files
+    assert u.variables.get_correlation_coeff('x2', 'x1') == .5
+    assert u.variables.get_correlation_coeff('x3', 'x2') == -.25
+    assert u.variables.get_correlation_coeff('x4', 'x5') == 0
+    assert u.variables.correlated_pairs() == {('x1', 'x2'), ('x2', 'x3')}
+    assert u.variables.correlation_list == {('x1', 'x2'): .5, ('x2', 'x3'): -.25}
+    symbols = u.variables.symbol_values()
+    assert symbols['sigma_x2x1'] == .5
+    assert 'sigma_x4x5' not in symbols  # Only nonzero correlations substituted
+
+    corr = u.variables.correlation_matrix()
+    assert corr.shape == (n, n)
+    assert corr[u.varnames.index('x1'), u.varnames.index('x2')] == .5
+
+    gum = u.calculate_gum()
+    expected = np.sqrt(n*.01 + 2*(.5*.01) + 2*(-.25*.01))
+    assert np.isclose(gum.uncertainty['f'], expected)
+    mc = u.monte_carlo(samples=20000)
+    assert np.isclose(mc.uncertainty['f'], expected, rtol=.05)
+
+    u.variables.correlate('x1', 'x2', 0)
+    assert u.variables.correlated_pairs() == {('x2', 'x3')}
+    with pytest.raises(ValueError):
+        u.variables.correlate('x1', 'y', .5)
+
+
+def test_degfvectorized():
+    ''' Test Welch-Satterthwaite degrees of freedom against hand calculation '''
+    u = Model('f = a + 2*b', 'g = a*b')
+    u.var('a').measure(10).typeb(std=.2, degf=5)
+    u.var('b').measure(4).typeb(std=.1, degf=12)
+    gum = u.calculate_gum()
+    ca, cb = 1, 2
+    uf = np.sqrt((ca*.2)**2 + (cb*.1)**2)
+    assert np.isclose(gum.degf['f'], uf**4 / ((ca*.2)**4/5 + (cb*.1)**4/12))
+    ug = np.sqrt((4*.2)**2 + (10*.1)**2)
+    assert np.isclose(gum.degf['g'], ug**4 / ((4*.2)**4/5 + (10*.1)**4/12))
+
+    # Callable model matches symbolic model
+    ucall = ModelCallable(lambda a, b: (a + 2*b, a*b), names=['f', 'g'])
+    ucall.var('a').measure(10).typeb(std=.2, degf=5)
+    ucall.var('b').measure(4).typeb(std=.1, degf=12)
+    gumcall = ucall.calculate_gum()
+    assert np.isclose(gumcall.degf['f'], gum.degf['f'])
+    assert np.isclose(gumcall.degf['g'], gum.degf['g'])
+
+    # Setting degf directly (as the sweeper does) changes the version
+    typeb = u.var('a').get_typeb('Type B')
+    version = u.var('a').version
+    typeb.degf = np.inf
+    assert u.var('a').version != version
+    assert np.isclose(u.calculate_gum().degf['f'], uf**4 / ((cb*.1)**4/12))
+
+    # Units must cancel in the uncertainty ratios
+    uunit = Model('f = a * b')
+    uunit.var('a').measure(10, units='m').typeb(std=.2, degf=5)
+    uunit.var('b').measure(4, units='s').typeb(std=.1, degf=12)
+    df = uunit.calculate_gum().degf['f']
+    assert np.isclose(df, ug**4 / ((4*.2)**4/5 + (10*.1)**4/12))
+
+
+def test_memoizedstats():
+    ''' Test cached RandomVariable statistics are invalidated when the variable changes '''
+    from suncal.uncertainty import variables
+    variables.DEBUG_STATS = True
+    variables.STAT_COUNTS.clear()
+    try:
+        u = Model('f = a * b')
+        u.var('a').measure([9.9, 10., 10.1, 10.2]).typeb(std=.1, degf=8)
+        u.var('b').measure(2).typeb(std=.05)
+        a = u.var('a')
+        unc = a.uncertainty
+        assert a.uncertainty == unc
+        assert variables.STAT_COUNTS['uncertainty.hit'] == 1
+        gum1 = u.calculate_gum()
+        gum2 = u.calculate_gum()
+        assert variables.STAT_COUNTS['variance.miss'] == 2  # Once per variable
+        assert gum1.uncertainty['f'] == gum2.uncertainty['f']
+
+        a.get_typeb('Type B').set_kwargs(std=.2)
+        assert a.uncertainty > unc
+        a.measure([10., 10.])
+        assert np.isclose(a.uncertainty, .2)
+        a.clear_typeb()
+        assert a.uncertainty == 0
+        a.typeb(std=.3)
+        assert np.isclose(a.uncertainty, .3)
+        assert np.isinf(a.degrees_freedom)
+        a.get_typeb('Type B').degf = 4
+        assert a.degrees_freedom == 4
+
+        # Names assigned directly show in info
+        assert a.info[0]['name'] == 'Type B'
+        a.get_typeb('Type B').name = 'Resolution'
+        a.get_typeb('Resolution').description = 'Display resolution'
+        assert a.info[0]['name'] == 'Resolution'
+        assert a.info[0]['description'] == 'Display resolution'
+    finally:
+        variables.DEBUG_STATS = False